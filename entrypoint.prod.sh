@@ -1,4 +1,11 @@
 #!/usr/bin/env bash
 
 python manage.py migrate --noinput
-python -m gunicorn --bind 0.0.0.0:8000 --workers 3 ricart.wsgi:application
\ No newline at end of file
+
+# SERVER_MODE=asgi serves ricart/asgi.py through uvicorn, the async payment endpoints (/api/async/...)
+# then share one event loop per process instead of blocking a thread per Stripe call.
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    exec python -m uvicorn ricart.asgi:application --host 0.0.0.0 --port 8000 --workers ${UVICORN_WORKERS:-2}
+fi
+
+exec python -m gunicorn --bind 0.0.0.0:8000 --workers ${GUNICORN_WORKERS:-3} --worker-class gthread --threads ${GUNICORN_THREADS:-4} ricart.wsgi:application
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 
 load_dotenv()  # This loads .env file
@@ -61,6 +62,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shop.routing.ReplicaRoutingMiddleware',  # before anything that reads the database (sessions, auth)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -94,12 +96,71 @@ WSGI_APPLICATION = 'ricart.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DJANGO_DB_PROFILE picks the database:
+# -> 'sqlite' (default): every new connection runs the PRAGMAs below. WAL lets readers go on while one writer commits,
+#    synchronous=NORMAL only syncs at checkpoints (still safe in WAL mode), busy_timeout makes a writer wait for the lock
+#    instead of failing with "database is locked", and the page cache and mmap keep hot pages in memory.
+#    IMMEDIATE transactions take the write lock at BEGIN, so a transaction never fails halfway when it starts writing.
+# -> 'postgres': POSTGRES_* settings. With DB_POOL=1 connections come from a psycopg pool shared by the threads of a worker,
+#    otherwise each thread keeps its connection for DB_CONN_MAX_AGE seconds and checks it before reusing it.
+# (`or default` below: .env.example leaves these keys empty, an empty value means the default)
+DB_PROFILE = os.getenv("DJANGO_DB_PROFILE") or "sqlite"
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE") or "60")
+
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("POSTGRES_DB") or "rishatstore",
+            'USER': os.getenv("POSTGRES_USER") or "postgres",
+            'PASSWORD': os.getenv("POSTGRES_PASSWORD", ""),
+            'HOST': os.getenv("POSTGRES_HOST") or "localhost",
+            'PORT': os.getenv("POSTGRES_PORT") or "5432",
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
-}
+    if (os.getenv("DB_POOL") or "0") == "1":
+        # the pool holds the connections, Django hands them back after each request (CONN_MAX_AGE must be 0)
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {'pool': {
+            'min_size': int(os.getenv("DB_POOL_MIN_SIZE") or "2"),
+            'max_size': int(os.getenv("DB_POOL_MAX_SIZE") or "10"),
+            'timeout': int(os.getenv("DB_POOL_TIMEOUT") or "10"),
+        }}
+elif DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv("SQLITE_PATH") or BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f'PRAGMA mmap_size={int(os.getenv("SQLITE_MMAP_SIZE") or str(128 * 1024 * 1024))};'
+                    f'PRAGMA busy_timeout={int(os.getenv("SQLITE_BUSY_TIMEOUT") or "5000")};'
+                    f'PRAGMA cache_size=-{int(os.getenv("SQLITE_CACHE_SIZE_KB") or "65536")};'
+                ),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f'DJANGO_DB_PROFILE must be "sqlite" or "postgres", not "{DB_PROFILE}".')
+
+# Read replicas: DATABASE_REPLICAS is a comma separated list of replicas kept in sync with the primary
+# by replication outside Django (database file names on SQLite, hosts on PostgreSQL),
+# each one becomes a 'replicaN' alias with the primary's settings.
+# shop.routing sends safe reads there, REPLICA_STICKY_SECONDS is how long a client that wrote reads from the primary.
+READ_REPLICAS = []
+for _number, _name in enumerate(filter(None, os.getenv("DATABASE_REPLICAS", "").split(",")), 1):
+    _replica_key = 'HOST' if DB_PROFILE == 'postgres' else 'NAME'
+    DATABASES[f'replica{_number}'] = {**DATABASES['default'], _replica_key: _name.strip(), 'TEST': {'MIRROR': 'default'}}
+    READ_REPLICAS.append(f'replica{_number}')
+DATABASE_ROUTERS = ['shop.routing.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
 
 
 # Password validation
@@ -151,10 +212,54 @@ STRIPE_SECRET_KEY=os.getenv('STRIPE_SECRET_KEY')
 STRIPE_PUBLISHABLE_KEY_EUR = os.getenv("STRIPE_PUBLISHABLE_KEY_EUR")
 STRIPE_SECRET_KEY_EUR=os.getenv('STRIPE_SECRET_KEY_EUR')
 
+# Stripe HTTP settings, shared by the per-account clients in shop.payments.stripe_clients
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", "5"))
+STRIPE_READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", "30"))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+
+# Webhook signing secrets (whsec_...) of the USD and EUR accounts, used by POST /api/payment/webhook/.
+# Once one is set, /api/payment/confirm/ stops polling Stripe and reports what the webhooks have applied.
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+STRIPE_WEBHOOK_SECRET_EUR = os.getenv("STRIPE_WEBHOOK_SECRET_EUR")
+STRIPE_EVENTS_BATCH_SIZE = int(os.getenv("STRIPE_EVENTS_BATCH_SIZE", "100"))
+
+# /api/payment/sessions/ caches the client_secret of an order's intent for this many seconds (Django cache).
+PAYMENT_SESSION_CACHE_TTL = int(os.getenv("PAYMENT_SESSION_CACHE_TTL", "60"))
+
+# Background jobs (shop.jobs, `manage.py run_jobs`): a claimed job is handed to another worker after
+# JOB_LEASE_SECONDS, a failed one is retried after JOB_BACKOFF_BASE * 2**(attempt - 1) seconds (at most JOB_BACKOFF_MAX).
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_BASE = int(os.getenv("JOB_BACKOFF_BASE", "10"))
+JOB_BACKOFF_MAX = int(os.getenv("JOB_BACKOFF_MAX", "3600"))
+
+# Where anonymous carts live (shop.carts): 'db' (Cart/CartItem rows), 'session' (request.session, use it with a
+# signed_cookies or cache SESSION_ENGINE) or 'signed' (a signed cookie). The last two write nothing until checkout.
+CART_STORAGE = os.getenv("CART_STORAGE", "db")
+CART_COOKIE_NAME = os.getenv("CART_COOKIE_NAME", "cart")
+CART_COOKIE_MAX_AGE = int(os.getenv("CART_COOKIE_MAX_AGE", str(60 * 60 * 24 * 14)))
+# most lines one POST /api/carts/{id}/items/bulk/ can add
+CART_BULK_MAX_LINES = int(os.getenv("CART_BULK_MAX_LINES", "100"))
+# most of one item a cart line can hold, checkout copies it to OrderItem.quantity (a small integer, 32767 at most)
+CART_MAX_QUANTITY = min(int(os.getenv("CART_MAX_QUANTITY", "1000")), 32767)
+
+# Database carts idle for CART_TTL_DAYS are deleted by `manage.py purge_carts` (CART_PURGE_BATCH_SIZE carts per
+# transaction), and opportunistically by a background job queued on about CART_SWEEP_PROBABILITY of cart creations.
+CART_TTL_DAYS = int(os.getenv("CART_TTL_DAYS", "14"))
+CART_PURGE_BATCH_SIZE = int(os.getenv("CART_PURGE_BATCH_SIZE", "500"))
+CART_SWEEP_PROBABILITY = float(os.getenv("CART_SWEEP_PROBABILITY", "0.01"))
+
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,  # Automatically convert string decimal to decimal number
 }
 
 BASE_CURRENCY = "USD"
 EUR_CURRENCY = "EUR"
-CURRENCY_RATE = 0.86
\ No newline at end of file
+
+# Exchange rates live in the ExchangeRate table (manage.py load_exchange_rates rates.json),
+# each process caches them for this many seconds.
+EXCHANGE_RATES_CACHE_TTL = int(os.getenv("EXCHANGE_RATES_CACHE_TTL", "300"))
+
+# Active Discount/Tax are cached per process, saving them in this process invalidates the cache immediately,
+# other worker processes pick the change up after this many seconds.
+PRICING_RULES_CACHE_TTL = int(os.getenv("PRICING_RULES_CACHE_TTL", "60"))
\ No newline at end of file
@@ -1,8 +1,25 @@
 import pytest
+import stripe
+from types import SimpleNamespace
 from model_bakery import baker
+from django.core.cache import cache
 from shop.models import Item, Cart, CartItem, Order, Discount, Tax
+from shop.pricing import clear_pricing_rules_cache
+from shop.rates import clear_rates_cache
+from shop.payments import stripe_clients
 from rest_framework.test import APIClient
 
+@pytest.fixture(autouse=True)
+def clear_process_caches():
+    # every test rolls its Discount/Tax rows back, the process cache must not outlive them
+    clear_pricing_rules_cache()
+    clear_rates_cache()
+    cache.clear()
+    yield
+    clear_pricing_rules_cache()
+    clear_rates_cache()
+    cache.clear()
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -48,4 +65,69 @@ def create_discount():
 def create_tax():
     def _create_tax(**kwargs):
         return baker.make(Tax, **kwargs)
-    return _create_tax
\ No newline at end of file
+    return _create_tax
+
+class FakePaymentIntents:
+    """Stands in for StripeClient.v1.payment_intents, keeps intents in memory and records every call"""
+    def __init__(self):
+        self.intents = {}
+        self.calls = []
+
+    def _intent(self, intent_id):
+        try:
+            return stripe.PaymentIntent.construct_from(self.intents[intent_id], 'sk_test_fake')
+        except KeyError:
+            raise stripe.InvalidRequestError(f'No such payment_intent: {intent_id}', 'intent')
+
+    def create(self, params, options=None):
+        self.calls.append(('create', params, options))
+        intent_id = f'pi_fake_{len(self.intents) + 1}'
+        self.intents[intent_id] = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'client_secret': f'{intent_id}_secret',
+            'status': 'requires_payment_method',
+            **params,
+        }
+        return self._intent(intent_id)
+
+    def retrieve(self, intent_id, params=None, options=None):
+        self.calls.append(('retrieve', intent_id))
+        return self._intent(intent_id)
+
+    def update(self, intent_id, params=None, options=None):
+        self.calls.append(('update', intent_id, params))
+        self._intent(intent_id)
+        self.intents[intent_id].update(params or {})
+        return self._intent(intent_id)
+
+    def cancel(self, intent_id, params=None, options=None):
+        self.calls.append(('cancel', intent_id))
+        self._intent(intent_id)
+        self.intents[intent_id]['status'] = 'canceled'
+        return self._intent(intent_id)
+
+    async def create_async(self, params, options=None):
+        return self.create(params, options)
+
+    async def retrieve_async(self, intent_id, params=None, options=None):
+        return self.retrieve(intent_id, params, options)
+
+    async def update_async(self, intent_id, params=None, options=None):
+        return self.update(intent_id, params, options)
+
+    async def cancel_async(self, intent_id, params=None, options=None):
+        return self.cancel(intent_id, params, options)
+
+
+class FakeStripeClient:
+    def __init__(self):
+        self.v1 = SimpleNamespace(payment_intents=FakePaymentIntents())
+
+
+@pytest.fixture
+def fake_stripe(monkeypatch):
+    """Every Stripe account resolves to one in-memory fake client"""
+    client = FakeStripeClient()
+    monkeypatch.setattr(stripe_clients, 'get', lambda currency: client)
+    return client.v1.payment_intents
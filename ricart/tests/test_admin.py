@@ -0,0 +1,91 @@
+from decimal import Decimal
+import pytest
+from model_bakery import baker
+from rest_framework import status
+from shop.models import Item, Order, OrderItem
+
+
+def make_orders(count, lines=2):
+    items = baker.make(Item, price=Decimal('10.00'), _quantity=lines)
+    orders = baker.make(Order, order_currency='EUR', total=Decimal('20.00'), _quantity=count)
+    for order in orders:
+        for item in items:
+            baker.make(OrderItem, order=order, item=item, quantity=2, unit_price=item.price)
+    return orders
+
+
+@pytest.mark.django_db
+class TestAdminQueries:
+    """
+    the admin pages must cost the same number of queries whatever the number of rows
+    (session, user and the content type lookup, which is cached after the first test, come on top of the page's own)
+    """
+
+    @pytest.mark.parametrize('rows', [1, 20])
+    def test_item_changelist(self, admin_client, django_assert_max_num_queries, rows):
+        make_orders(rows, lines=rows)
+
+        # count, page of items with their COUNT of order lines
+        with django_assert_max_num_queries(5):
+            response = admin_client.get('/admin/shop/item/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert f'<td class="field-order_count">{rows}</td>' in response.content.decode()
+
+    @pytest.mark.parametrize('rows', [1, 20])
+    def test_order_item_changelist(self, admin_client, django_assert_max_num_queries, rows):
+        make_orders(rows)
+
+        # filtered count, total count, page of lines joined to their order and item, list_filter items
+        with django_assert_max_num_queries(7):
+            response = admin_client.get('/admin/shop/orderitem/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert '€20.00' in response.content.decode()
+
+    @pytest.mark.parametrize('lines', [1, 20])
+    def test_order_change_page_inline(self, admin_client, django_assert_max_num_queries, lines):
+        order = make_orders(1, lines=lines)[0]
+
+        # order, its lines joined to order and item
+        with django_assert_max_num_queries(5):
+            response = admin_client.get(f'/admin/shop/order/{order.pk}/change/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert '€20.00' in response.content.decode()
+
+
+
+@pytest.mark.django_db
+class TestOrderAdminSearch:
+    """order search matches whole or leading parts of the id and exact PaymentIntent ids, no LIKE scans"""
+
+    def search(self, admin_client, term):
+        response = admin_client.get('/admin/shop/order/', {'q': term})
+        assert response.status_code == status.HTTP_200_OK
+        return {str(order.pk) for order in response.context['cl'].result_list}
+
+    def test_full_id(self, admin_client):
+        order, other = make_orders(2)
+
+        assert self.search(admin_client, str(order.pk)) == {str(order.pk)}
+
+    def test_id_prefix_as_shown_in_the_list(self, admin_client):
+        order, other = make_orders(2)
+
+        assert str(order.pk) in self.search(admin_client, str(order.pk)[:8] + '...')
+
+    def test_payment_intent_id(self, admin_client):
+        order, other = make_orders(2)
+        Order.objects.filter(pk=order.pk).update(stripe_payment_intent_id='pi_search_123')
+
+        assert self.search(admin_client, 'pi_search_123') == {str(order.pk)}
+        assert self.search(admin_client, 'pi_search') == set()
+
+    def test_search_sql_has_no_like(self, admin_client, django_assert_max_num_queries):
+        make_orders(1)
+
+        with django_assert_max_num_queries(10) as captured:
+            self.search(admin_client, 'deadbeef')
+
+        assert not any(' LIKE ' in query['sql'] for query in captured.captured_queries)
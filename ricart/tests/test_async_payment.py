@@ -0,0 +1,113 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from shop.jobs import run_pending_jobs
+from shop.models import Job, Order
+
+
+def post(path, data):
+    return async_to_sync(AsyncClient().post)(path, data, content_type='application/json')
+
+
+@pytest.mark.django_db
+class TestAsyncPayment:
+    def test_sessions_creates_intent_and_saves_it(self, create_order, fake_stripe):
+        order = create_order(total=12.50, order_currency='EUR')
+
+        response = post('/api/async/payment/sessions/', {'order_id': str(order.id)})
+
+        order.refresh_from_db()
+        assert response.status_code == 200
+        assert response.json()['payment_intent_id'] == order.stripe_payment_intent_id == 'pi_fake_1'
+        assert fake_stripe.calls[0][1]['amount'] == 1250
+        assert fake_stripe.calls[0][1]['currency'] == 'eur'
+
+    def test_repeated_sessions_reuse_intent(self, create_order, fake_stripe):
+        order = create_order(total=10.00)
+
+        first = post('/api/async/payment/sessions/', {'order_id': str(order.id)})
+        second = post('/api/async/payment/sessions/', {'order_id': str(order.id)})
+
+        assert first.json() == second.json()
+        assert [call[0] for call in fake_stripe.calls] == ['create']
+
+    def test_sessions_with_completed_order_returns_400(self, create_order, fake_stripe):
+        order = create_order(payment_status=Order.PAYMENT_COMPLETE)
+
+        response = post('/api/async/payment/sessions/', {'order_id': str(order.id)})
+
+        assert response.status_code == 400
+        assert response.json() == {'error': 'Order already completed'}
+        assert fake_stripe.calls == []
+
+    def test_unknown_order_returns_400(self, fake_stripe):
+        response = post('/api/async/payment/confirm/', {'order_id': 'invalid-uuid'})
+
+        assert response.status_code == 400
+        assert response.json() == {'error': 'Order not found'}
+
+    def test_confirm_unpaid_intent_marks_order_failed(self, create_order, fake_stripe):
+        order = create_order(total=10.00)
+        post('/api/async/payment/sessions/', {'order_id': str(order.id)})
+
+        response = post('/api/async/payment/confirm/', {'order_id': str(order.id)})
+
+        order.refresh_from_db()
+        assert response.status_code == 400
+        assert response.json()['status'] == 'failed'
+        assert order.payment_status == Order.PAYMENT_FAILED
+
+    def test_cancel_pending_order_cancels_intent(self, create_order, fake_stripe):
+        order = create_order(total=10.00)
+        post('/api/async/payment/sessions/', {'order_id': str(order.id)})
+
+        response = post('/api/async/payment/cancel/', {'order_id': str(order.id)})
+        run_pending_jobs()
+
+        order.refresh_from_db()
+        assert response.status_code == 200
+        assert order.payment_status == Order.PAYMENT_CANCELLED
+        assert fake_stripe.intents['pi_fake_1']['status'] == 'canceled'
+
+    def test_cancel_order_settled_meanwhile_returns_400(self, create_order, fake_stripe, monkeypatch):
+        order = create_order(total=10.00)
+        post('/api/async/payment/sessions/', {'order_id': str(order.id)})
+
+        # the view read the order while it was pending, then the webhook completed it
+        stale = Order.objects.get(pk=order.pk)
+        Order.objects.filter(pk=order.pk).update(payment_status=Order.PAYMENT_COMPLETE)
+        async def get_stale_order(request):
+            return stale
+        monkeypatch.setattr('shop.async_views._get_order', get_stale_order)
+
+        response = post('/api/async/payment/cancel/', {'order_id': str(order.id)})
+
+        order.refresh_from_db()
+        assert response.status_code == 400
+        assert order.payment_status == Order.PAYMENT_COMPLETE
+        assert not Job.objects.exists()
+
+    def test_get_only_accepts_post(self, create_order):
+        order = create_order()
+
+        response = async_to_sync(AsyncClient().get)('/api/async/payment/sessions/', {'order_id': str(order.id)})
+
+        assert response.status_code == 405
+
+
+@pytest.mark.django_db
+class TestAsyncOrderDetail:
+    def test_returns_same_payload_as_sync_view(self, api_client, create_order):
+        order = create_order()
+
+        response = async_to_sync(AsyncClient().get)(f'/api/async/orders/{order.id}/')
+
+        assert response.status_code == 200
+        assert response.json() == api_client.get(f'/api/orders/{order.id}/').json()
+
+    def test_unknown_order_returns_404(self):
+        from uuid import uuid4
+
+        response = async_to_sync(AsyncClient().get)(f'/api/async/orders/{uuid4()}/')
+
+        assert response.status_code == 404
@@ -0,0 +1,205 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+import uuid
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from shop.carts import purge_abandoned_carts
+from shop.models import Cart, CartItem, Job
+from shop.tasks import PURGE_ABANDONED_CARTS
+
+
+@pytest.mark.django_db
+class TestCartTotals:
+    def test_retrieve_cart_returns_line_and_cart_totals(self, api_client, create_cart, create_item, create_cart_item):
+        cart = create_cart()
+        create_cart_item(cart=cart, item=create_item(price=Decimal('19.99')), quantity=3)
+        create_cart_item(cart=cart, item=create_item(price=Decimal('0.10')), quantity=7)
+
+        response = api_client.get(f'/api/carts/{cart.id}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(line['total_price'] for line in response.data['items']) == [Decimal('0.70'), Decimal('59.97')]
+        assert response.data['total_price'] == Decimal('60.67')
+
+    def test_empty_cart_total_is_zero(self, api_client, create_cart):
+        cart = create_cart()
+
+        response = api_client.get(f'/api/carts/{cart.id}/')
+
+        assert response.data['total_price'] == 0
+        assert response.data['items'] == []
+
+    def test_cart_items_list_returns_line_totals(self, api_client, create_cart, create_item, create_cart_item):
+        cart = create_cart()
+        create_cart_item(cart=cart, item=create_item(price=Decimal('2.50')), quantity=4)
+
+        response = api_client.get(f'/api/carts/{cart.id}/items/')
+
+        assert response.data[0]['total_price'] == Decimal('10.00')
+
+    @pytest.mark.parametrize('lines', [1, 30])
+    def test_retrieve_cart_query_count_does_not_grow_with_lines(self, api_client, create_cart, create_item, create_cart_item, django_assert_num_queries, lines):
+        cart = create_cart()
+        for _ in range(lines):
+            create_cart_item(cart=cart, item=create_item(price=Decimal('1.00')))
+
+        # cart with its SUM, lines with their items and line totals
+        with django_assert_num_queries(2):
+            response = api_client.get(f'/api/carts/{cart.id}/')
+
+        assert response.data['total_price'] == Decimal(lines)
+
+
+@pytest.mark.django_db
+class TestPurgeCarts:
+    def _age(self, cart, days):
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - timedelta(days=days))
+
+    def test_purge_deletes_idle_carts_and_their_lines(self, create_cart, create_cart_item):
+        idle, fresh = create_cart(), create_cart()
+        create_cart_item(cart=idle, quantity=2)
+        create_cart_item(cart=fresh)
+        self._age(idle, 30)
+
+        assert purge_abandoned_carts(ttl=timedelta(days=14)) == (1, 1)
+        assert list(Cart.objects.values_list('pk', flat=True)) == [fresh.pk]
+        assert CartItem.objects.filter(cart=fresh).count() == 1
+
+    def test_purge_works_in_batches(self, create_cart):
+        for _ in range(5):
+            self._age(create_cart(), 30)
+        batches = []
+
+        carts, _ = purge_abandoned_carts(ttl=timedelta(days=14), batch_size=2, on_batch=lambda carts, lines: batches.append(carts))
+
+        assert carts == 5
+        assert batches == [2, 4, 5]
+        assert not Cart.objects.exists()
+
+    def test_purge_stops_after_max_batches(self, create_cart):
+        for _ in range(5):
+            self._age(create_cart(), 30)
+
+        assert purge_abandoned_carts(ttl=timedelta(days=14), batch_size=2, max_batches=1) == (2, 0)
+        assert Cart.objects.count() == 3
+
+    def test_adding_an_item_keeps_the_cart_alive(self, api_client, create_cart, create_item):
+        cart = create_cart()
+        self._age(cart, 30)
+
+        response = api_client.post(f'/api/carts/{cart.id}/items/', {'item_id': create_item().id, 'quantity': 1})
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert purge_abandoned_carts(ttl=timedelta(days=14)) == (0, 0)
+
+    def test_purge_carts_command_reports_rate(self, create_cart):
+        self._age(create_cart(), 30)
+        out = StringIO()
+
+        call_command('purge_carts', '--ttl-days', '14', stdout=out)
+
+        assert 'Deleted 1 abandoned carts' in out.getvalue()
+        assert 'carts/s' in out.getvalue()
+        assert not Cart.objects.exists()
+
+    def test_cart_creation_queues_one_sweep(self, api_client, settings):
+        settings.CART_SWEEP_PROBABILITY = 1.0
+
+        api_client.post('/api/carts/')
+        api_client.post('/api/carts/')
+
+        assert list(Job.objects.values_list('name', flat=True)) == [PURGE_ABANDONED_CARTS]
+
+
+@pytest.mark.django_db
+class TestBulkCartItems:
+    def test_bulk_adds_new_lines_and_increments_existing_ones(self, api_client, create_cart, create_item, create_cart_item):
+        cart = create_cart()
+        first, second = create_item(price=Decimal('1.00')), create_item(price=Decimal('2.00'))
+        create_cart_item(cart=cart, item=first, quantity=2)
+
+        response = api_client.post(f'/api/carts/{cart.id}/items/bulk/', [
+            {'item_id': first.id, 'quantity': 3},
+            {'item_id': second.id},
+            {'item_id': second.id, 'quantity': 4},
+        ], format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert {line['item']['id']: line['quantity'] for line in response.data} == {first.id: 5, second.id: 5}
+        assert CartItem.objects.filter(cart=cart).count() == 2
+
+    def test_unknown_item_rejects_the_whole_batch(self, api_client, create_cart, create_item):
+        cart = create_cart()
+
+        response = api_client.post(f'/api/carts/{cart.id}/items/bulk/', [
+            {'item_id': create_item().id, 'quantity': 1},
+            {'item_id': 999999, 'quantity': 1},
+        ], format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert '999999' in str(response.data)
+        assert not CartItem.objects.filter(cart=cart).exists()
+
+    @pytest.mark.parametrize('payload', [[], [{'item_id': 1, 'quantity': 0}], {'item_id': 1}])
+    def test_invalid_payload_returns_400(self, api_client, create_cart, payload):
+        response = api_client.post(f'/api/carts/{create_cart().id}/items/bulk/', payload, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_unknown_cart_returns_404(self, api_client, create_item):
+        response = api_client.post(f'/api/carts/{uuid.uuid4()}/items/bulk/', [{'item_id': create_item().id}], format='json')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @pytest.mark.parametrize('lines', [1, 20])
+    def test_bulk_query_count_does_not_grow_with_lines(self, api_client, create_cart, create_item, django_assert_num_queries, lines):
+        cart = create_cart()
+        payload = [{'item_id': create_item(price=Decimal('1.00')).id, 'quantity': 2} for _ in range(lines)]
+
+        # validate items, savepoint, touch cart, insert, increment, release, read back the lines
+        with django_assert_num_queries(7):
+            response = api_client.post(f'/api/carts/{cart.id}/items/bulk/', payload, format='json')
+
+        assert len(response.data) == lines
+
+    def test_adding_an_item_twice_increments_one_line(self, api_client, create_cart, create_item):
+        cart, item = create_cart(), create_item()
+
+        api_client.post(f'/api/carts/{cart.id}/items/', {'item_id': item.id, 'quantity': 1})
+        response = api_client.post(f'/api/carts/{cart.id}/items/', {'item_id': item.id, 'quantity': 2})
+
+        assert response.data['quantity'] == 3
+        assert CartItem.objects.filter(cart=cart).count() == 1
+
+    def test_quantity_over_the_line_limit_returns_400(self, api_client, create_cart, create_item, settings):
+        cart, item = create_cart(), create_item()
+
+        bulk = api_client.post(f'/api/carts/{cart.id}/items/bulk/', [{'item_id': item.id, 'quantity': settings.CART_MAX_QUANTITY + 1}], format='json')
+        single = api_client.post(f'/api/carts/{cart.id}/items/', {'item_id': item.id, 'quantity': settings.CART_MAX_QUANTITY + 1})
+
+        assert bulk.status_code == single.status_code == status.HTTP_400_BAD_REQUEST
+        assert not CartItem.objects.filter(cart=cart).exists()
+
+    def test_increment_past_the_line_limit_is_rolled_back(self, api_client, create_cart, create_item, create_cart_item, settings):
+        cart, full, other = create_cart(), create_item(), create_item()
+        create_cart_item(cart=cart, item=full, quantity=settings.CART_MAX_QUANTITY)
+
+        response = api_client.post(f'/api/carts/{cart.id}/items/bulk/', [
+            {'item_id': other.id, 'quantity': 1},
+            {'item_id': full.id, 'quantity': 1},
+        ], format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'quantity' in response.data
+        assert list(CartItem.objects.filter(cart=cart).values_list('item_id', 'quantity')) == [(full.id, settings.CART_MAX_QUANTITY)]
+
+    def test_line_can_be_filled_up_to_the_limit(self, api_client, create_cart, create_item, create_cart_item, settings):
+        cart, item = create_cart(), create_item()
+        create_cart_item(cart=cart, item=item, quantity=settings.CART_MAX_QUANTITY - 2)
+
+        response = api_client.post(f'/api/carts/{cart.id}/items/', {'item_id': item.id, 'quantity': 2})
+
+        assert response.data['quantity'] == settings.CART_MAX_QUANTITY
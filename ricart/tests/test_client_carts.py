@@ -0,0 +1,125 @@
+from decimal import Decimal
+import pytest
+from rest_framework import status
+from shop.models import Cart, CartItem, Order
+
+
+@pytest.fixture(params=['session', 'signed'])
+def client_carts(request, settings):
+    settings.CART_STORAGE = request.param
+    settings.CART_COOKIE_NAME = 'cart'
+    return request.param
+
+
+@pytest.fixture
+def item(create_item):
+    return create_item(price=Decimal('10.00'))
+
+
+@pytest.mark.django_db
+class TestClientSideCarts:
+    def new_cart(self, api_client):
+        response = api_client.post('/api/carts/')
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.data['id']
+
+    def test_cart_api_works_without_touching_cart_tables(self, api_client, client_carts, item):
+        cart_id = self.new_cart(api_client)
+
+        added = api_client.post(f'/api/carts/{cart_id}/items/', {'item_id': item.id, 'quantity': 2})
+        api_client.post(f'/api/carts/{cart_id}/items/', {'item_id': item.id, 'quantity': 1})
+        cart = api_client.get(f'/api/carts/{cart_id}/')
+
+        assert added.status_code == status.HTTP_201_CREATED
+        assert cart.data['id'] == cart_id
+        assert [(line['id'], line['quantity'], line['total_price']) for line in cart.data['items']] == [(item.id, 3, Decimal('30.00'))]
+        assert cart.data['total_price'] == Decimal('30.00')
+        assert not Cart.objects.exists() and not CartItem.objects.exists()
+
+    def test_update_and_remove_line(self, api_client, client_carts, item, create_item):
+        other = create_item(price=Decimal('1.00'))
+        cart_id = self.new_cart(api_client)
+        api_client.post(f'/api/carts/{cart_id}/items/', {'item_id': item.id, 'quantity': 1})
+        api_client.post(f'/api/carts/{cart_id}/items/', {'item_id': other.id, 'quantity': 1})
+
+        patched = api_client.patch(f'/api/carts/{cart_id}/items/{item.id}/', {'quantity': 5})
+        removed = api_client.delete(f'/api/carts/{cart_id}/items/{other.id}/')
+        lines = api_client.get(f'/api/carts/{cart_id}/items/')
+
+        assert patched.data == {'quantity': 5}
+        assert removed.status_code == status.HTTP_204_NO_CONTENT
+        assert [(line['item']['id'], line['quantity']) for line in lines.data] == [(item.id, 5)]
+
+    def test_unknown_cart_or_item_returns_404_or_400(self, api_client, client_carts, item):
+        cart_id = self.new_cart(api_client)
+
+        assert api_client.get('/api/carts/8c4f4d8e-6b1b-4b43-9d3c-2f0b8f1f5a11/').status_code == status.HTTP_404_NOT_FOUND
+        assert api_client.get(f'/api/carts/{cart_id}/items/{item.id}/').status_code == status.HTTP_404_NOT_FOUND
+        assert api_client.post(f'/api/carts/{cart_id}/items/', {'item_id': 999999, 'quantity': 1}).status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_checkout_materializes_cart_and_clears_it(self, api_client, client_carts, item):
+        cart_id = self.new_cart(api_client)
+        api_client.post(f'/api/carts/{cart_id}/items/', {'item_id': item.id, 'quantity': 2})
+
+        response = api_client.post('/api/orders/', {'cart_id': cart_id, 'currency': 'USD'})
+
+        assert response.status_code == status.HTTP_201_CREATED
+        order = Order.objects.get(pk=response.data['id'])
+        assert order.total > 0
+        assert list(order.items.values_list('item_id', 'quantity')) == [(item.id, 2)]
+        assert api_client.get(f'/api/carts/{cart_id}/').status_code == status.HTTP_404_NOT_FOUND
+
+    def test_bulk_add_updates_the_client_cart(self, api_client, client_carts, item):
+        cart_id = self.new_cart(api_client)
+        api_client.post(f'/api/carts/{cart_id}/items/', {'item_id': item.id, 'quantity': 1})
+
+        response = api_client.post(f'/api/carts/{cart_id}/items/bulk/', [{'item_id': item.id, 'quantity': 2}], format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data[0]['quantity'] == 3
+        assert api_client.get(f'/api/carts/{cart_id}/').data['items'][0]['quantity'] == 3
+
+    def test_bulk_add_past_the_line_limit_returns_400(self, api_client, client_carts, item, settings):
+        cart_id = self.new_cart(api_client)
+        api_client.post(f'/api/carts/{cart_id}/items/', {'item_id': item.id, 'quantity': settings.CART_MAX_QUANTITY})
+
+        response = api_client.post(f'/api/carts/{cart_id}/items/bulk/', [{'item_id': item.id, 'quantity': 1}], format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert api_client.get(f'/api/carts/{cart_id}/').data['items'][0]['quantity'] == settings.CART_MAX_QUANTITY
+
+    def test_checkout_of_empty_cart_returns_400(self, api_client, client_carts):
+        cart_id = self.new_cart(api_client)
+
+        response = api_client.post('/api/orders/', {'cart_id': cart_id})
+
+        assert response.data['cart_id'] == ['Cart is empty.']
+
+    def test_quote_by_cart_id(self, api_client, client_carts, item):
+        cart_id = self.new_cart(api_client)
+        api_client.post(f'/api/carts/{cart_id}/items/', {'item_id': item.id, 'quantity': 3})
+
+        response = api_client.post('/api/quotes/', {'quotes': [{'cart_id': cart_id}]}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['quotes'][0]['subtotal'] == Decimal('30.00')
+
+
+@pytest.mark.django_db
+class TestSignedCookieCart:
+    def test_tampered_cookie_is_ignored(self, api_client, settings, item):
+        settings.CART_STORAGE = 'signed'
+        cart_id = api_client.post('/api/carts/').data['id']
+        api_client.cookies['cart'] = api_client.cookies['cart'].value[:-2] + 'xx'
+
+        assert api_client.get(f'/api/carts/{cart_id}/').status_code == status.HTTP_404_NOT_FOUND
+
+    def test_cookie_is_httponly_and_compact(self, api_client, settings, item):
+        settings.CART_STORAGE = 'signed'
+        cart_id = api_client.post('/api/carts/').data['id']
+
+        response = api_client.post(f'/api/carts/{cart_id}/items/', {'item_id': item.id, 'quantity': 1})
+
+        cookie = response.cookies['cart']
+        assert cookie['httponly']
+        assert len(cookie.value) < 200
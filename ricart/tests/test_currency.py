@@ -0,0 +1,91 @@
+import json
+import pytest
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.core.management import call_command, CommandError
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from shop.models import ExchangeRate
+from shop.rates import convert, get_rates
+
+
+@pytest.mark.django_db
+class TestCurrency:
+    def test_get_rates_returns_seeded_rates(self, api_client):
+        response = api_client.get('/api/currency/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['base'] == 'USD'
+        assert response.data['rates']['USD'] == 1
+        assert response.data['rates']['EUR'] == Decimal('0.86')
+
+    def test_get_rates_with_other_base_returns_cross_rates(self, api_client):
+        ExchangeRate.objects.create(currency='GBP', rate=Decimal('0.75'))
+
+        response = api_client.get('/api/currency/?base=EUR')
+
+        assert response.data['rates']['EUR'] == 1
+        assert round(response.data['rates']['GBP'], 6) == round(Decimal('0.75') / Decimal('0.86'), 6)
+
+    def test_get_rates_with_unknown_base_returns_400(self, api_client):
+        response = api_client.get('/api/currency/?base=XYZ')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_switch_currency_is_stored_in_session(self, api_client):
+        response = api_client.post('/api/currency/switch/', {'currency': 'eur'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert api_client.get('/api/currency/').data['selected'] == 'EUR'
+
+    def test_load_rates_command_rebases_file_rates(self, tmp_path):
+        path = tmp_path / 'rates.json'
+        path.write_text(json.dumps({'base': 'EUR', 'rates': {'EUR': 1, 'USD': 1.25, 'GBP': 0.9}}))
+
+        call_command('load_exchange_rates', str(path))
+
+        rates = get_rates()
+        assert rates['EUR'] == Decimal('0.8')
+        assert rates['GBP'] == Decimal('0.72')
+        assert convert(Decimal('10'), 'GBP', 'EUR') == Decimal('10') * Decimal('0.8') / Decimal('0.72')
+
+    def test_load_rates_command_reads_csv(self, tmp_path):
+        path = tmp_path / 'rates.csv'
+        path.write_text('currency,rate\nEUR,0.9\nJPY,150\n')
+
+        call_command('load_exchange_rates', str(path))
+
+        assert get_rates()['JPY'] == 150
+        assert get_rates()['EUR'] == Decimal('0.9')
+
+    def test_rate_must_be_positive(self):
+        with pytest.raises(ValidationError):
+            ExchangeRate(currency='GBP', rate=Decimal('0')).full_clean()
+        with pytest.raises(IntegrityError), transaction.atomic():
+            ExchangeRate.objects.create(currency='GBP', rate=Decimal('0'))
+
+    def test_load_rates_command_rejects_rates_that_round_to_zero(self, tmp_path):
+        path = tmp_path / 'rates.json'
+        path.write_text(json.dumps({'base': 'USD', 'rates': {'USD': 1, 'XYZ': 0.000000001}}))
+
+        with pytest.raises(CommandError):
+            call_command('load_exchange_rates', str(path))
+
+        assert not ExchangeRate.objects.filter(currency='XYZ').exists()
+
+    def test_order_in_any_supported_currency(self, api_client, create_cart_item, create_item):
+        ExchangeRate.objects.create(currency='GBP', rate=Decimal('0.5'))
+        cart_item = create_cart_item(item=create_item(price=10), quantity=2)
+
+        response = api_client.post('/api/orders/', {'cart_id': str(cart_item.cart.id), 'currency': 'GBP'})
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['total'] == 10
+        assert response.data['order_currency'] == 'GBP'
+
+    def test_buy_item_with_unsupported_currency_returns_400(self, api_client, create_item):
+        item = create_item(price=10)
+
+        response = api_client.get(f'/api/buy/{item.id}/?cur=XYZ')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
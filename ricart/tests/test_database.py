@@ -0,0 +1,85 @@
+import importlib
+import pytest
+from django.db import connection
+from ricart import settings as settings_module
+from shop.bench import CheckoutBenchmark
+from shop.models import Cart, Item, Order, SalesRollup
+
+
+@pytest.fixture
+def load_settings(monkeypatch):
+    """re-run ricart/settings.py with the given environment, the module is put back afterwards"""
+    def load(**env):
+        for name in ('DJANGO_DB_PROFILE', 'DB_POOL', 'DB_CONN_MAX_AGE', 'DATABASE_REPLICAS', 'SQLITE_PATH', 'POSTGRES_DB', 'POSTGRES_HOST'):
+            monkeypatch.delenv(name, raising=False)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return importlib.reload(settings_module)
+    yield load
+    monkeypatch.undo()
+    importlib.reload(settings_module)
+
+
+class TestDatabaseProfile:
+    @pytest.mark.django_db
+    def test_sqlite_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            pragmas = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0] for name in ('synchronous', 'busy_timeout', 'cache_size')}
+
+        assert pragmas == {'synchronous': 1, 'busy_timeout': 5000, 'cache_size': -65536}
+
+    def test_sqlite_profile(self, load_settings):
+        database = load_settings().DATABASES['default']
+
+        assert database['ENGINE'] == 'django.db.backends.sqlite3'
+        assert 'PRAGMA journal_mode=WAL;' in database['OPTIONS']['init_command']
+        assert database['OPTIONS']['transaction_mode'] == 'IMMEDIATE'
+        assert database['CONN_MAX_AGE'] == 60
+
+    def test_empty_values_from_env_example_mean_the_defaults(self, load_settings):
+        # a .env copied from .env.example sets these keys to ''
+        database = load_settings(DJANGO_DB_PROFILE='', SQLITE_PATH='', DB_CONN_MAX_AGE='').DATABASES['default']
+
+        assert database['ENGINE'] == 'django.db.backends.sqlite3'
+        assert str(database['NAME']).endswith('db.sqlite3')
+        assert database['CONN_MAX_AGE'] == 60
+
+        database = load_settings(DJANGO_DB_PROFILE='postgres', POSTGRES_DB='', POSTGRES_HOST='').DATABASES['default']
+
+        assert (database['NAME'], database['HOST']) == ('rishatstore', 'localhost')
+
+    def test_postgres_profile_keeps_connections_and_checks_them(self, load_settings):
+        database = load_settings(DJANGO_DB_PROFILE='postgres', DB_CONN_MAX_AGE='120').DATABASES['default']
+
+        assert database['ENGINE'] == 'django.db.backends.postgresql'
+        assert database['CONN_MAX_AGE'] == 120
+        assert database['CONN_HEALTH_CHECKS'] is True
+        assert 'OPTIONS' not in database
+
+    def test_postgres_profile_with_pool(self, load_settings):
+        database = load_settings(DJANGO_DB_PROFILE='postgres', DB_POOL='1').DATABASES['default']
+
+        assert database['CONN_MAX_AGE'] == 0
+        assert database['OPTIONS']['pool'] == {'min_size': 2, 'max_size': 10, 'timeout': 10}
+
+    def test_postgres_replicas_are_hosts(self, load_settings):
+        databases = load_settings(DJANGO_DB_PROFILE='postgres', DATABASE_REPLICAS='db-replica').DATABASES
+
+        assert databases['replica1']['HOST'] == 'db-replica'
+        assert databases['replica1']['NAME'] == databases['default']['NAME']
+
+
+@pytest.mark.django_db(transaction=True, serialized_rollback=True)
+class TestCheckoutBenchmark:
+    def test_runs_checkouts_and_cleans_up(self):
+        SalesRollup.objects.all().delete()
+
+        stats = CheckoutBenchmark(workers=2, checkouts=6, lines=2, items=4).run()
+
+        assert stats['checkouts'] + stats['errors'] == 6
+        assert stats['checkouts'] > 0
+        assert stats['rate'] > 0
+        assert not Order.objects.exists()
+        assert not Cart.objects.exists()
+        assert not Item.objects.exists()
+        assert not SalesRollup.objects.exclude(order_count=0).exists()
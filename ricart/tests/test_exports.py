@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+from shop.models import Item, Order, OrderItem
+
+
+def make_order(lines=1, **kwargs):
+    order = baker.make(Order, total=Decimal('10.00'), **kwargs)
+    for item in baker.make(Item, price=Decimal('5.00'), _quantity=lines):
+        baker.make(OrderItem, order=order, item=item, quantity=2, unit_price=item.price)
+    return order
+
+
+@pytest.mark.django_db
+class TestOrderExport:
+    def test_export_requires_staff(self, api_client):
+        response = api_client.get('/api/orders/export/')
+
+        assert response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN)
+
+    def test_csv_has_one_row_per_line(self, admin_client):
+        order = make_order(lines=2)
+
+        response = admin_client.get('/api/orders/export/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        assert [row['order_id'] for row in rows] == [str(order.id)] * 2
+        assert rows[0]['total'] == '10.00' and rows[0]['unit_price'] == '5.00'
+
+    def test_ndjson_has_one_object_per_order(self, admin_client):
+        first, second = make_order(lines=2), make_order(lines=1)
+
+        response = admin_client.get('/api/orders/export/?output=ndjson')
+
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        assert {record['order_id']: len(record['items']) for record in records} == {str(first.id): 2, str(second.id): 1}
+        assert response['Content-Type'] == 'application/x-ndjson'
+
+    def test_filters(self, admin_client):
+        today = timezone.localdate()
+        wanted = make_order(payment_status=Order.PAYMENT_COMPLETE, order_currency='EUR')
+        make_order(payment_status=Order.PAYMENT_PENDING, order_currency='EUR')
+        make_order(payment_status=Order.PAYMENT_COMPLETE, order_currency='USD')
+        old = make_order(payment_status=Order.PAYMENT_COMPLETE, order_currency='EUR')
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=10))
+
+        response = admin_client.get(f'/api/orders/export/?output=ndjson&status=C&currency=eur&since={today - timedelta(days=1)}&until={today}')
+
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        assert [record['order_id'] for record in records] == [str(wanted.id)]
+
+    @pytest.mark.parametrize('query', ['output=xml', 'status=Z', 'since=yesterday', 'since=2026-02-01&until=2026-01-01'])
+    def test_invalid_filters_return_400(self, admin_client, query):
+        assert admin_client.get(f'/api/orders/export/?{query}').status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_export_reads_in_chunks(self, admin_client, django_assert_num_queries):
+        for _ in range(5):
+            make_order(lines=3)
+
+        # session, user, then one query however many orders, read chunk by chunk while the response streams
+        with django_assert_num_queries(3):
+            body = b''.join(admin_client.get('/api/orders/export/').streaming_content)
+
+        assert len(body.decode().splitlines()) == 16
+
+    def test_command_writes_file(self, tmp_path):
+        order = make_order(lines=1, order_currency='EUR')
+        path = tmp_path / 'orders.ndjson'
+
+        call_command('export_orders', '--output', 'ndjson', '--currency', 'EUR', '--chunk-size', '1', '--file', str(path))
+
+        assert json.loads(path.read_text())['order_id'] == str(order.id)
@@ -0,0 +1,121 @@
+import json
+from decimal import Decimal
+from io import StringIO
+import pytest
+from django.core.management import call_command
+from shop.catalog import get_catalog_version
+from shop.imports import ItemImporter, clean_row, InvalidRow
+from shop.models import Item, ItemPrice, ExchangeRate
+from shop.search import search_items
+
+
+def write_csv(path, rows):
+    lines = ['sku,name,description,price,currency'] + [','.join(row) for row in rows]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def import_items(path, *args):
+    out = StringIO()
+    call_command('import_items', path, *args, stdout=out, stderr=out)
+    return out.getvalue()
+
+
+class Request:
+    pass
+
+
+@pytest.mark.django_db
+class TestImportItems:
+    def test_csv_import_creates_items(self, tmp_path):
+        path = write_csv(tmp_path / 'catalog.csv', [
+            ['A-1', 'Red kettle', 'Boils water', '19.99', 'USD'],
+            ['A-2', 'Blue mug', '', '4.5', 'eur'],
+        ])
+
+        output = import_items(path)
+
+        assert '2 created' in output and 'rows/s' in output
+        assert dict(Item.objects.values_list('sku', 'price')) == {'A-1': Decimal('19.99'), 'A-2': Decimal('4.50')}
+        assert Item.objects.get(sku='A-2').currency == 'EUR'
+
+    def test_rerun_of_unchanged_file_writes_nothing(self, tmp_path, django_assert_num_queries):
+        path = write_csv(tmp_path / 'catalog.csv', [[f'SKU-{i}', f'Item {i}', '', '1.00', 'USD'] for i in range(10)])
+        import_items(path)
+        version = get_catalog_version(Request())
+
+        # one SELECT of the existing SKUs per batch, nothing else
+        with django_assert_num_queries(2):
+            output = import_items(path, '--batch-size', '5')
+
+        assert '10 unchanged' in output
+        assert get_catalog_version(Request()) == version
+
+    def test_changed_rows_are_updated_with_price_book_and_search_index(self, tmp_path):
+        ExchangeRate.objects.update_or_create(currency='EUR', defaults={'rate': Decimal('0.5')})
+        import_items(write_csv(tmp_path / 'v1.csv', [['A-1', 'Red kettle', '', '10.00', 'USD'], ['A-2', 'Mug', '', '2.00', 'USD']]))
+        version = get_catalog_version(Request())
+
+        output = import_items(write_csv(tmp_path / 'v2.csv', [['A-1', 'Green kettle', '', '20.00', 'USD'], ['A-2', 'Mug', '', '2.00', 'USD']]))
+
+        assert '1 updated, 1 unchanged' in output
+        item = Item.objects.get(sku='A-1')
+        assert ItemPrice.objects.get(item=item, currency='EUR').price == Decimal('10.00')
+        assert [found.pk for found in search_items(Item.objects.all(), 'green')] == [item.pk]
+        assert get_catalog_version(Request())[0] > version[0]
+
+    def test_jsonl_with_invalid_rows(self, tmp_path):
+        path = tmp_path / 'catalog.jsonl'
+        path.write_text('\n'.join([
+            json.dumps({'sku': 'J-1', 'name': 'Lamp', 'price': '12'}),
+            'not json',
+            json.dumps({'sku': 'J-2', 'name': 'Chair', 'price': '-1'}),
+            json.dumps({'sku': 'J-1', 'name': 'Desk lamp', 'price': '13'}),
+        ]))
+
+        output = import_items(str(path))
+
+        assert '2 invalid' in output
+        assert 'row 2: not a JSON object' in output
+        assert list(Item.objects.values_list('sku', 'name')) == [('J-1', 'Desk lamp')]
+
+    def test_non_finite_prices_are_invalid_rows(self, tmp_path):
+        path = write_csv(tmp_path / 'catalog.csv', [
+            ['N-1', 'Not a number', '', 'NaN', 'USD'],
+            ['N-2', 'Endless', '', 'Infinity', 'USD'],
+            ['N-3', 'Kettle', '', '5.00', 'USD'],
+        ])
+
+        output = import_items(path)
+
+        assert '1 created' in output and '2 invalid' in output
+        assert "row 1: invalid price 'NaN'" in output
+        assert list(Item.objects.values_list('sku', flat=True)) == ['N-3']
+
+    def test_dry_run_writes_nothing(self, tmp_path):
+        output = import_items(write_csv(tmp_path / 'catalog.csv', [['A-1', 'Kettle', '', '1.00', 'USD']]), '--dry-run')
+
+        assert '[dry run]' in output and '1 created' in output
+        assert not Item.objects.exists()
+
+    def test_importer_streams_batches(self):
+        rows = ({'sku': f'G-{i}', 'name': f'Item {i}', 'price': '1'} for i in range(7))
+        seen = []
+
+        stats = ItemImporter(batch_size=3, on_batch=lambda stats: seen.append(stats['read'])).run(rows)
+
+        assert seen == [3, 6, 7]
+        assert stats['created'] == 7
+
+    @pytest.mark.parametrize('row', [
+        {'name': 'No sku', 'price': '1'},
+        {'sku': 'X', 'price': '1'},
+        {'sku': 'X', 'name': 'Bad price', 'price': 'abc'},
+        {'sku': 'X', 'name': 'NaN price', 'price': 'nan'},
+        {'sku': 'X', 'name': 'Endless price', 'price': '-Infinity'},
+        {'sku': 'X', 'name': 'Huge price', 'price': '123456789012'},
+        {'sku': 'X', 'name': 'Bad currency', 'price': '1', 'currency': 'GBP'},
+    ])
+    def test_clean_row_rejects(self, row):
+        with pytest.raises(InvalidRow):
+            clean_row(row)
@@ -0,0 +1,57 @@
+import re
+import uuid
+from datetime import timedelta
+import pytest
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from shop.admin import _uuid_prefix_range
+from shop.models import Order
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(connection.vendor != 'sqlite', reason='reads SQLite EXPLAIN QUERY PLAN output'),
+]
+
+
+def assert_plan_uses(queryset, index):
+    """the plan reads shop_order through `index`, never a full table scan or a sort of the whole table"""
+    plan = queryset.explain()
+    assert index in plan, plan
+    assert not re.search(r'SCAN shop_order\s*$', plan, re.MULTILINE), plan
+    assert 'TEMP B-TREE' not in plan, plan
+
+
+class TestOrderQueryPlans:
+    def test_payment_intent_lookup(self):
+        assert_plan_uses(Order.objects.filter(stripe_payment_intent_id='pi_123'), 'shop_order_intent_idx')
+
+    def test_webhook_batch_lookup(self):
+        # shop.webhooks.process_stripe_events: orders by id or by intent id
+        orders = Order.objects.filter(Q(pk__in=[uuid.uuid4()]) | Q(stripe_payment_intent_id__in=['pi_1', 'pi_2']))
+
+        assert_plan_uses(orders, 'shop_order_intent_idx')
+
+    def test_dashboard_recent_orders(self):
+        assert_plan_uses(Order.objects.order_by('-created_at')[:10], 'shop_order_created_idx')
+
+    def test_admin_status_filter(self):
+        orders = Order.objects.filter(payment_status=Order.PAYMENT_COMPLETE).order_by('-created_at')
+
+        assert_plan_uses(orders, 'shop_order_status_idx')
+
+    def test_admin_currency_filter(self):
+        orders = Order.objects.filter(order_currency='EUR', created_at__gte=timezone.now() - timedelta(days=7)).order_by('-created_at')
+
+        assert_plan_uses(orders, 'shop_order_currency_idx')
+
+    def test_pending_orders_by_age(self):
+        orders = Order.objects.filter(
+            payment_status=Order.PAYMENT_PENDING, created_at__lt=timezone.now() - timedelta(minutes=30),
+        ).exclude(stripe_payment_intent_id='')
+
+        assert_plan_uses(orders, 'shop_order_status_idx')
+
+    def test_admin_search_by_id_prefix(self):
+        # the primary key's own index (sqlite_autoindex_shop_order_1)
+        assert_plan_uses(Order.objects.filter(pk__range=_uuid_prefix_range('1a2b3c4d')), 'sqlite_autoindex_shop_order')
@@ -14,7 +14,7 @@ class TestItems:
         response = api_client.get('/api/items/')
         
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) == 2
+        assert len(response.data['results']) == 2
 
     def test_get_existing_item_returns_200(self, api_client, create_item):
         """Test retrieving an existing item returns 200"""
@@ -40,4 +40,97 @@ class TestItems:
         
         for invalid_id in invalid_ids:
             response = api_client.get(f'/api/items/{invalid_id}/')
-            assert response.status_code == status.HTTP_404_NOT_FOUND
\ No newline at end of file
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_list_items_follows_cursor_until_last_page(self, api_client, create_item):
+        """Test walking next links returns every item exactly once, in id order"""
+        items = [create_item() for _ in range(5)]
+
+        seen = []
+        url = '/api/items/?limit=2'
+        while url:
+            response = api_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.data['results']) <= 2
+            seen += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+
+        assert seen == [item.id for item in items]
+
+    def test_list_items_ordered_by_price_with_previous_link(self, api_client, create_item):
+        """Test ordering by price pages by (price, id) and previous link returns the first page again"""
+        for price in [30, 10, 20, 10, 40]:
+            create_item(price=price)
+
+        first = api_client.get('/api/items/?limit=2&ordering=price')
+        second = api_client.get(first.data['next'])
+        back = api_client.get(second.data['previous'])
+
+        assert [item['price'] for item in first.data['results']] == [10, 10]
+        assert [item['price'] for item in second.data['results']] == [20, 30]
+        assert back.data['results'] == first.data['results']
+        assert first.data['previous'] is None
+
+    def test_list_items_with_invalid_cursor_returns_404(self, api_client):
+        """Test tampered cursor returns 404"""
+        response = api_client.get('/api/items/?cursor=not-a-cursor')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestItemsConditionalGet:
+    def test_list_items_returns_etag_and_last_modified(self, api_client, create_item):
+        create_item()
+
+        response = api_client.get('/api/items/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'].startswith('"')
+        assert 'Last-Modified' in response
+
+    def test_list_items_with_current_etag_returns_304(self, api_client, create_item, django_assert_num_queries):
+        create_item()
+        etag = api_client.get('/api/items/')['ETag']
+
+        # only the catalog version is read, items are neither queried nor serialized
+        with django_assert_num_queries(1):
+            response = api_client.get('/api/items/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_saving_item_changes_etag(self, api_client, create_item):
+        item = create_item(price=10)
+        etag = api_client.get('/api/items/')['ETag']
+
+        item.price = 12
+        item.save()
+        response = api_client.get('/api/items/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+
+    def test_deleting_item_changes_etag(self, api_client, create_item):
+        item = create_item()
+        etag = api_client.get(f'/api/items/{item.id}/')['ETag']
+
+        item.delete()
+        response = api_client.get('/api/items/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_admin_list_editable_price_edit_changes_etag(self, api_client, admin_client, create_item):
+        item = create_item(price=10)
+        etag = api_client.get('/api/items/')['ETag']
+
+        admin_client.post('/admin/shop/item/', {
+            'form-TOTAL_FORMS': '1',
+            'form-INITIAL_FORMS': '1',
+            'form-0-id': str(item.id),
+            'form-0-price': '15.00',
+            '_save': 'Save',
+        })
+        response = api_client.get('/api/items/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'][0]['price'] == 15
@@ -0,0 +1,166 @@
+from datetime import timedelta
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from shop.jobs import job, enqueue, claim_jobs, run_job, run_pending_jobs, requeue, UnknownJob
+from shop.models import Job, DeadLetterJob, Order
+
+calls = []
+
+
+@job('test.record')
+def record(value):
+    calls.append(value)
+
+
+@job('test.explode')
+def explode():
+    raise RuntimeError('boom')
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+@pytest.mark.django_db
+class TestJobQueue:
+    def test_enqueued_job_runs_once_and_is_deleted(self):
+        enqueue('test.record', value=42)
+
+        assert run_pending_jobs() == 1
+        assert run_pending_jobs() == 0
+        assert calls == [42]
+        assert not Job.objects.exists()
+
+    def test_unknown_job_name_is_rejected(self):
+        with pytest.raises(UnknownJob):
+            enqueue('test.missing')
+
+    def test_delayed_job_waits_for_run_at(self):
+        enqueue('test.record', delay=60, value=1)
+
+        assert run_pending_jobs() == 0
+
+    def test_claimed_job_is_not_claimed_twice_until_lease_expires(self):
+        queued = enqueue('test.record', value=1)
+
+        assert [j.pk for j in claim_jobs(10)] == [queued.pk]
+        assert claim_jobs(10) == []
+
+        Job.objects.filter(pk=queued.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        assert [j.pk for j in claim_jobs(10)] == [queued.pk]
+
+    def test_claim_respects_limit_and_order(self):
+        later = enqueue('test.record', value=2)
+        first = enqueue('test.record', value=1)
+        Job.objects.filter(pk=first.pk).update(run_at=timezone.now() - timedelta(minutes=1))
+
+        assert [j.pk for j in claim_jobs(1)] == [first.pk]
+        assert [j.pk for j in claim_jobs(1)] == [later.pk]
+
+    def test_failed_job_is_retried_with_backoff(self, settings):
+        settings.JOB_BACKOFF_BASE = 10
+        enqueue('test.explode')
+
+        run_pending_jobs()
+
+        failed = Job.objects.get()
+        assert failed.attempts == 1
+        assert 'boom' in failed.last_error
+        assert failed.locked_by == ''
+        assert timezone.now() + timedelta(seconds=7) < failed.run_at < timezone.now() + timedelta(seconds=13)
+
+    def test_job_is_dead_lettered_after_max_attempts(self):
+        enqueue('test.explode', max_attempts=2)
+        for _ in range(2):
+            Job.objects.update(run_at=timezone.now())
+            run_pending_jobs()
+
+        assert not Job.objects.exists()
+        dead = DeadLetterJob.objects.get()
+        assert (dead.name, dead.attempts) == ('test.explode', 2)
+        assert 'RuntimeError' in dead.last_error
+
+    def test_dead_letter_leaves_a_job_reclaimed_by_another_worker(self):
+        enqueue('test.explode', max_attempts=1)
+        claimed = claim_jobs(1)[0]
+        # our lease ran out and another worker claimed the job meanwhile
+        Job.objects.filter(pk=claimed.pk).update(locked_by='other-worker')
+
+        assert run_job(claimed) is False
+
+        assert Job.objects.get().locked_by == 'other-worker'
+        assert not DeadLetterJob.objects.exists()
+
+    def test_requeue_moves_dead_letter_back(self):
+        enqueue('test.explode', max_attempts=1)
+        run_pending_jobs()
+
+        requeue(DeadLetterJob.objects.all())
+
+        assert not DeadLetterJob.objects.exists()
+        assert Job.objects.get().attempts == 0
+
+    def test_job_enqueued_in_rolled_back_transaction_does_not_exist(self):
+        from django.db import transaction
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                enqueue('test.record', value=1)
+                raise RuntimeError
+
+        assert not Job.objects.exists()
+
+    def test_run_jobs_command(self):
+        enqueue('test.record', value=1)
+        enqueue('test.record', value=2)
+
+        call_command('run_jobs', batch_size=1)
+
+        assert sorted(calls) == [1, 2]
+
+
+@pytest.mark.django_db
+class TestCancelPaymentJob:
+    def test_cancel_queues_stripe_cancellation(self, api_client, create_order, fake_stripe):
+        order = create_order(total=10.00)
+        api_client.post('/api/payment/sessions/', {'order_id': str(order.id)})
+
+        response = api_client.post('/api/payment/cancel/', {'order_id': str(order.id)})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [call[0] for call in fake_stripe.calls] == ['create']  # nothing inline
+        assert Order.objects.get(pk=order.pk).payment_status == Order.PAYMENT_CANCELLED
+
+        run_pending_jobs()
+        assert fake_stripe.intents['pi_fake_1']['status'] == 'canceled'
+        assert not Job.objects.exists()
+
+    def test_order_settled_meanwhile_is_not_cancelled(self, api_client, create_order, fake_stripe, monkeypatch):
+        order = create_order(total=10.00)
+        api_client.post('/api/payment/sessions/', {'order_id': str(order.id)})
+
+        def webhook_wins(order):
+            # the webhook completes the order after the view has read it
+            Order.objects.filter(pk=order.pk).update(payment_status=Order.PAYMENT_COMPLETE)
+        monkeypatch.setattr('shop.views.validate_order_for_cancellation', webhook_wins)
+
+        response = api_client.post('/api/payment/cancel/', {'order_id': str(order.id)})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert Order.objects.get(pk=order.pk).payment_status == Order.PAYMENT_COMPLETE
+        assert not Job.objects.exists()
+
+    def test_already_settled_intent_is_not_retried(self, create_order, fake_stripe, monkeypatch):
+        import stripe
+
+        def unexpected_state(intent_id, params=None, options=None):
+            raise stripe.InvalidRequestError('This PaymentIntent has already succeeded', 'intent', code='payment_intent_unexpected_state')
+        monkeypatch.setattr(fake_stripe, 'cancel', unexpected_state)
+        enqueue('stripe.cancel_payment_intent', intent_id='pi_1', currency='USD')
+
+        run_pending_jobs()
+
+        assert not Job.objects.exists()
+        assert not DeadLetterJob.objects.exists()
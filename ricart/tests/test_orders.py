@@ -1,5 +1,10 @@
 import pytest
+from uuid import uuid4
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from shop.models import Cart, CartItem, Order, OrderItem
+from shop.serializer import CreateOrderSerializer
+from shop.pricing import get_active_pricing_rules
 
 @pytest.mark.django_db
 class TestOrders:
@@ -29,3 +34,55 @@ class TestOrders:
         
         assert response.status_code == status.HTTP_404_NOT_FOUND
 
+
+    def test_create_order_from_empty_cart_returns_400(self, api_client, create_cart):
+        cart = create_cart()
+
+        response = api_client.post('/api/orders/', {'cart_id': str(cart.id)})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['cart_id'] == ['Cart is empty.']
+
+    def test_create_order_from_unknown_cart_returns_400(self, api_client):
+        response = api_client.post('/api/orders/', {'cart_id': str(uuid4())})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['cart_id'] == ['No cart with the given ID was found.']
+
+    def test_create_order_deletes_cart(self, api_client, create_cart_item):
+        cart_item = create_cart_item(quantity=2)
+
+        api_client.post('/api/orders/', {'cart_id': str(cart_item.cart.id)})
+
+        assert not Cart.objects.filter(pk=cart_item.cart.id).exists()
+        assert not CartItem.objects.filter(pk=cart_item.pk).exists()
+
+    def test_same_cart_checked_out_twice_makes_one_order(self, create_cart_item):
+        cart_id = create_cart_item(quantity=2).cart.id
+        # both validated (cart lines read) before either saves, as two concurrent requests would be
+        first = CreateOrderSerializer(data={'cart_id': str(cart_id)})
+        second = CreateOrderSerializer(data={'cart_id': str(cart_id)})
+        assert first.is_valid() and second.is_valid()
+
+        first.save()
+        with pytest.raises(ValidationError) as error:
+            second.save()
+
+        assert 'already been checked out' in str(error.value.detail)
+        assert Order.objects.count() == 1
+        assert OrderItem.objects.count() == 1
+
+    @pytest.mark.parametrize('lines', [1, 25])
+    def test_create_order_query_count_does_not_grow_with_cart(self, api_client, create_cart, create_item, create_cart_item, django_assert_num_queries, lines):
+        cart = create_cart()
+        for _ in range(lines):
+            create_cart_item(cart=cart, item=create_item(price=10), quantity=2)
+        get_active_pricing_rules()  # discount/tax are cached per process, warm like a running server
+
+        # cart lines, savepoint, order insert, order items insert, sales rollup upsert,
+        # cart read by Cart.delete(), cart items delete, cart delete, release
+        with django_assert_num_queries(9):
+            response = api_client.post('/api/orders/', {'cart_id': str(cart.id)})
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(response.data['items']) == lines
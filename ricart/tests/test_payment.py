@@ -1,6 +1,11 @@
+from decimal import Decimal
 import pytest
+import stripe
+from django.core.cache import cache
 from rest_framework import status
-from shop.models import  Order
+from shop.models import  Order, ExchangeRate
+from shop.payments import StripeClientRegistry, stripe_amount
+from shop.jobs import run_pending_jobs
 
 @pytest.mark.django_db
 class TestPayment:
@@ -50,15 +55,14 @@ class TestPayment:
         assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
         assert 'error' in response.data
 
-    def test_confirm_payment_with_completed_order_returns_400(self, api_client, create_order):
-        """Test confirming payment for already completed order returns 400"""
+    def test_confirm_payment_with_completed_order_returns_200(self, api_client, create_order):
+        """Test confirming an order the webhook already completed returns 200 without calling Stripe"""
         order = create_order(payment_status=Order.PAYMENT_COMPLETE)
         
         response = api_client.post('/api/payment/confirm/', {'order_id': str(order.id)})
         
-        assert response.status_code == status.HTTP_400_BAD_REQUEST
-        assert 'error' in response.data
-        assert 'completed' in response.data['error'].lower()
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == 'success'
 
     def test_confirm_payment_with_pending_order_returns_200_or_400(self, api_client, create_order):
         """Test confirming payment for pending order (may succeed or fail based on Stripe)"""
@@ -154,4 +158,126 @@ class TestPayment:
         response = api_client.post('/api/payment/cancel/', {'order_id': str(nonexistent_id)})
         
         assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
-        assert 'error' in response.data
\ No newline at end of file
+        assert 'error' in response.data
+
+@pytest.mark.django_db
+class TestStripeClients:
+    def test_registry_reuses_one_client_per_account(self, settings):
+        settings.STRIPE_SECRET_KEY = 'sk_test_usd'
+        settings.STRIPE_SECRET_KEY_EUR = 'sk_test_eur'
+        registry = StripeClientRegistry()
+
+        usd = registry.get('USD')
+
+        assert registry.get('USD') is usd
+        assert registry.get('GBP') is usd  # other currencies are paid into the default account
+        assert registry.get('EUR') is not usd
+
+    def test_registry_does_not_touch_global_api_key(self, settings):
+        settings.STRIPE_SECRET_KEY = 'sk_test_usd'
+        stripe.api_key = None
+
+        StripeClientRegistry().get('USD')
+
+        assert stripe.api_key is None
+
+    def test_sessions_uses_client_of_order_account(self, api_client, create_order, fake_stripe):
+        order = create_order(total=10.00, order_currency='EUR')
+
+        response = api_client.post('/api/payment/sessions/', {'order_id': str(order.id)})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['payment_intent_id'] == 'pi_fake_1'
+        assert fake_stripe.calls[0][1]['currency'] == 'eur'
+        assert fake_stripe.calls[0][1]['amount'] == 1000
+
+    def test_zero_decimal_currency_is_sent_in_whole_units(self, api_client, create_order, fake_stripe):
+        ExchangeRate.objects.update_or_create(currency='JPY', defaults={'rate': Decimal('150')})
+        order = create_order(total=Decimal('1500.50'), order_currency='JPY')
+
+        response = api_client.post('/api/payment/sessions/', {'order_id': str(order.id)})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert fake_stripe.calls[0][1]['currency'] == 'jpy'
+        assert fake_stripe.calls[0][1]['amount'] == 1501
+
+    @pytest.mark.parametrize('total, currency, amount', [
+        ('10.00', 'USD', 1000),
+        ('19.995', 'EUR', 2000),
+        ('0.29', 'USD', 29),
+        ('1234', 'KRW', 1234),
+        ('1.234', 'KWD', 1230),
+    ])
+    def test_stripe_amount(self, total, currency, amount):
+        assert stripe_amount(Decimal(total), currency) == amount
+
+    def test_cancel_and_confirm_use_registry_client(self, api_client, create_order, fake_stripe):
+        order = create_order(total=10.00)
+        api_client.post('/api/payment/sessions/', {'order_id': str(order.id)})
+
+        confirm = api_client.post('/api/payment/confirm/', {'order_id': str(order.id)})
+        order.refresh_from_db()
+        assert order.payment_status == Order.PAYMENT_FAILED  # intent was never paid
+        order.payment_status = Order.PAYMENT_PENDING
+        order.save()
+        cancel = api_client.post('/api/payment/cancel/', {'order_id': str(order.id)})
+        run_pending_jobs()  # the intent is cancelled by a background job
+
+        assert confirm.status_code == status.HTTP_400_BAD_REQUEST
+        assert cancel.status_code == status.HTTP_200_OK
+        assert [call[0] for call in fake_stripe.calls] == ['create', 'retrieve', 'cancel']
+
+
+@pytest.mark.django_db
+class TestPaymentSessionReuse:
+    def sessions(self, api_client, order):
+        return api_client.post('/api/payment/sessions/', {'order_id': str(order.id)})
+
+    def test_repeated_sessions_cost_one_stripe_call(self, api_client, create_order, fake_stripe):
+        order = create_order(total=10.00)
+
+        first = self.sessions(api_client, order)
+        second = self.sessions(api_client, order)
+
+        assert first.data == second.data
+        assert [call[0] for call in fake_stripe.calls] == ['create']
+        assert fake_stripe.calls[0][2]['idempotency_key'].startswith(f'payment-session-{order.id}-')
+
+    def test_existing_intent_is_reused_after_cache_expiry(self, api_client, create_order, fake_stripe):
+        order = create_order(total=10.00)
+        first = self.sessions(api_client, order)
+        cache.clear()
+
+        second = self.sessions(api_client, order)
+
+        assert second.data['payment_intent_id'] == first.data['payment_intent_id']
+        assert [call[0] for call in fake_stripe.calls] == ['create', 'retrieve']
+
+    def test_changed_amount_updates_intent(self, api_client, create_order, fake_stripe):
+        order = create_order(total=10.00)
+        self.sessions(api_client, order)
+        Order.objects.filter(pk=order.pk).update(total=12.00)
+
+        response = self.sessions(api_client, order)
+
+        assert response.data['payment_intent_id'] == 'pi_fake_1'
+        assert [call[0] for call in fake_stripe.calls] == ['create', 'retrieve', 'update']
+        assert fake_stripe.intents['pi_fake_1']['amount'] == 1200
+
+    def test_canceled_intent_is_replaced(self, api_client, create_order, fake_stripe):
+        order = create_order(total=10.00)
+        self.sessions(api_client, order)
+        fake_stripe.intents['pi_fake_1']['status'] = 'canceled'
+        cache.clear()
+
+        response = self.sessions(api_client, order)
+
+        order.refresh_from_db()
+        assert response.data['payment_intent_id'] == order.stripe_payment_intent_id == 'pi_fake_2'
+
+    def test_unknown_intent_is_replaced(self, api_client, create_order, fake_stripe):
+        order = create_order(total=10.00, stripe_payment_intent_id='pi_from_another_account')
+
+        response = self.sessions(api_client, order)
+
+        assert response.data['payment_intent_id'] == 'pi_fake_1'
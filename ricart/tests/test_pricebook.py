@@ -0,0 +1,67 @@
+import pytest
+from decimal import Decimal
+from rest_framework import status
+from shop.models import ExchangeRate, ItemPrice
+from shop.pricebook import rebuild_price_book
+from shop.rates import load_rates
+
+
+@pytest.mark.django_db
+class TestPriceBook:
+    def test_saving_item_prices_it_in_every_currency(self, create_item):
+        item = create_item(price=Decimal('10.00'), currency='USD')
+
+        prices = dict(ItemPrice.objects.filter(item=item).values_list('currency', 'price'))
+
+        assert prices == {'USD': Decimal('10.00'), 'EUR': Decimal('8.60')}
+
+    def test_loading_rates_reprices_every_item(self, create_item):
+        items = [create_item(price=Decimal('10.00'), currency='USD') for _ in range(3)]
+
+        load_rates({'EUR': '0.5', 'GBP': '0.25'})
+
+        assert ItemPrice.objects.filter(item__in=items, currency='EUR', price=Decimal('5.00')).count() == 3
+        assert ItemPrice.objects.filter(item__in=items, currency='GBP', price=Decimal('2.50')).count() == 3
+
+    def test_eur_item_is_converted_from_its_own_currency(self, create_item):
+        item = create_item(price=Decimal('8.60'), currency='EUR')
+
+        assert ItemPrice.objects.get(item=item, currency='USD').price == Decimal('10.00')
+
+    def test_rebuild_skips_unchanged_rows(self, create_item):
+        create_item(price=Decimal('10.00'))
+
+        assert rebuild_price_book() == 0
+
+    def test_deleted_currency_is_dropped_from_book(self, create_item):
+        item = create_item(price=Decimal('10.00'))
+
+        ExchangeRate.objects.filter(currency='EUR').delete()
+        rebuild_price_book()
+
+        assert list(ItemPrice.objects.filter(item=item).values_list('currency', flat=True)) == ['USD']
+
+    def test_list_items_in_currency_reads_price_book(self, api_client, create_item):
+        create_item(price=Decimal('10.00'))
+
+        response = api_client.get('/api/items/?currency=eur')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'][0]['display_price'] == Decimal('8.60')
+        assert response.data['results'][0]['display_currency'] == 'EUR'
+
+    def test_list_items_in_unknown_currency_returns_400(self, api_client):
+        response = api_client.get('/api/items/?currency=XYZ')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_order_uses_price_shown_in_catalog(self, api_client, create_cart_item, create_item):
+        item = create_item(price=Decimal('10.00'))
+        ItemPrice.objects.filter(item=item, currency='EUR').update(price=Decimal('9.99'))
+        cart_item = create_cart_item(item=item, quantity=2)
+
+        listed = api_client.get('/api/items/?currency=EUR').data['results'][0]['display_price']
+        order = api_client.post('/api/orders/', {'cart_id': str(cart_item.cart.id), 'currency': 'EUR'})
+
+        assert order.data['items'][0]['unit_price'] == listed
+        assert order.data['subtotal'] == Decimal('19.98')
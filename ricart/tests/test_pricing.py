@@ -0,0 +1,76 @@
+import pytest
+from django.db import IntegrityError, transaction
+from shop.models import Discount, Tax
+from shop.pricing import get_active_pricing_rules
+
+
+@pytest.mark.django_db
+class TestActivePricingRules:
+    def test_active_rules_are_cached(self, create_discount, create_tax, django_assert_num_queries):
+        discount = create_discount(is_active=True, percentage=10)
+        tax = create_tax(is_active=True, percentage=5)
+        get_active_pricing_rules()
+
+        with django_assert_num_queries(0):
+            rules = get_active_pricing_rules()
+
+        assert rules.discount == discount
+        assert rules.tax == tax
+
+    def test_saving_discount_invalidates_cache(self, create_discount):
+        discount = create_discount(is_active=True, percentage=10)
+        assert get_active_pricing_rules().discount.percentage == 10
+
+        discount.percentage = 20
+        discount.save()
+
+        assert get_active_pricing_rules().discount.percentage == 20
+
+    def test_deleting_tax_invalidates_cache(self, create_tax):
+        tax = create_tax(is_active=True, percentage=5)
+        assert get_active_pricing_rules().tax == tax
+
+        tax.delete()
+
+        assert get_active_pricing_rules().tax is None
+
+    def test_activating_discount_deactivates_previous_one(self, create_discount):
+        first = create_discount(is_active=True)
+        second = create_discount(is_active=True)
+
+        first.refresh_from_db()
+        assert not first.is_active
+        assert get_active_pricing_rules().discount == second
+
+    def test_database_rejects_two_active_taxes(self, create_tax):
+        create_tax(is_active=True)
+        other = create_tax(is_active=False)
+
+        with pytest.raises(IntegrityError), transaction.atomic():
+            Tax.objects.filter(pk=other.pk).update(is_active=True)
+
+    def test_admin_can_activate_another_discount(self, admin_client, create_discount):
+        first = create_discount(is_active=True)
+        second = create_discount(is_active=False)
+
+        response = admin_client.post(f'/admin/shop/discount/{second.pk}/change/', {
+            'name': second.name,
+            'percentage': '15.00',
+            'is_active': 'on',
+        })
+
+        assert response.status_code == 302
+        assert list(Discount.objects.filter(is_active=True)) == [second]
+        first.refresh_from_db()
+        assert not first.is_active
+
+    def test_order_uses_active_discount_and_tax(self, api_client, create_cart_item, create_item, create_discount, create_tax):
+        create_discount(is_active=True, percentage=10)
+        create_tax(is_active=True, percentage=20)
+        cart_item = create_cart_item(item=create_item(price=100), quantity=1)
+
+        response = api_client.post('/api/orders/', {'cart_id': str(cart_item.cart.id), 'currency': 'USD'})
+
+        assert response.data['discount_amount'] == 10
+        assert response.data['tax_amount'] == 18
+        assert response.data['total'] == 108
@@ -0,0 +1,71 @@
+import pytest
+from rest_framework import status
+from shop.pricing import get_active_pricing_rules
+
+
+@pytest.mark.django_db
+class TestQuotes:
+    def test_quote_items_returns_totals(self, api_client, create_item, create_discount, create_tax):
+        create_discount(is_active=True, percentage=10)
+        create_tax(is_active=True, percentage=20)
+        item = create_item(price=25)
+
+        response = api_client.post('/api/quotes/', {
+            'currency': 'USD',
+            'quotes': [{'items': [{'item_id': item.id, 'quantity': 4}]}],
+        }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        quote = response.data['quotes'][0]
+        assert quote['lines'][0]['line_total'] == 100
+        assert quote['subtotal'] == 100
+        assert quote['discount_amount'] == 10
+        assert quote['tax_amount'] == 18
+        assert quote['total'] == 108
+
+    def test_quote_matches_order_created_from_same_cart(self, api_client, create_cart, create_cart_item, create_item):
+        cart = create_cart()
+        create_cart_item(cart=cart, item=create_item(price=19.99), quantity=3)
+        create_cart_item(cart=cart, item=create_item(price=5.55), quantity=1)
+
+        quote = api_client.post('/api/quotes/', {'currency': 'EUR', 'quotes': [{'cart_id': str(cart.id)}]}, format='json')
+        order = api_client.post('/api/orders/', {'cart_id': str(cart.id), 'currency': 'EUR'})
+
+        assert quote.data['quotes'][0]['total'] == order.data['total']
+        assert quote.data['quotes'][0]['subtotal'] == order.data['subtotal']
+
+    def test_query_count_does_not_grow_with_quotes(self, api_client, create_cart, create_cart_item, create_item, django_assert_num_queries):
+        items = [create_item() for _ in range(10)]
+        carts = [create_cart() for _ in range(10)]
+        for cart in carts:
+            for item in items:
+                create_cart_item(cart=cart, item=item, quantity=2)
+        payload = {
+            'quotes': [{'cart_id': str(cart.id)} for cart in carts]
+            + [{'items': [{'item_id': item.id, 'quantity': 1} for item in items]} for _ in range(10)],
+        }
+        get_active_pricing_rules()
+
+        # one query for every cart line, one for every item
+        with django_assert_num_queries(2):
+            response = api_client.post('/api/quotes/', payload, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['quotes']) == 20
+
+    def test_quote_with_unknown_cart_and_item_returns_400(self, api_client, create_item):
+        item = create_item()
+
+        response = api_client.post('/api/quotes/', {'quotes': [
+            {'cart_id': '00000000-0000-0000-0000-000000000000'},
+            {'items': [{'item_id': item.id, 'quantity': 1}, {'item_id': 999999, 'quantity': 1}]},
+        ]}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'cart_id' in response.data['quotes'][0]
+        assert 'items' in response.data['quotes'][1]
+
+    def test_quote_requires_cart_id_or_items(self, api_client):
+        response = api_client.post('/api/quotes/', {'quotes': [{}]}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,95 @@
+from datetime import timedelta
+from io import StringIO
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from shop.models import Order
+from shop.reconcile import PaymentReconciler
+
+
+@pytest.fixture
+def pending_order(create_order, fake_stripe):
+    """a pending order created an hour ago whose fake intent has `status`"""
+    def _pending_order(intent_status, currency='USD', **intent):
+        order = create_order(total=10.00, order_currency=currency)
+        created = fake_stripe.create({'amount': 1000, 'currency': currency.lower()})
+        fake_stripe.intents[created['id']].update(status=intent_status, **intent)
+        Order.objects.filter(pk=order.pk).update(
+            stripe_payment_intent_id=created['id'],
+            created_at=timezone.now() - timedelta(hours=1),
+        )
+        return order
+    return _pending_order
+
+
+def statuses(*orders):
+    return [Order.objects.get(pk=order.pk).payment_status for order in orders]
+
+
+@pytest.mark.django_db
+class TestReconcilePayments:
+    def test_settles_orders_stripe_has_settled(self, pending_order):
+        paid = pending_order('succeeded')
+        canceled = pending_order('canceled', currency='EUR')
+        failed = pending_order('requires_payment_method', last_payment_error={'code': 'card_declined'})
+        open_intent = pending_order('requires_payment_method')
+
+        stats = PaymentReconciler(workers=2, batch_size=3).run()
+
+        assert statuses(paid, canceled, failed, open_intent) == [
+            Order.PAYMENT_COMPLETE, Order.PAYMENT_CANCELLED, Order.PAYMENT_FAILED, Order.PAYMENT_PENDING,
+        ]
+        assert stats['checked'] == 4
+        assert sum(stats['changed'].values()) == 3
+
+    def test_every_order_is_checked_once_across_batches(self, pending_order, fake_stripe):
+        orders = [pending_order('succeeded' if i % 2 else 'requires_payment_method') for i in range(7)]
+
+        stats = PaymentReconciler(workers=2, batch_size=2).run()
+
+        retrieved = [call[1] for call in fake_stripe.calls if call[0] == 'retrieve']
+        assert stats['checked'] == 7
+        assert sorted(retrieved) == sorted(Order.objects.get(pk=order.pk).stripe_payment_intent_id for order in orders)
+        assert stats['changed'][Order.PAYMENT_COMPLETE] == 3
+
+    def test_recent_and_intentless_orders_are_skipped(self, create_order, pending_order, fake_stripe):
+        recent = create_order(stripe_payment_intent_id='pi_recent')
+        create_order()
+
+        stats = PaymentReconciler().run()
+
+        assert stats['checked'] == 0
+        assert statuses(recent) == [Order.PAYMENT_PENDING]
+
+    def test_stripe_errors_are_counted_not_raised(self, pending_order):
+        order = pending_order('succeeded')
+        Order.objects.filter(pk=order.pk).update(stripe_payment_intent_id='pi_missing')
+
+        stats = PaymentReconciler().run()
+
+        assert stats['errors'] == 1
+        assert statuses(order) == [Order.PAYMENT_PENDING]
+
+    def test_order_settled_meanwhile_is_not_overwritten(self, pending_order, monkeypatch):
+        order = pending_order('canceled')
+        original = PaymentReconciler._apply
+
+        def settle_first(self, results):
+            Order.objects.filter(pk=order.pk).update(payment_status=Order.PAYMENT_COMPLETE)
+            original(self, results)
+        monkeypatch.setattr(PaymentReconciler, '_apply', settle_first)
+
+        stats = PaymentReconciler().run()
+
+        assert statuses(order) == [Order.PAYMENT_COMPLETE]
+        assert sum(stats['changed'].values()) == 0
+
+    def test_command_reports_throughput(self, pending_order):
+        pending_order('succeeded')
+        out = StringIO()
+
+        call_command('reconcile_payments', '--dry-run', stdout=out)
+
+        assert 'Checked 1 pending orders' in out.getvalue()
+        assert 'Complete: 1' in out.getvalue()
+        assert 'orders/s' in out.getvalue()
@@ -0,0 +1,123 @@
+from decimal import Decimal
+import pytest
+from django.core.management import call_command
+from django.test import RequestFactory
+from shop.admin import admin_site
+from shop.models import Order, SalesRollup
+from shop.rollups import rebuild_sales_rollups, record_transitions
+from shop.webhooks import process_stripe_events, record_event
+
+
+def rollups():
+    return {
+        (row.currency, row.payment_status): (row.order_count, row.revenue)
+        for row in SalesRollup.objects.all() if row.order_count
+    }
+
+
+@pytest.fixture
+def place_order(api_client, create_cart, create_item, create_cart_item):
+    def _place_order(price=Decimal('10.00'), quantity=1):
+        cart = create_cart()
+        create_cart_item(cart=cart, item=create_item(price=price), quantity=quantity)
+        response = api_client.post('/api/orders/', {'cart_id': str(cart.id), 'currency': 'USD'})
+        return Order.objects.get(pk=response.data['id'])
+    return _place_order
+
+
+@pytest.mark.django_db
+class TestSalesRollups:
+    def test_new_orders_are_rolled_up_as_pending(self, place_order):
+        first, second = place_order(), place_order(quantity=2)
+
+        assert rollups() == {('USD', Order.PAYMENT_PENDING): (2, first.total + second.total)}
+
+    def test_confirm_moves_the_order_to_complete(self, api_client, place_order, fake_stripe):
+        order = place_order()
+        api_client.post('/api/payment/sessions/', {'order_id': str(order.id)})
+        order.refresh_from_db()
+        fake_stripe.intents[order.stripe_payment_intent_id]['status'] = 'succeeded'
+
+        api_client.post('/api/payment/confirm/', {'order_id': str(order.id)})
+
+        assert rollups() == {('USD', Order.PAYMENT_COMPLETE): (1, order.total)}
+
+    def test_cancel_and_webhook_transitions(self, api_client, place_order):
+        cancelled, paid = place_order(), place_order()
+
+        api_client.post('/api/payment/cancel/', {'order_id': str(cancelled.id)})
+        record_event({'id': 'evt_1', 'type': 'payment_intent.succeeded', 'data': {'object': {
+            'id': 'pi_1', 'metadata': {'order_id': str(paid.id)},
+        }}})
+        process_stripe_events()
+
+        assert rollups() == {
+            ('USD', Order.PAYMENT_CANCELLED): (1, cancelled.total),
+            ('USD', Order.PAYMENT_COMPLETE): (1, paid.total),
+        }
+
+    def test_admin_action_is_rolled_up_once(self, admin_client, place_order):
+        orders = [place_order(), place_order()]
+        data = {'action': 'mark_as_completed', '_selected_action': [str(order.pk) for order in orders]}
+
+        admin_client.post('/admin/shop/order/', data)
+        admin_client.post('/admin/shop/order/', data)
+
+        assert rollups() == {('USD', Order.PAYMENT_COMPLETE): (2, sum(order.total for order in orders))}
+
+    def test_admin_status_edit_is_rolled_up(self, admin_client, place_order):
+        order = place_order()
+        data = {'payment_status': Order.PAYMENT_CANCELLED, 'items-TOTAL_FORMS': 0, 'items-INITIAL_FORMS': 0}
+
+        admin_client.post(f'/admin/shop/order/{order.pk}/change/', data)
+
+        assert Order.objects.get(pk=order.pk).payment_status == Order.PAYMENT_CANCELLED
+        assert rollups() == {('USD', Order.PAYMENT_CANCELLED): (1, order.total)}
+
+    def test_admin_status_edit_loses_to_a_webhook(self, admin_user, place_order, monkeypatch):
+        order = place_order()
+        request = RequestFactory().post('/')
+        request.user = admin_user
+        order_admin = admin_site._registry[Order]
+        form = order_admin.get_form(request, order, change=True)({'payment_status': Order.PAYMENT_CANCELLED}, instance=order)
+        assert form.is_valid(), form.errors
+        # the webhook completes the order after the admin form was read
+        Order.objects.filter(pk=order.pk).update(payment_status=Order.PAYMENT_COMPLETE)
+        record_transitions([(order, Order.PAYMENT_PENDING, Order.PAYMENT_COMPLETE)])
+
+        warnings = []
+        monkeypatch.setattr(order_admin, 'message_user', lambda request, message, level: warnings.append(message))
+
+        order_admin.save_model(request, form.instance, form, change=True)
+
+        assert warnings
+        assert Order.objects.get(pk=order.pk).payment_status == Order.PAYMENT_COMPLETE
+        assert rollups() == {('USD', Order.PAYMENT_COMPLETE): (1, order.total)}
+
+    def test_rebuild_matches_incremental_rollups(self, api_client, place_order):
+        orders = [place_order(), place_order(quantity=3), place_order()]
+        api_client.post('/api/payment/cancel/', {'order_id': str(orders[0].id)})
+        incremental = rollups()
+
+        SalesRollup.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=None)
+
+        assert rollups() == incremental
+        assert rebuild_sales_rollups() == 2
+
+    @pytest.mark.parametrize('orders', [1, 10])
+    def test_dashboard_reads_rollups_only(self, place_order, admin_user, django_assert_num_queries, orders):
+        placed = [place_order() for _ in range(orders)]
+        Order.objects.filter(pk=placed[0].pk).update(payment_status=Order.PAYMENT_COMPLETE)
+        rebuild_sales_rollups()
+        request = RequestFactory().get('/')
+        request.user = admin_user
+
+        # item count, rollups by status, recent orders
+        with django_assert_num_queries(3):
+            context = admin_site.index(request).context_data
+            list(context['recent_orders'])
+
+        assert context['total_orders'] == orders
+        assert context['total_completed_orders'] == 1
+        assert context['total_revenue'] == placed[0].total
@@ -0,0 +1,90 @@
+import pytest
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from shop.models import Item
+from shop.routing import PRIMARY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, use_primary
+
+router = ReplicaRouter()
+
+
+@pytest.fixture
+def replicas(settings):
+    settings.READ_REPLICAS = ['replica1', 'replica2']
+    settings.REPLICA_STICKY_SECONDS = 10
+
+
+def serve(request, view):
+    """run view(request) through the middleware, returns (response, what the view returned)"""
+    seen = {}
+
+    def get_response(request):
+        seen['result'] = view()
+        return HttpResponse()
+
+    return ReplicaRoutingMiddleware(get_response)(request), seen['result']
+
+
+class TestReplicaRouting:
+    def test_safe_request_reads_from_a_replica(self, replicas):
+        response, db = serve(RequestFactory().get('/api/items/'), lambda: router.db_for_read(Item))
+
+        assert db in ('replica1', 'replica2')
+        assert PRIMARY_COOKIE not in response.cookies
+
+    def test_unsafe_request_reads_from_the_primary(self, replicas):
+        _, db = serve(RequestFactory().post('/api/orders/'), lambda: router.db_for_read(Item))
+
+        assert db == 'default'
+
+    def test_a_write_pins_the_rest_of_the_request_and_the_client(self, replicas):
+        def view():
+            assert router.db_for_write(Item) == 'default'
+            return router.db_for_read(Item)
+
+        response, db = serve(RequestFactory().get('/api/buy/1/'), view)
+
+        assert db == 'default'
+        assert response.cookies[PRIMARY_COOKIE]['max-age'] == 10
+
+    def test_pinned_client_reads_from_the_primary(self, replicas):
+        request = RequestFactory().get('/api/carts/1/')
+        request.COOKIES[PRIMARY_COOKIE] = '1'
+
+        _, db = serve(request, lambda: router.db_for_read(Item))
+
+        assert db == 'default'
+
+    def test_outside_a_request_everything_uses_the_primary(self, replicas):
+        assert router.db_for_read(Item) == 'default'
+
+    def test_use_primary_inside_a_safe_request(self, replicas):
+        def view():
+            with use_primary():
+                return router.db_for_read(Item)
+
+        _, db = serve(RequestFactory().get('/api/items/'), view)
+
+        assert db == 'default'
+
+    @pytest.mark.django_db
+    def test_atomic_blocks_read_from_the_primary(self, replicas):
+        def view():
+            with transaction.atomic():
+                return router.db_for_read(Item)
+
+        _, db = serve(RequestFactory().get('/api/items/'), view)
+
+        assert db == 'default'
+
+    def test_without_replicas_nothing_changes(self, settings):
+        settings.READ_REPLICAS = []
+
+        response, db = serve(RequestFactory().get('/api/items/'), lambda: router.db_for_read(Item))
+
+        assert db == 'default'
+        assert PRIMARY_COOKIE not in response.cookies
+
+    def test_replicas_are_never_migrated(self, replicas):
+        assert router.allow_migrate('replica1', 'shop') is False
+        assert router.allow_migrate('default', 'shop') is None
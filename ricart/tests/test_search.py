@@ -0,0 +1,81 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from rest_framework import status
+from shop.models import Item
+
+
+@pytest.mark.django_db
+class TestItemSearch:
+    def test_search_ranks_name_match_above_description_match(self, api_client, create_item):
+        in_description = create_item(name='Blue hat', description='goes well with a leather shoe')
+        in_name = create_item(name='Leather shoe', description='comfortable')
+        create_item(name='Teapot', description='ceramic')
+
+        response = api_client.get('/api/items/?q=shoe')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [item['id'] for item in response.data['results']] == [in_name.id, in_description.id]
+
+    def test_search_matches_word_prefixes(self, api_client, create_item):
+        item = create_item(name='Leather shoe', description='')
+
+        response = api_client.get('/api/items/?q=leat sho')
+
+        assert [result['id'] for result in response.data['results']] == [item.id]
+
+    def test_search_ignores_fts_syntax_in_user_input(self, api_client, create_item):
+        create_item(name='Leather shoe', description='')
+
+        response = api_client.get('/api/items/?q="shoe*) -(')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 1
+
+    def test_search_results_are_paginated_by_rank(self, api_client, create_item):
+        items = [create_item(name=f'Lamp {n}', description='lamp') for n in range(5)]
+
+        seen = []
+        url = '/api/items/?q=lamp&limit=2'
+        while url:
+            response = api_client.get(url)
+            seen += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+
+        assert sorted(seen) == [item.id for item in items]
+        assert len(seen) == len(items)
+
+    def test_index_follows_item_update_and_delete(self, api_client, create_item):
+        item = create_item(name='Old name', description='')
+        item.name = 'Brand new name'
+        item.save()
+        removed = create_item(name='Brand new gone', description='')
+        removed.delete()
+
+        assert api_client.get('/api/items/?q=old').data['results'] == []
+        assert [result['id'] for result in api_client.get('/api/items/?q=brand').data['results']] == [item.id]
+
+    def test_index_follows_queryset_update(self, api_client, create_item):
+        item = create_item(name='Chair', description='')
+        Item.objects.filter(pk=item.pk).update(description='oak wood')
+
+        assert [result['id'] for result in api_client.get('/api/items/?q=oak').data['results']] == [item.id]
+
+    def test_admin_search_uses_index(self, admin_client, create_item):
+        create_item(name='Leather shoe', description='')
+        create_item(name='Teapot', description='')
+
+        response = admin_client.get('/admin/shop/item/?q=leath')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.context['cl'].result_list.values_list('name', flat=True)) == ['Leather shoe']
+
+    def test_rebuild_command_restores_index(self, api_client, create_item):
+        item = create_item(name='Desk', description='')
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO shop_item_fts(shop_item_fts) VALUES('delete-all')")
+        assert api_client.get('/api/items/?q=desk').data['results'] == []
+
+        call_command('rebuild_search_index')
+
+        assert [result['id'] for result in api_client.get('/api/items/?q=desk').data['results']] == [item.id]
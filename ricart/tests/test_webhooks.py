@@ -0,0 +1,182 @@
+import hashlib
+import hmac
+import json
+import time
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from rest_framework import status
+from shop.models import Order, StripeEvent
+from shop.webhooks import process_stripe_events
+
+SECRET = 'whsec_test_usd'
+SECRET_EUR = 'whsec_test_eur'
+
+
+def make_event(event_type, order, intent_id=None, event_id='evt_1', created=1700000000):
+    return {
+        'id': event_id,
+        'object': 'event',
+        'type': event_type,
+        'created': created,
+        'data': {'object': {
+            'id': intent_id or order.stripe_payment_intent_id,
+            'object': 'payment_intent',
+            'metadata': {'order_id': str(order.id)},
+        }},
+    }
+
+
+def signed_post(api_client, event, secret=SECRET, timestamp=None):
+    """sign the payload the way Stripe does: v1 = HMAC-SHA256(secret, '{timestamp}.{payload}')"""
+    payload = json.dumps(event)
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return api_client.post(
+        '/api/payment/webhook/', payload, content_type='application/json',
+        HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}',
+    )
+
+
+@pytest.fixture(autouse=True)
+def webhook_secrets(settings):
+    settings.STRIPE_WEBHOOK_SECRET = SECRET
+    settings.STRIPE_WEBHOOK_SECRET_EUR = SECRET_EUR
+
+
+@pytest.mark.django_db
+class TestStripeWebhook:
+    def test_signed_event_is_stored_and_acknowledged(self, api_client, create_order):
+        order = create_order(stripe_payment_intent_id='pi_1')
+
+        response = signed_post(api_client, make_event('payment_intent.succeeded', order))
+
+        assert response.status_code == status.HTTP_200_OK
+        event = StripeEvent.objects.get()
+        assert (event.event_id, event.type, event.processed_at) == ('evt_1', 'payment_intent.succeeded', None)
+        # nothing is applied in the request
+        order.refresh_from_db()
+        assert order.payment_status == Order.PAYMENT_PENDING
+
+    def test_event_signed_by_eur_account_is_accepted(self, api_client, create_order):
+        order = create_order(stripe_payment_intent_id='pi_1', order_currency='EUR')
+
+        response = signed_post(api_client, make_event('payment_intent.succeeded', order), secret=SECRET_EUR)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_bad_signature_returns_400(self, api_client, create_order):
+        order = create_order(stripe_payment_intent_id='pi_1')
+
+        response = signed_post(api_client, make_event('payment_intent.succeeded', order), secret='whsec_wrong')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not StripeEvent.objects.exists()
+
+    def test_stale_timestamp_returns_400(self, api_client, create_order):
+        order = create_order(stripe_payment_intent_id='pi_1')
+
+        response = signed_post(api_client, make_event('payment_intent.succeeded', order), timestamp=int(time.time()) - 3600)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_redelivered_event_is_stored_once(self, api_client, create_order):
+        order = create_order(stripe_payment_intent_id='pi_1')
+        event = make_event('payment_intent.succeeded', order)
+
+        signed_post(api_client, event)
+        response = signed_post(api_client, event)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert StripeEvent.objects.count() == 1
+
+
+@pytest.mark.django_db
+class TestProcessStripeEvents:
+    def test_applies_each_event_type(self, api_client, create_order):
+        paid = create_order(stripe_payment_intent_id='pi_paid')
+        failed = create_order(stripe_payment_intent_id='pi_failed')
+        canceled = create_order(stripe_payment_intent_id='pi_canceled')
+        signed_post(api_client, make_event('payment_intent.succeeded', paid, event_id='evt_1'))
+        signed_post(api_client, make_event('payment_intent.payment_failed', failed, event_id='evt_2'))
+        signed_post(api_client, make_event('payment_intent.canceled', canceled, event_id='evt_3'))
+        signed_post(api_client, {'id': 'evt_4', 'type': 'charge.refunded', 'data': {'object': {}}})
+
+        assert process_stripe_events() == 4
+
+        statuses = dict(Order.objects.values_list('stripe_payment_intent_id', 'payment_status'))
+        assert statuses == {'pi_paid': Order.PAYMENT_COMPLETE, 'pi_failed': Order.PAYMENT_FAILED, 'pi_canceled': Order.PAYMENT_CANCELLED}
+        assert not StripeEvent.objects.filter(processed_at__isnull=True).exists()
+        assert process_stripe_events() == 0
+
+    def test_late_failure_does_not_reopen_completed_order(self, api_client, create_order):
+        order = create_order(stripe_payment_intent_id='pi_1')
+        signed_post(api_client, make_event('payment_intent.payment_failed', order, event_id='evt_1', created=100))
+        signed_post(api_client, make_event('payment_intent.succeeded', order, event_id='evt_2', created=200))
+        process_stripe_events()
+        signed_post(api_client, make_event('payment_intent.payment_failed', order, event_id='evt_3', created=150))
+        process_stripe_events()
+
+        order.refresh_from_db()
+        assert order.payment_status == Order.PAYMENT_COMPLETE
+
+    def test_failure_of_abandoned_intent_is_ignored(self, api_client, create_order):
+        order = create_order(stripe_payment_intent_id='pi_new')
+        signed_post(api_client, make_event('payment_intent.payment_failed', order, intent_id='pi_old'))
+
+        process_stripe_events()
+
+        order.refresh_from_db()
+        assert order.payment_status == Order.PAYMENT_PENDING
+
+    def test_batches_use_constant_queries(self, api_client, create_order, django_assert_num_queries):
+        for i in range(5):
+            order = create_order(stripe_payment_intent_id=f'pi_{i}')
+            signed_post(api_client, make_event('payment_intent.succeeded', order, event_id=f'evt_{i}'))
+
+        # savepoint, events, orders, bulk_update, sales rollup upsert, mark processed, release
+        with django_assert_num_queries(7):
+            assert process_stripe_events() == 5
+
+    @pytest.mark.skipif(not connection.features.has_select_for_update, reason='SQLite locks the whole database instead')
+    def test_orders_are_locked_while_the_batch_is_applied(self, api_client, create_order, django_assert_num_queries):
+        order = create_order(stripe_payment_intent_id='pi_1')
+        signed_post(api_client, make_event('payment_intent.succeeded', order, event_id='evt_1'))
+
+        with django_assert_num_queries(7) as captured:
+            process_stripe_events()
+
+        orders_sql = [query['sql'] for query in captured.captured_queries if 'FROM "shop_order"' in query['sql']]
+        assert orders_sql and all('FOR UPDATE' in sql for sql in orders_sql)
+
+    def test_command_drains_inbox_in_batches(self, api_client, create_order):
+        for i in range(3):
+            order = create_order(stripe_payment_intent_id=f'pi_{i}')
+            signed_post(api_client, make_event('payment_intent.succeeded', order, event_id=f'evt_{i}'))
+
+        call_command('process_stripe_events', batch_size=2)
+
+        assert Order.objects.filter(payment_status=Order.PAYMENT_COMPLETE).count() == 3
+
+
+@pytest.mark.django_db
+class TestConfirmWithWebhooks:
+    def test_pending_order_returns_202_without_calling_stripe(self, api_client, create_order, fake_stripe):
+        order = create_order(stripe_payment_intent_id='pi_1')
+
+        response = api_client.post('/api/payment/confirm/', {'order_id': str(order.id)})
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data['status'] == 'pending'
+        assert fake_stripe.calls == []
+
+    def test_order_settled_by_webhook_confirms(self, api_client, create_order, fake_stripe):
+        order = create_order(stripe_payment_intent_id='pi_1')
+        signed_post(api_client, make_event('payment_intent.succeeded', order))
+        process_stripe_events()
+
+        response = api_client.post('/api/payment/confirm/', {'order_id': str(order.id)})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == 'success'
+        assert fake_stripe.calls == []
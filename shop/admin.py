@@ -1,10 +1,36 @@
-from django.contrib import admin
+import uuid
+from django.contrib import admin, messages
 from django.contrib.auth.models import User, Group
 from django.utils.html import format_html
 from django.urls import reverse
-from django.db.models import Count, Sum
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
 from django.utils import timezone
-from .models import Item, Order, OrderItem, Discount, Tax
+from .models import Item, Order, OrderItem, Discount, Tax, ExchangeRate, StripeEvent, Job, DeadLetterJob, SalesRollup
+from .jobs import requeue
+from .rollups import ROLLUP_FIELDS, bulk_set_payment_status, record_transitions, set_payment_status
+from .search import filter_items
+
+#quantity * unit_price computed by the database, so the line total columns need no per-row work
+line_total = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _uuid_prefix_range(term):
+    """(lowest, highest) UUID starting with the hex digits of `term` (dashes ignored), None if it can't be one"""
+    digits = term.replace('-', '').lower()
+    if not 0 < len(digits) <= 32 or any(c not in '0123456789abcdef' for c in digits):
+        return None
+    return uuid.UUID(digits.ljust(32, '0')), uuid.UUID(digits.ljust(32, 'f'))
+
+
+def _total_price_display(obj):
+    # Handle None values safely
+    total = getattr(obj, 'line_total', None)
+    if total is None:
+        return "N/A"
+    # Get currency from the order (select_related by the admin querysets)
+    currency_symbol = '€' if obj.order.order_currency == 'EUR' else '$'
+    return f"{currency_symbol}{total:.2f}"
+
 
 # Admin site customization
 admin.site.site_header = "РишатStore Admin"
@@ -27,7 +53,7 @@ class ItemAdmin(admin.ModelAdmin):
     # Fields shown when editing an existing item
     fieldsets = [
         (None, {
-            'fields': ['name', 'description', 'price']
+            'fields': ['name', 'description', 'price', 'sku']
         }),
         ('Read-only Information', {
             'fields': ['currency'],
@@ -38,7 +64,7 @@ class ItemAdmin(admin.ModelAdmin):
     # Fields shown when adding a new item (same as above but without currency)
     add_fieldsets = [
         (None, {
-            'fields': ['name', 'description', 'price']
+            'fields': ['name', 'description', 'price', 'sku']
         }),
     ]
     
@@ -62,33 +88,38 @@ class ItemAdmin(admin.ModelAdmin):
             obj.currency = 'USD'  # Set your default currency here
         super().save_model(request, obj, form, change)
     
+    def get_search_results(self, request, queryset, search_term):
+        # Same full-text index as /api/items/?q=, instead of icontains over the description column.
+        return filter_items(queryset, search_term), False
+
+    def get_queryset(self, request):
+        # one COUNT per page instead of one per row
+        return super().get_queryset(request).annotate(times_ordered=Count('orderitem'))
+
     def order_count(self, obj):
-        return obj.orderitem_set.count()
+        return obj.times_ordered
     order_count.short_description = 'Times Ordered'
+    order_count.admin_order_field = 'times_ordered'
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
+    # lines are read-only, an editable item column rendered a <select> of the whole catalog for every line
+    fields = ['item_display', 'quantity', 'unit_price', 'total_price_display']
     readonly_fields = ['item_display', 'quantity', 'unit_price', 'total_price_display']
     can_delete = False
     max_num = 0
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('order', 'item').annotate(line_total=line_total)
+
     def item_display(self, obj):
         return obj.item.name if obj.item else "No Item"
     item_display.short_description = 'Item Name'
     
     def total_price_display(self, obj):
-        # Handle None values safely
-        if obj.quantity is None or obj.unit_price is None:
-            return "N/A"
-        try:
-            total = obj.quantity * obj.unit_price
-            # Get currency from the order
-            currency_symbol = '€' if obj.order.order_currency == 'EUR' else '$'
-            return f"{currency_symbol}{total:.2f}"
-        except (TypeError, ValueError):
-            return "Error"
+        return _total_price_display(obj)
     total_price_display.short_description = 'Total Price'
 
 class OrderItemAdmin(admin.ModelAdmin):
@@ -112,6 +143,10 @@ class OrderItemAdmin(admin.ModelAdmin):
     ]
     readonly_fields = ['order', 'item', 'quantity', 'unit_price']
     list_per_page = 50
+    list_select_related = ['order', 'item']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(line_total=line_total)
     
     def order_display(self, obj):
         return f"Order {str(obj.order.id)[:8]}..." if obj.order else "No Order"
@@ -124,17 +159,9 @@ class OrderItemAdmin(admin.ModelAdmin):
     item_display.admin_order_field = 'item__name'
     
     def total_price_display(self, obj):
-        # Handle None values safely
-        if obj.quantity is None or obj.unit_price is None:
-            return "N/A"
-        try:
-            total = obj.quantity * obj.unit_price
-            # Get currency from the order
-            currency_symbol = '€' if obj.order.order_currency == 'EUR' else '$'
-            return f"{currency_symbol}{total:.2f}"
-        except (TypeError, ValueError):
-            return "Error"
+        return _total_price_display(obj)
     total_price_display.short_description = 'Total Price'
+    total_price_display.admin_order_field = 'line_total'
     
     def currency_display(self, obj):
         return obj.order.order_currency if obj.order else "N/A"
@@ -160,6 +187,7 @@ class OrderAdmin(admin.ModelAdmin):
         'order_currency', 
         'created_at'
     ]
+    # searched by get_search_results below, with lookups the indexes can serve
     search_fields = [
         'id',
         'stripe_payment_intent_id'
@@ -168,6 +196,7 @@ class OrderAdmin(admin.ModelAdmin):
         'id',
         'created_at',
         'stripe_payment_intent_id',
+        'order_currency',  # the rollups are per currency, see save_model
         'subtotal',
         'discount_amount', 
         'tax_amount',
@@ -208,14 +237,48 @@ class OrderAdmin(admin.ModelAdmin):
             return obj.stripe_payment_intent_id[:20] + '...' if len(obj.stripe_payment_intent_id) > 20 else obj.stripe_payment_intent_id
         return "No ID"
     stripe_payment_intent_id_short.short_description = 'Stripe ID'
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        -> a full order id or the start of one (the 8 characters shown in the list) is a range on the primary key,
+        -> anything else is looked up as an exact PaymentIntent id (shop_order_intent_idx).
+        -> the default search would run LIKE '%term%' on both columns, a full scan of the orders for every search.
+        """
+        term = search_term.strip().rstrip('.')
+        if not term:
+            return queryset, False
+        bounds = _uuid_prefix_range(term)
+        if bounds is not None:
+            return queryset.filter(pk__range=bounds), False
+        return queryset.filter(stripe_payment_intent_id=term), False
     
+    # status changes made here go through the guarded UPDATE and are rolled up like any other (shop.rollups)
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # only the edited fields are written, so a status set meanwhile (by the webhook, say) isn't overwritten
+        fields = [name for name in form.changed_data if name != 'payment_status']
+        if fields:
+            obj.save(update_fields=fields)
+        if 'payment_status' in form.changed_data:
+            if not set_payment_status(obj, obj.payment_status, from_status=form.initial['payment_status']):
+                self.message_user(request, 'The payment status was changed meanwhile, it was left as it is.', messages.WARNING)
+
+    def delete_model(self, request, obj):
+        record_transitions([(obj, obj.payment_status, None)])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        record_transitions([(order, order.payment_status, None) for order in queryset.only(*ROLLUP_FIELDS)])
+        super().delete_queryset(request, queryset)
+
     def mark_as_completed(self, request, queryset):
-        updated = queryset.update(payment_status=Order.PAYMENT_COMPLETE)
+        updated = bulk_set_payment_status(queryset, Order.PAYMENT_COMPLETE)
         self.message_user(request, f'{updated} orders marked as completed.')
     mark_as_completed.short_description = "Mark selected orders as completed"
     
     def mark_as_cancelled(self, request, queryset):
-        updated = queryset.update(payment_status=Order.PAYMENT_CANCELLED)
+        updated = bulk_set_payment_status(queryset, Order.PAYMENT_CANCELLED)
         self.message_user(request, f'{updated} orders marked as cancelled.')
     mark_as_cancelled.short_description = "Mark selected orders as cancelled"
     
@@ -229,6 +292,43 @@ class TaxAdmin(admin.ModelAdmin):
     list_editable = ['is_active']
     list_filter = ['is_active']
 
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'rate', 'updated_at']
+    search_fields = ['currency']
+
+#the inbox is append-only, the admin only reads it
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'type', 'received_at', 'processed_at']
+    list_filter = ['type']
+    search_fields = ['=event_id']
+    readonly_fields = ['event_id', 'type', 'payload', 'received_at', 'processed_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'run_at', 'attempts', 'max_attempts', 'locked_until', 'created_at']
+    list_filter = ['name']
+    readonly_fields = ['locked_by', 'locked_until', 'last_error', 'created_at']
+
+class DeadLetterJobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'attempts', 'created_at', 'failed_at']
+    list_filter = ['name']
+    readonly_fields = ['name', 'payload', 'attempts', 'last_error', 'created_at', 'failed_at']
+    actions = ['requeue_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    def requeue_jobs(self, request, queryset):
+        count = queryset.count()
+        requeue(queryset)
+        self.message_user(request, f"{count} jobs requeued.")
+    requeue_jobs.short_description = "Requeue selected jobs"
+
 
 
 
@@ -242,22 +342,22 @@ class CustomAdminSite(admin.AdminSite):
         # Add dashboard statistics to the context
         extra_context = extra_context or {}
         
+        # Order statistics come from the rollups (one row per day x currency x status, see shop.rollups),
+        # a single small GROUP BY whatever the size of the order history.
+        status_breakdown = list(SalesRollup.objects.values('payment_status').annotate(
+            count=Sum('order_count'), revenue=Sum('revenue')
+        ).order_by('payment_status'))
+        by_status = {row['payment_status']: row for row in status_breakdown}
+
         # Basic statistics
         total_items = Item.objects.count()
-        total_orders = Order.objects.count()
-        total_completed_orders = Order.objects.filter(payment_status=Order.PAYMENT_COMPLETE).count()
-        total_revenue = Order.objects.filter(
-            payment_status=Order.PAYMENT_COMPLETE
-        ).aggregate(total=Sum('total'))['total'] or 0
+        total_orders = sum(row['count'] for row in status_breakdown)
+        total_completed_orders = by_status.get(Order.PAYMENT_COMPLETE, {}).get('count', 0)
+        total_revenue = by_status.get(Order.PAYMENT_COMPLETE, {}).get('revenue') or 0
         
         # Recent orders
         recent_orders = Order.objects.all().order_by('-created_at')[:10]
         
-        # Order status breakdown
-        status_breakdown = Order.objects.values('payment_status').annotate(
-            count=Count('id')
-        ).order_by('payment_status')
-        
         extra_context.update({
             'total_items': total_items,
             'total_orders': total_orders,
@@ -276,6 +376,10 @@ admin_site.register(Item, ItemAdmin)
 admin_site.register(Order, OrderAdmin)
 admin_site.register(Discount, DiscountAdmin)
 admin_site.register(Tax, TaxAdmin)
+admin_site.register(ExchangeRate, ExchangeRateAdmin)
+admin_site.register(StripeEvent, StripeEventAdmin)
+admin_site.register(Job, JobAdmin)
+admin_site.register(DeadLetterJob, DeadLetterJobAdmin)
 
 admin_site.register(User)
 admin_site.register(Group)
@@ -284,4 +388,8 @@ admin_site.register(Group)
 admin.site.register(Item, ItemAdmin)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(Discount, DiscountAdmin)
-admin.site.register(Tax, TaxAdmin)
\ No newline at end of file
+admin.site.register(Tax, TaxAdmin)
+admin.site.register(ExchangeRate, ExchangeRateAdmin)
+admin.site.register(StripeEvent, StripeEventAdmin)
+admin.site.register(Job, JobAdmin)
+admin.site.register(DeadLetterJob, DeadLetterJobAdmin)
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+Async versions of the payment endpoints and order retrieval, served by ricart/asgi.py (SERVER_MODE=asgi).
+-> POST /api/async/payment/sessions/ {order_id: {order_id}}
+-> POST /api/async/payment/cancel/ {order_id: {order_id}}
+-> POST /api/async/payment/confirm/ {order_id: {order_id}}
+-> GET /api/async/orders/{id}/
+-> they behave like StripePaymentView / OrderViewSet, but Stripe is called with the *_async methods and the
+    database through the async ORM, so a request waiting on Stripe doesn't hold a worker thread,
+    hundreds of them can be in flight in one process.
+-> these are plain Django views (DRF views are sync only), they are csrf exempt like the API views.
+"""
+import json
+from uuid import UUID
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+from .models import Order
+from .serializer import OrderSerializer
+from .payments import stripe_clients, validate_order_for_payment, validate_order_for_cancellation, apayment_session, confirmation_from_order, apply_confirmation
+from .rollups import aset_payment_status
+from .tasks import acancel_order
+from .utils import OrderValidationError, handle_async_payment_exceptions, json_response
+
+
+async def _get_order(request):
+    """read order_id from a JSON or form body and fetch the order"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise OrderValidationError('Invalid JSON body')
+    else:
+        data = request.POST
+    try:
+        order_id = UUID(str(data.get('order_id')))
+    except (AttributeError, ValueError):
+        raise OrderValidationError('Order not found')
+    try:
+        return await Order.objects.aget(pk=order_id)
+    except Order.DoesNotExist:
+        raise OrderValidationError('Order not found')
+
+
+@csrf_exempt
+@require_POST
+@handle_async_payment_exceptions
+async def payment_sessions(request):
+    """POST /api/async/payment/sessions/ - create payment intent for order"""
+    order = await _get_order(request)
+    validate_order_for_payment(order)
+
+    previous_intent_id = order.stripe_payment_intent_id
+    result = await apayment_session(stripe_clients.get(order.order_currency), order)
+
+    if order.stripe_payment_intent_id != previous_intent_id:
+        await order.asave(update_fields=['stripe_payment_intent_id'])
+
+    return json_response(result)
+
+
+@csrf_exempt
+@require_POST
+@handle_async_payment_exceptions
+async def payment_cancel(request):
+    """POST /api/async/payment/cancel/ - cancel payment for specific order by order_id"""
+    order = await _get_order(request)
+    validate_order_for_cancellation(order)
+
+    # cancelling the intent is a background job, as in the sync view (one transaction, see shop.tasks.cancel_order)
+    await acancel_order(order)
+
+    return json_response({'message': 'Payment cancelled successfully'})
+
+
+@csrf_exempt
+@require_POST
+@handle_async_payment_exceptions
+async def payment_confirm(request):
+    """POST /api/async/payment/confirm/ - confirm payment for specific order by order_id"""
+    order = await _get_order(request)
+    known = confirmation_from_order(order)
+    if known is not None:
+        result, status_code = known
+        return json_response(result, status=status_code)
+
+    intent = await stripe_clients.get(order.order_currency).v1.payment_intents.retrieve_async(order.stripe_payment_intent_id)
+
+    from_status = order.payment_status
+    result, succeeded = apply_confirmation(order, intent)
+    await aset_payment_status(order, order.payment_status, from_status=from_status)
+
+    return json_response(result, status=status.HTTP_200_OK if succeeded else status.HTTP_400_BAD_REQUEST)
+
+
+@require_GET
+async def order_detail(request, pk):
+    """GET /api/async/orders/{id}/ - same payload as GET /api/orders/{id}/"""
+    try:
+        order = await Order.objects.prefetch_related('items__item').aget(pk=pk)
+    except Order.DoesNotExist:
+        return json_response({'detail': 'No Order matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+    # everything the serializer reads is prefetched, so this doesn't touch the database.
+    return json_response(OrderSerializer(order).data)
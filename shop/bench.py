@@ -0,0 +1,127 @@
+"""
+Checkout throughput benchmark, run by `manage.py bench_checkout` against the configured database (DJANGO_DB_PROFILE).
+-> `workers` threads each run whole checkouts: create a cart, add its lines (add_cart_items) and turn it into an order
+    with CreateOrderSerializer, the same code POST /api/carts/, POST .../items/bulk/ and POST /api/orders/ run.
+-> every thread has its own connection and calls close_old_connections() around each checkout like a request does,
+    so CONN_MAX_AGE / the pool decide whether a checkout opens a new connection.
+-> a checkout that fails on the database (e.g. "database is locked") is counted as an error and not retried.
+-> the items, carts and orders it made are deleted at the end (rollups included), the database is left as it was.
+"""
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from .carts import add_cart_items, delete_carts
+from .models import Cart, Item, Order, OrderItem
+from .rollups import ROLLUP_FIELDS, record_transitions
+from .serializer import CreateOrderSerializer
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+#CheckoutBenchmark
+class CheckoutBenchmark:
+    """
+    -> stats: checkouts, errors, elapsed seconds, rate (checkouts/s), p50 / p95 checkout latency in seconds.
+    -> on_progress(stats) is called by the worker threads every `progress_every` checkouts.
+    """
+    def __init__(self, workers=4, checkouts=200, lines=3, items=20, currency=None, on_progress=None, progress_every=50):
+        self.workers = workers
+        self.checkouts = checkouts
+        self.lines = lines
+        self.items = max(items, lines)
+        self.currency = currency or settings.BASE_CURRENCY
+        self.on_progress = on_progress
+        self.progress_every = progress_every
+        self.stats = {'checkouts': 0, 'errors': 0, 'elapsed': 0.0, 'rate': 0.0, 'p50': 0.0, 'p95': 0.0}
+        self._lock = threading.Lock()
+        self._todo = checkouts
+        self._started = None
+        self._latencies = []
+        self._cart_ids = []
+        self._order_ids = []
+
+    def run(self):
+        item_ids = self._create_items()
+        self._started = time.monotonic()
+        try:
+            threads = [threading.Thread(target=self._worker, args=(item_ids,), name=f'bench-{n}') for n in range(self.workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self._update()
+        finally:
+            self._cleanup(item_ids)
+        return self.stats
+
+    def _create_items(self):
+        token = uuid.uuid4().hex[:8]
+        return [
+            Item.objects.create(name=f'Benchmark item {n}', price=Decimal('10.00') + n, sku=f'bench-{token}-{n}').pk
+            for n in range(self.items)
+        ]
+
+    def _next(self):
+        with self._lock:
+            if self._todo <= 0:
+                return False
+            self._todo -= 1
+            return True
+
+    def _worker(self, item_ids):
+        try:
+            while self._next():
+                close_old_connections()
+                started = time.monotonic()
+                try:
+                    order_id = self._checkout(random.sample(item_ids, self.lines))
+                except DatabaseError:
+                    with self._lock:
+                        self.stats['errors'] += 1
+                    continue
+                finally:
+                    close_old_connections()
+                with self._lock:
+                    self._order_ids.append(order_id)
+                    self._latencies.append(time.monotonic() - started)
+                    self.stats['checkouts'] += 1
+                    report = self.on_progress and self.stats['checkouts'] % self.progress_every == 0
+                    if report:
+                        self._update()
+                if report:
+                    self.on_progress(self.stats)
+        finally:
+            connection.close()
+
+    def _checkout(self, item_ids):
+        cart = Cart.objects.create()
+        with self._lock:
+            self._cart_ids.append(cart.pk)
+        add_cart_items(cart.pk, {item_id: random.randint(1, 3) for item_id in item_ids})
+        serializer = CreateOrderSerializer(data={'cart_id': cart.pk, 'currency': self.currency})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save().pk
+
+    def _update(self):
+        self.stats['elapsed'] = time.monotonic() - self._started
+        self.stats['rate'] = self.stats['checkouts'] / self.stats['elapsed'] if self.stats['elapsed'] else 0.0
+        self.stats['p50'] = _percentile(self._latencies, 0.5)
+        self.stats['p95'] = _percentile(self._latencies, 0.95)
+
+    def _cleanup(self, item_ids):
+        orders = Order.objects.filter(pk__in=self._order_ids)
+        with transaction.atomic():
+            record_transitions([(order, order.payment_status, None) for order in orders.only(*ROLLUP_FIELDS)])
+            OrderItem.objects.filter(order__in=orders).delete()
+            orders.delete()
+            delete_carts(self._cart_ids)
+            Item.objects.filter(pk__in=item_ids).delete()
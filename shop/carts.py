@@ -0,0 +1,294 @@
+"""
+Where anonymous carts live, chosen with settings.CART_STORAGE.
+-> 'db' (default): Cart / CartItem rows, handled by the model viewsets as before.
+-> 'session': the cart is a dict in request.session (pair it with a cookie or cache SESSION_ENGINE, the default
+    engine would just move the writes to django_session).
+-> 'signed': the cart is a compact signed cookie, the server stores nothing at all.
+In the two client-side modes nothing touches the database until POST /api/orders/ turns the cart into an Order,
+the /api/carts/ requests and responses stay the same (a line id is its item id).
+"""
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+from .models import Cart, CartItem, Item
+
+CART_COOKIE_SALT = 'shop.cart'
+
+
+def _too_many():
+    return ValidationError({'quantity': [f'A cart line can hold at most {settings.CART_MAX_QUANTITY} of an item.']})
+
+
+def _new_cart():
+    return {'id': uuid.uuid4().hex, 'created': int(time.time()), 'lines': {}}
+
+
+#ClientCartStore
+class ClientCartStore:
+    """
+    Base of the client-side stores, a cart is {'id': hex uuid, 'created': unix time, 'lines': {item_id: quantity}}.
+    -> subclasses implement _load() / _save(), apply(response) writes the result back to the client.
+    """
+    def __init__(self, request):
+        self.request = request
+
+    def create(self):
+        cart = _new_cart()
+        self._save(cart)
+        return cart
+
+    def get(self, cart_id):
+        cart = self._load()
+        if cart is None or cart['id'] != uuid.UUID(str(cart_id)).hex:
+            return None
+        return cart
+
+    def get_or_404(self, cart_id):
+        try:
+            cart = self.get(cart_id)
+        except ValueError:
+            cart = None
+        if cart is None:
+            raise NotFound('No cart with the given ID was found.')
+        return cart
+
+    def add(self, cart, item_id, quantity):
+        self.add_lines(cart, {item_id: quantity})
+
+    def add_lines(self, cart, quantities):
+        """{item_id: quantity} added to the cart, saved once, nothing is added if a line would go over CART_MAX_QUANTITY"""
+        lines = {str(item_id): cart['lines'].get(str(item_id), 0) + quantity for item_id, quantity in quantities.items()}
+        if any(quantity > settings.CART_MAX_QUANTITY for quantity in lines.values()):
+            raise _too_many()
+        cart['lines'].update(lines)
+        self._save(cart)
+
+    def set_quantity(self, cart, item_id, quantity):
+        cart['lines'][str(item_id)] = quantity
+        self._save(cart)
+
+    def remove(self, cart, item_id):
+        cart['lines'].pop(str(item_id), None)
+        self._save(cart)
+
+    def delete(self, cart_id):
+        if self.get(cart_id) is not None:
+            self._save(None)
+
+    def apply(self, response):
+        return response
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _save(self, cart):
+        raise NotImplementedError
+
+
+class SessionCartStore(ClientCartStore):
+    session_key = 'shop_cart'
+
+    def _load(self):
+        return self.request.session.get(self.session_key)
+
+    def _save(self, cart):
+        if cart is None:
+            self.request.session.pop(self.session_key, None)
+        else:
+            self.request.session[self.session_key] = cart
+        self.request.session.modified = True
+
+
+class SignedCookieCartStore(ClientCartStore):
+    """
+    -> the cookie is signing.dumps of [id, created, [[item_id, quantity], ...]], compressed, a few dozen bytes per line.
+    -> browsers drop cookies over 4KB, a cart that wouldn't fit is refused with a 400 instead.
+    """
+    max_cookie_size = 4000
+
+    def __init__(self, request):
+        super().__init__(request)
+        self._pending = False
+        self._cart = None
+
+    def _load(self):
+        if self._pending:
+            return self._cart
+        value = self.request.COOKIES.get(settings.CART_COOKIE_NAME)
+        if not value:
+            return None
+        try:
+            cart_id, created, lines = signing.loads(value, salt=CART_COOKIE_SALT, max_age=settings.CART_COOKIE_MAX_AGE)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+        return {'id': cart_id, 'created': created, 'lines': {str(item_id): quantity for item_id, quantity in lines}}
+
+    def _save(self, cart):
+        if cart is not None and len(self._encode(cart)) > self.max_cookie_size:
+            raise ValidationError({'quantity': ['Cart is too large, remove some items first.']})
+        self._pending, self._cart = True, cart
+
+    @staticmethod
+    def _encode(cart):
+        lines = [[int(item_id), quantity] for item_id, quantity in cart['lines'].items()]
+        return signing.dumps([cart['id'], cart['created'], lines], salt=CART_COOKIE_SALT, compress=True)
+
+    def apply(self, response):
+        if not self._pending:
+            return response
+        if self._cart is None:
+            response.delete_cookie(settings.CART_COOKIE_NAME, samesite='Lax')
+        else:
+            response.set_cookie(
+                settings.CART_COOKIE_NAME, self._encode(self._cart),
+                max_age=settings.CART_COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+                secure=not settings.DEBUG,
+            )
+        return response
+
+
+CART_STORES = {
+    'session': SessionCartStore,
+    'signed': SignedCookieCartStore,
+}
+
+
+def cart_store(request):
+    """
+    The client-side store of this request, None when carts are stored in the database.
+    -> one store per request, so the view and the serializers it calls see the same pending changes.
+    """
+    store_class = CART_STORES.get(settings.CART_STORAGE)
+    if store_class is None:
+        return None
+    request = getattr(request, '_request', request)
+    store = getattr(request, '_cart_store', None)
+    if store is None:
+        store = request._cart_store = store_class(request)
+    return store
+
+
+def materialize(cart, annotate=None):
+    """
+    Unsaved Cart / CartItem instances for a client-side cart, shaped like the annotated querysets of the cart viewsets:
+    -> one query for the items, `annotate` is added to it and copied onto each line (e.g. the price book price at checkout).
+    -> line ids are item ids, lines whose item was deleted meanwhile are dropped.
+    -> returns (cart, cart_items), CartSerializer takes the lines in context['cart_items'].
+    """
+    items = Item.objects.filter(pk__in=[int(item_id) for item_id in cart['lines']])
+    if annotate:
+        items = items.annotate(**annotate)
+    items = {item.pk: item for item in items}
+
+    cart_items = []
+    for item_id, quantity in cart['lines'].items():
+        item = items.get(int(item_id))
+        if item is None:
+            continue
+        cart_item = CartItem(id=item.pk, cart_id=uuid.UUID(cart['id']), item=item, quantity=quantity)
+        cart_item.line_total = quantity * item.price
+        for name in annotate or ():
+            # the database carts annotate their lines, keep that shape
+            setattr(cart_item, name, getattr(item, name))
+        cart_items.append(cart_item)
+
+    instance = Cart(id=uuid.UUID(cart['id']), created_at=datetime.fromtimestamp(cart['created'], tz=dt_timezone.utc))
+    instance.cart_total = sum((cart_item.line_total for cart_item in cart_items), 0)
+    return instance, cart_items
+
+
+def delete_carts(cart_ids, idle_before=None):
+    """
+    Delete carts and their lines, returns (carts, lines) deleted.
+    -> Cart.delete() reads the carts once, then deletes their lines and the carts with one DELETE each.
+    -> idle_before re-checks updated_at when the carts are read, a cart touched since it was picked survives
+        (purge_abandoned_carts locks what it picks, so one can't be touched between that read and the DELETEs).
+    """
+    carts = Cart.objects.filter(pk__in=cart_ids)
+    if idle_before is not None:
+        carts = carts.filter(updated_at__lt=idle_before)
+    _, deleted = carts.delete()
+    return deleted.get(Cart._meta.label, 0), deleted.get(CartItem._meta.label, 0)
+
+
+def add_cart_items(cart_id, quantities):
+    """
+    Add {item_id: quantity} to a database cart in one transaction, whatever the number of items:
+    -> touches the cart (404 if it doesn't exist), on PostgreSQL that row lock also queues concurrent adds to the same cart.
+    -> inserts a 0 line for every item, ignore_conflicts skips the items already in the cart (unique cart/item constraint).
+    -> one UPDATE quantity = quantity + CASE item_id ... END, the increment happens in the database,
+        so two requests adding the same item both count (a read, += and save could lose one of them).
+    -> the UPDATE skips lines that would go over CART_MAX_QUANTITY, fewer rows updated than items means
+        one of them did: 400 and the whole transaction (inserted lines included) is rolled back.
+    """
+    with transaction.atomic():
+        if not Cart.objects.filter(pk=cart_id).update(updated_at=timezone.now()):
+            raise NotFound('No cart with the given ID was found.')
+        CartItem.objects.bulk_create(
+            [CartItem(cart_id=cart_id, item_id=item_id, quantity=0) for item_id in quantities],
+            ignore_conflicts=True,
+        )
+        added = Case(
+            *[When(item_id=item_id, then=Value(quantity)) for item_id, quantity in quantities.items()],
+            output_field=PositiveIntegerField(),
+        )
+        updated = CartItem.objects.filter(
+            cart_id=cart_id, item_id__in=quantities, quantity__lte=Value(settings.CART_MAX_QUANTITY) - added,
+        ).update(quantity=F('quantity') + added)
+        if updated < len(quantities):
+            raise _too_many()
+
+
+def touch_cart(cart_id):
+    """a cart item changed: the cart is in use, push back its idle deadline (CartItem writes don't save the Cart)"""
+    Cart.objects.filter(pk=cart_id).update(updated_at=timezone.now())
+
+
+def purge_abandoned_carts(ttl=None, batch_size=None, max_batches=None, pause=0, on_batch=None):
+    """
+    Delete database carts idle (updated_at) for longer than `ttl`, oldest first, in batches of `batch_size`.
+    -> each batch is its own short transaction (pick and lock ids on the updated_at index, delete_carts),
+        so the write lock is never held for more than one batch, `pause` seconds between batches let writers in.
+    -> returns (carts, lines) deleted, on_batch(carts, lines) is called with the running totals after each batch.
+    """
+    ttl = ttl if ttl is not None else timedelta(days=settings.CART_TTL_DAYS)
+    batch_size = batch_size or settings.CART_PURGE_BATCH_SIZE
+    idle_before = timezone.now() - ttl
+    carts = lines = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            cart_ids = list(
+                Cart.objects.filter(updated_at__lt=idle_before).order_by('updated_at').select_for_update().values_list('pk', flat=True)[:batch_size]
+            )
+            if not cart_ids:
+                break
+            deleted_carts, deleted_lines = delete_carts(cart_ids, idle_before=idle_before)
+        carts, lines, batches = carts + deleted_carts, lines + deleted_lines, batches + 1
+        if on_batch:
+            on_batch(carts, lines)
+        if len(cart_ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return carts, lines
+
+
+def maybe_sweep_carts():
+    """
+    Called when a cart is created: now and then (CART_SWEEP_PROBABILITY) queue one bounded purge as a background job,
+    so idle carts get collected even where nobody schedules `manage.py purge_carts`.
+    """
+    if settings.CART_STORAGE != 'db' or random.random() >= settings.CART_SWEEP_PROBABILITY:
+        return
+    from .jobs import enqueue
+    from .models import Job
+    from .tasks import PURGE_ABANDONED_CARTS
+    if not Job.objects.filter(name=PURGE_ABANDONED_CARTS).exists():
+        enqueue(PURGE_ABANDONED_CARTS)
@@ -0,0 +1,42 @@
+import hashlib
+from django.db.models import F
+from django.utils import timezone
+from .models import CatalogVersion
+
+CATALOG_VERSION_ID = 1
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached /api/items/ representation.
+    -> called from Item post_save/post_delete signals (this covers ItemAdmin list_editable edits).
+    -> code that changes items with queryset.update() or bulk_create() must call it itself.
+    """
+    now = timezone.now()
+    updated = CatalogVersion.objects.filter(pk=CATALOG_VERSION_ID).update(version=F('version') + 1, updated_at=now)
+    if not updated:
+        CatalogVersion.objects.get_or_create(pk=CATALOG_VERSION_ID, defaults={'version': 1, 'updated_at': now})
+
+
+def get_catalog_version(request):
+    """returns (version, updated_at), read once per request"""
+    if not hasattr(request, '_catalog_version'):
+        row = CatalogVersion.objects.filter(pk=CATALOG_VERSION_ID).values_list('version', 'updated_at').first()
+        request._catalog_version = row or (0, None)
+    return request._catalog_version
+
+
+def catalog_etag(request, *args, **kwargs):
+    """
+    Strong ETag for an item response.
+    -> same catalog version + same url (cursor, limit, ordering, ...) + same renderer => same bytes.
+    """
+    version, _ = get_catalog_version(request)
+    renderer = getattr(getattr(request, 'accepted_renderer', None), 'format', '')
+    key = f'{version}:{renderer}:{request.get_full_path()}'
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    _, updated_at = get_catalog_version(request)
+    return updated_at
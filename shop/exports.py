@@ -0,0 +1,65 @@
+"""
+Streaming order export (CSV or NDJSON), used by `manage.py export_orders` and GET /api/orders/export/.
+-> orders are read joined with their lines and items as tuples, in chunks with .iterator(chunk_size)
+    (a server-side cursor on PostgreSQL), and written out as they come, so memory stays flat
+    whatever the number of orders.
+-> CSV: one row per order line, the order columns repeated. NDJSON: one JSON object per order with its lines.
+"""
+import csv
+import json
+from itertools import groupby
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import OrderItem
+
+ORDER_COLUMNS = ['order_id', 'created_at', 'payment_status', 'currency', 'subtotal', 'discount_amount', 'tax_amount', 'total']
+LINE_COLUMNS = ['item_id', 'item_name', 'quantity', 'unit_price']
+EXPORT_FORMATS = ['csv', 'ndjson']
+
+_FIELDS = [
+    'order_id', 'order__created_at', 'order__payment_status', 'order__order_currency', 'order__subtotal',
+    'order__discount_amount', 'order__tax_amount', 'order__total',
+    'item_id', 'item__name', 'quantity', 'unit_price',
+]
+
+
+def export_rows(since=None, until=None, status=None, currency=None, chunk_size=2000):
+    """
+    (order columns..., line columns...) tuples, lines of the same order next to each other, oldest orders first.
+    -> since / until filter on the order's created_at (until excluded), status is a payment status code.
+    """
+    lines = OrderItem.objects.all()
+    if since is not None:
+        lines = lines.filter(order__created_at__gte=since)
+    if until is not None:
+        lines = lines.filter(order__created_at__lt=until)
+    if status:
+        lines = lines.filter(order__payment_status=status)
+    if currency:
+        lines = lines.filter(order__order_currency=currency)
+    return lines.order_by('order__created_at', 'order_id', 'id').values_list(*_FIELDS).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """file-like object csv.writer writes to, each row comes straight back as a string"""
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(ORDER_COLUMNS + LINE_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row[:1] + (row[1].isoformat(),) + row[2:])
+
+
+def ndjson_stream(rows):
+    width = len(ORDER_COLUMNS)
+    for order, lines in groupby(rows, key=lambda row: row[:width]):
+        record = dict(zip(ORDER_COLUMNS, order))
+        record['items'] = [dict(zip(LINE_COLUMNS, line[width:])) for line in lines]
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def export_stream(output, rows):
+    """chunks of text of the export in `output` format (csv or ndjson)"""
+    return csv_stream(rows) if output == 'csv' else ndjson_stream(rows)
@@ -0,0 +1,144 @@
+"""
+Streaming item import from supplier catalogs, used by `manage.py import_items`.
+-> rows are read one at a time from CSV (header: sku,name,description,price,currency) or JSONL (one object per line),
+    validated, and written in batches, memory use depends on the batch size, not on the file.
+-> each batch: one SELECT of the existing items with those SKUs, then one bulk_create(update_conflicts=True) upsert
+    keyed on Item.sku for the rows that are new or different. Unchanged rows are not written at all,
+    so re-running an unchanged file costs one SELECT per batch.
+-> bulk_create sends no signals: the price book of the written items is rebuilt per batch
+    and the catalog version is bumped once at the end.
+"""
+import csv
+import json
+import time
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.db import transaction
+from .catalog import bump_catalog_version
+from .models import Item
+from .pricebook import rebuild_price_book
+
+IMPORT_FORMATS = ['csv', 'jsonl']
+ITEM_FIELDS = ['name', 'description', 'price', 'currency']
+
+_sku = Item._meta.get_field('sku')
+_name = Item._meta.get_field('name')
+_price = Item._meta.get_field('price')
+_currencies = {code for code, _ in Item._meta.get_field('currency').choices}
+
+
+#InvalidRow
+class InvalidRow(ValueError):
+    pass
+
+
+def read_rows(path, input_format=None):
+    """dict per row (None for a JSONL line that isn't JSON), read lazily. The format comes from the file extension unless given."""
+    input_format = input_format or ('jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if input_format == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None  # reported by clean_row, one bad line doesn't stop the import
+
+
+def clean_row(row):
+    """
+    -> returns (sku, {name, description, price, currency}) ready for Item, raises InvalidRow.
+    -> same limits as the Item columns, price is rounded to cents like the admin form would refuse otherwise.
+    """
+    if not isinstance(row, dict):
+        raise InvalidRow('not a JSON object')
+    sku = str(row.get('sku') or '').strip()
+    if not sku or len(sku) > _sku.max_length:
+        raise InvalidRow(f'sku must be 1 to {_sku.max_length} characters')
+    name = str(row.get('name') or '').strip()
+    if not name or len(name) > _name.max_length:
+        raise InvalidRow(f'name must be 1 to {_name.max_length} characters')
+    try:
+        price = Decimal(str(row.get('price')))
+        if not price.is_finite():
+            # NaN would get through quantize and only blow up at the comparison below
+            raise InvalidRow(f'invalid price {row.get("price")!r}')
+        price = price.quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise InvalidRow(f'invalid price {row.get("price")!r}')
+    if price < 0 or len(price.as_tuple().digits) > _price.max_digits:
+        raise InvalidRow(f'invalid price {row.get("price")!r}')
+    currency = str(row.get('currency') or Item._meta.get_field('currency').default).strip().upper()
+    if currency not in _currencies:
+        raise InvalidRow(f'unsupported currency {currency!r}')
+    description = row.get('description')
+    return sku, {'name': name, 'description': str(description) if description else None, 'price': price, 'currency': currency}
+
+
+#ItemImporter
+class ItemImporter:
+    """
+    Upserts items from an iterable of row dicts, see the module docstring.
+    -> stats: read, created, updated, unchanged, invalid, elapsed seconds, errors (the first `max_errors` (line, message)).
+    -> on_batch(stats) is called after each batch.
+    """
+    def __init__(self, batch_size=1000, max_errors=20, dry_run=False, on_batch=None):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.dry_run = dry_run
+        self.on_batch = on_batch
+        self.stats = Counter()
+        self.errors = []
+
+    def run(self, rows):
+        started = time.monotonic()
+        written = False
+        numbered = enumerate(rows, 1)
+        while raw := list(islice(numbered, self.batch_size)):
+            batch = {}
+            for line, row in raw:
+                self.stats['read'] += 1
+                try:
+                    sku, fields = clean_row(row)
+                except InvalidRow as e:
+                    self.stats['invalid'] += 1
+                    if len(self.errors) < self.max_errors:
+                        self.errors.append((line, str(e)))
+                    continue
+                batch[sku] = fields  # a SKU repeated in a batch: the last row wins (an upsert can't touch a row twice)
+            written |= self._write(batch)
+            self.stats['elapsed'] = time.monotonic() - started
+            if self.on_batch:
+                self.on_batch(self.stats)
+        if written:
+            bump_catalog_version()
+        self.stats['elapsed'] = time.monotonic() - started
+        return self.stats
+
+    def _write(self, batch):
+        """upsert the rows of one batch that differ from the database, returns True if anything was written"""
+        if not batch:
+            return False
+        existing = {
+            sku: dict(zip(ITEM_FIELDS, values))
+            for sku, *values in Item.objects.filter(sku__in=batch).values_list('sku', *ITEM_FIELDS)
+        }
+        changed = {sku: fields for sku, fields in batch.items() if existing.get(sku) != fields}
+        created = sum(1 for sku in changed if sku not in existing)
+        self.stats['created'] += created
+        self.stats['updated'] += len(changed) - created
+        self.stats['unchanged'] += len(batch) - len(changed)
+        if not changed or self.dry_run:
+            return False
+
+        with transaction.atomic():
+            Item.objects.bulk_create(
+                [Item(sku=sku, **fields) for sku, fields in changed.items()],
+                update_conflicts=True, unique_fields=['sku'], update_fields=ITEM_FIELDS,
+            )
+            rebuild_price_book(Item.objects.filter(sku__in=changed).values_list('id', flat=True))
+        return True
@@ -0,0 +1,139 @@
+"""
+Background jobs stored in the application database, no external broker.
+-> register a handler with @job('name'), queue it with enqueue('name', **payload).
+-> enqueue inside a transaction is atomic with the rest of it: the job only exists if the transaction commits.
+-> `manage.py run_jobs` claims due jobs, runs them, retries failures with backoff and dead-letters the hopeless ones.
+"""
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Job, DeadLetterJob
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+class UnknownJob(LookupError):
+    pass
+
+
+def job(name):
+    """register the decorated function as the handler of `name`, it is called with the job payload as kwargs"""
+    def register(func):
+        _handlers[name] = func
+        return func
+    return register
+
+
+def enqueue(name, delay=0, max_attempts=None, **payload):
+    if name not in _handlers:
+        raise UnknownJob(name)
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+async def aenqueue(name, delay=0, max_attempts=None, **payload):
+    """enqueue for async views"""
+    if name not in _handlers:
+        raise UnknownJob(name)
+    return await Job.objects.acreate(
+        name=name,
+        payload=payload,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def backoff(attempts):
+    """seconds before retry number `attempts`: exponential, capped, with jitter so retries don't come in waves"""
+    delay = min(settings.JOB_BACKOFF_BASE * 2 ** (attempts - 1), settings.JOB_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _due(now):
+    return Job.objects.filter(run_at__lte=now).filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+
+
+def claim_jobs(limit):
+    """
+    Lock up to `limit` due jobs for this worker and return them.
+    -> PostgreSQL: SELECT ... FOR UPDATE SKIP LOCKED, concurrent workers never wait on each other or take the same job.
+    -> SQLite: a single UPDATE ... WHERE id IN (SELECT ... LIMIT) stamps a fresh claim token,
+        SQLite runs one writer at a time, so the rows carrying our token are ours alone.
+    -> either way the claim is a lease: a worker that dies leaves its jobs to be claimed again after JOB_LEASE_SECONDS.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    lease = {'locked_by': token, 'locked_until': now + timedelta(seconds=settings.JOB_LEASE_SECONDS)}
+    due = _due(now).order_by('run_at', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=ids).update(**lease)
+    else:
+        # the outer filter repeats the due check, so a row claimed by someone else between the two never matches.
+        _due(now).filter(id__in=due.values('id')[:limit]).update(**lease)
+    return list(Job.objects.filter(locked_by=token).order_by('run_at', 'id'))
+
+
+def run_job(claimed):
+    """run one claimed job: delete it on success, reschedule or dead-letter it on failure. Returns True on success."""
+    try:
+        handler = _handlers.get(claimed.name)
+        if handler is None:
+            raise UnknownJob(claimed.name)
+        handler(**claimed.payload)
+    except Exception:
+        _failed(claimed, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=claimed.pk, locked_by=claimed.locked_by).delete()
+    return True
+
+
+def _failed(claimed, error):
+    claimed.attempts += 1
+    logger.warning('Job %s failed (attempt %s/%s)', claimed, claimed.attempts, claimed.max_attempts)
+    if claimed.attempts >= claimed.max_attempts:
+        with transaction.atomic():
+            # only while the claim is still ours: if the lease ran out and another worker took the job, it's theirs now
+            if Job.objects.filter(pk=claimed.pk, locked_by=claimed.locked_by).delete()[0]:
+                DeadLetterJob.objects.create(
+                    name=claimed.name, payload=claimed.payload, attempts=claimed.attempts,
+                    last_error=error, created_at=claimed.created_at,
+                )
+        return
+    Job.objects.filter(pk=claimed.pk, locked_by=claimed.locked_by).update(
+        attempts=claimed.attempts,
+        run_at=timezone.now() + timedelta(seconds=backoff(claimed.attempts)),
+        locked_by='',
+        locked_until=None,
+        last_error=error,
+    )
+
+
+def run_pending_jobs(batch_size=10):
+    """claim and run one batch of due jobs, returns how many were run (0 when nothing is due)"""
+    jobs = claim_jobs(batch_size)
+    for claimed in jobs:
+        run_job(claimed)
+    return len(jobs)
+
+
+def requeue(dead_letters):
+    """move dead-lettered jobs back to the queue with a fresh attempt budget"""
+    with transaction.atomic():
+        for dead in dead_letters:
+            Job.objects.create(name=dead.name, payload=dead.payload, max_attempts=settings.JOB_MAX_ATTEMPTS)
+            dead.delete()
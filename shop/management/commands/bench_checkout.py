@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from shop.bench import CheckoutBenchmark
+
+
+class Command(BaseCommand):
+    help = 'Measure checkout throughput (cart -> order) with concurrent threads against the configured database profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Threads running checkouts side by side, like gunicorn workers (default: 4).')
+        parser.add_argument('--checkouts', type=int, default=200, help='Checkouts to run in total (default: 200).')
+        parser.add_argument('--lines', type=int, default=3, help='Items per cart (default: 3).')
+        parser.add_argument('--currency', default=settings.BASE_CURRENCY, help=f'Order currency (default: {settings.BASE_CURRENCY}).')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['checkouts'] < 1 or options['lines'] < 1:
+            raise CommandError('--workers, --checkouts and --lines must be at least 1.')
+        self.stdout.write(f'Profile: {self._profile()}')
+
+        def progress(stats):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{stats['checkouts']} checkouts, {stats['errors']} errors, {stats['rate']:.1f} checkouts/s")
+
+        stats = CheckoutBenchmark(
+            workers=options['workers'],
+            checkouts=options['checkouts'],
+            lines=options['lines'],
+            currency=options['currency'].upper(),
+            on_progress=progress,
+        ).run()
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['checkouts']} checkouts in {stats['elapsed']:.1f}s with {options['workers']} workers: "
+            f"{stats['rate']:.1f} checkouts/s, p50 {stats['p50'] * 1000:.0f}ms, p95 {stats['p95'] * 1000:.0f}ms, "
+            f"{stats['errors']} errors."
+        ))
+
+    def _profile(self):
+        database = settings.DATABASES['default']
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            return f"sqlite ({database['NAME']}), journal_mode={journal_mode}, CONN_MAX_AGE={database['CONN_MAX_AGE']}"
+        if 'pool' in database.get('OPTIONS', {}):
+            return f"{connection.vendor}, pool {database['OPTIONS']['pool']}"
+        return f"{connection.vendor}, CONN_MAX_AGE={database['CONN_MAX_AGE']}, health checks={database['CONN_HEALTH_CHECKS']}"
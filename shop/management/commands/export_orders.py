@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from shop.exports import EXPORT_FORMATS, export_rows, export_stream
+from shop.serializer import OrderExportSerializer
+
+
+class Command(BaseCommand):
+    help = 'Stream orders with their lines as CSV or NDJSON, reading the database in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=EXPORT_FORMATS, default='csv', help='Export format (default: csv).')
+        parser.add_argument('--file', help='Write to this file instead of stdout.')
+        parser.add_argument('--since', help='Orders created on or after this date (YYYY-MM-DD).')
+        parser.add_argument('--until', help='Orders created on or before this date (YYYY-MM-DD).')
+        parser.add_argument('--status', help='Payment status code: P, C, F or X.')
+        parser.add_argument('--currency', help='Order currency, e.g. USD.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time (default: 2000).')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        params = {name: options[name] for name in ['output', 'since', 'until', 'status', 'currency'] if options[name]}
+        serializer = OrderExportSerializer(data=params)
+        if not serializer.is_valid():
+            raise CommandError(serializer.errors)
+        filters = dict(serializer.validated_data)
+        output = filters.pop('output')
+        chunks = export_stream(output, export_rows(chunk_size=options['chunk_size'], **filters))
+
+        if options['file']:
+            with open(options['file'], 'w', newline='', encoding='utf-8') as out:
+                out.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from shop.imports import IMPORT_FORMATS, ItemImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream a supplier catalog (CSV or JSONL) into the items, upserting on SKU in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file, CSV with a sku,name,description,price,currency header or JSONL.')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='File format (default: from the extension, .jsonl/.ndjson or csv).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows validated and written per batch (default: 1000).')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and count, write nothing.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        last_report = [0.0]
+
+        def progress(stats):
+            # at most one line per second
+            if options['verbosity'] >= 1 and stats['elapsed'] - last_report[0] >= 1:
+                last_report[0] = stats['elapsed']
+                self.stdout.write(f"{stats['read']} rows, {self._rate(stats):.0f} rows/s")
+
+        importer = ItemImporter(batch_size=options['batch_size'], dry_run=options['dry_run'], on_batch=progress)
+        try:
+            stats = importer.run(read_rows(options['path'], options['format']))
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(f'Could not read {options["path"]}: {e}')
+
+        for line, error in importer.errors:
+            self.stderr.write(f'row {line}: {error}')
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Read {stats['read']} rows in {stats['elapsed']:.1f}s ({self._rate(stats):.0f} rows/s): "
+            f"{stats['created']} created, {stats['updated']} updated, {stats['unchanged']} unchanged, {stats['invalid']} invalid."
+        ))
+
+    @staticmethod
+    def _rate(stats):
+        return stats['read'] / stats['elapsed'] if stats['elapsed'] else 0.0
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from shop.rates import load_rates, read_rates_file
+
+
+class Command(BaseCommand):
+    help = 'Load exchange rates from a local JSON ({"base": "USD", "rates": {...}}) or CSV (currency,rate) file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Rates file (.json or .csv).')
+        parser.add_argument('--base', help='Currency the file rates are relative to, overrides the "base" key of the file.')
+
+    def handle(self, *args, **options):
+        try:
+            base, rates = read_rates_file(options['path'])
+            count = load_rates(rates, base=options['base'] or base)
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f'Could not load rates: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Loaded {count} exchange rates.'))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from shop.webhooks import process_stripe_events
+
+
+class Command(BaseCommand):
+    help = 'Apply the Stripe webhook events stored in the StripeEvent inbox to their orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Events per transaction (default: STRIPE_EVENTS_BATCH_SIZE).')
+        parser.add_argument('--forever', action='store_true', help='Keep polling the inbox instead of exiting once it is drained.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the inbox is empty (with --forever).')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_stripe_events(options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if not options['forever']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} Stripe events.'))
@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from shop.carts import purge_abandoned_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete database carts that have not changed for --ttl-days, oldest first, in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-days', type=float, default=settings.CART_TTL_DAYS, help=f'Idle time after which a cart is abandoned (default: CART_TTL_DAYS={settings.CART_TTL_DAYS}).')
+        parser.add_argument('--batch-size', type=int, default=settings.CART_PURGE_BATCH_SIZE, help=f'Carts deleted per transaction (default: CART_PURGE_BATCH_SIZE={settings.CART_PURGE_BATCH_SIZE}).')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches, to leave room for live traffic (default: 0).')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['ttl_days'] < 0:
+            raise CommandError('--batch-size must be at least 1 and --ttl-days can not be negative.')
+        started = time.monotonic()
+
+        def rate(carts):
+            elapsed = time.monotonic() - started
+            return carts / elapsed if elapsed else 0.0
+
+        def progress(carts, lines):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'{carts} carts, {lines} lines deleted, {rate(carts):.1f} carts/s')
+
+        carts, lines = purge_abandoned_carts(
+            ttl=timedelta(days=options['ttl_days']),
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            on_batch=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {carts} abandoned carts and {lines} cart lines in {time.monotonic() - started:.1f}s ({rate(carts):.1f} carts/s).'
+        ))
@@ -0,0 +1,12 @@
+import time
+from django.core.management.base import BaseCommand
+from shop.rollups import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the sales rollups of the admin dashboard from the order history.'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = rebuild_sales_rollups()
+        self.stdout.write(self.style.SUCCESS(f'{rows} rollup rows rebuilt in {time.monotonic() - started:.2f}s.'))
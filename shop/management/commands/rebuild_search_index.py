@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from shop.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text item search index (SQLite FTS5).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if not rebuild_search_index(options['database']):
+            self.stdout.write(self.style.WARNING('Full-text index is only available on SQLite, nothing to rebuild.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt in {time.monotonic() - started:.2f}s.'))
@@ -0,0 +1,43 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from shop.models import Order
+from shop.reconcile import PaymentReconciler
+
+STATUS_LABELS = dict(Order.PAYMENT_STATUS)
+
+
+class Command(BaseCommand):
+    help = 'Check the PaymentIntent of every pending order against Stripe and settle the orders Stripe has settled.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent Stripe requests per account (default: 8).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders read and written per batch (default: 500).')
+        parser.add_argument('--older-than', type=int, default=30, help='Only orders created more than this many minutes ago (default: 30), leaves checkouts in progress alone.')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be at least 1.')
+
+        def progress(stats):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{stats['checked']} checked, {sum(stats['changed'].values())} settled, {self._rate(stats):.1f} orders/s")
+
+        stats = PaymentReconciler(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            older_than=timedelta(minutes=options['older_than']),
+            dry_run=options['dry_run'],
+            on_batch=progress,
+        ).run()
+
+        changed = ', '.join(f'{STATUS_LABELS[code]}: {count}' for code, count in sorted(stats['changed'].items())) or 'none'
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Checked {stats['checked']} pending orders in {stats['elapsed']:.1f}s "
+            f"({self._rate(stats):.1f} orders/s). Settled: {changed}. Stripe errors: {stats['errors']}."
+        ))
+
+    @staticmethod
+    def _rate(stats):
+        return stats['checked'] / stats['elapsed'] if stats['elapsed'] else 0.0
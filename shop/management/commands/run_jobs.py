@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from shop.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run the background jobs queued in the database (shop.jobs).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed at a time (default: 10).')
+        parser.add_argument('--forever', action='store_true', help='Keep polling the queue instead of exiting once nothing is due.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when nothing is due (with --forever).')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            ran = run_pending_jobs(options['batch_size'])
+            total += ran
+            if ran:
+                continue
+            if not options['forever']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Ran {total} jobs.'))
@@ -0,0 +1,68 @@
+# Full-text index over Item.name / Item.description (SQLite FTS5).
+
+from django.db import migrations
+
+# External content table: the index stores only tokens, rows are read back from shop_item.
+# Triggers keep it in sync for save(), delete(), queryset.update() and bulk_create().
+# Note: when a later migration rebuilds shop_item on SQLite (AddField/AlterField),
+# the triggers are dropped with the old table and have to be created again there.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS shop_item_fts USING fts5(
+        name, description,
+        content='shop_item', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    # a match in the name weighs 10x a match in the description
+    "INSERT INTO shop_item_fts(shop_item_fts, rank) VALUES('rank', 'bm25(10.0, 1.0)')",
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_item_fts_ai AFTER INSERT ON shop_item BEGIN
+        INSERT INTO shop_item_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_item_fts_ad AFTER DELETE ON shop_item BEGIN
+        INSERT INTO shop_item_fts(shop_item_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_item_fts_au AFTER UPDATE OF name, description ON shop_item BEGIN
+        INSERT INTO shop_item_fts(shop_item_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO shop_item_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO shop_item_fts(shop_item_fts) VALUES('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS shop_item_fts_ai",
+    "DROP TRIGGER IF EXISTS shop_item_fts_ad",
+    "DROP TRIGGER IF EXISTS shop_item_fts_au",
+    "DROP TABLE IF EXISTS shop_item_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return  # other databases fall back to icontains, see shop/search.py
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_catalogversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:54
+
+from django.db import migrations, models
+
+
+def keep_latest_active(apps, schema_editor):
+    # queryset.update() could bypass save() and leave several active rows behind,
+    # keep the most recently created one so the constraint can be added.
+    for model_name in ['Discount', 'Tax']:
+        model = apps.get_model('shop', model_name)
+        latest = model.objects.filter(is_active=True).order_by('-pk').first()
+        if latest:
+            model.objects.filter(is_active=True).exclude(pk=latest.pk).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_item_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_active, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='discount',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('is_active',), name='shop_discount_single_active'),
+        ),
+        migrations.AddConstraint(
+            model_name='tax',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('is_active',), name='shop_tax_single_active'),
+        ),
+    ]
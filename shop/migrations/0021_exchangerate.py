@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:56
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def seed_rates(apps, schema_editor):
+    # the rates that used to be hard coded in settings (BASE_CURRENCY and CURRENCY_RATE)
+    ExchangeRate = apps.get_model('shop', 'ExchangeRate')
+    ExchangeRate.objects.bulk_create([
+        ExchangeRate(currency='USD', rate=Decimal('1')),
+        ExchangeRate(currency='EUR', rate=Decimal('0.86')),
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_single_active_discount_and_tax'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, unique=True)),
+                ('rate', models.DecimalField(decimal_places=8, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_rates, migrations.RunPython.noop),
+    ]
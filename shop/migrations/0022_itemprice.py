@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_price_book(apps, schema_editor):
+    schema_editor.execute("""
+        INSERT INTO shop_itemprice (item_id, currency, price)
+        SELECT item.id, target.currency, ROUND(item.price * target.rate / source.rate, 2)
+        FROM shop_item item
+        JOIN shop_exchangerate source ON source.currency = item.currency
+        CROSS JOIN shop_exchangerate target
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0021_exchangerate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='shop.item')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('item', 'currency'), name='shop_itemprice_item_currency')],
+            },
+        ),
+        migrations.RunPython(build_price_book, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:41
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # concurrent adds of the same item could create two lines for it,
+    # fold them into the oldest line so the constraint can be added.
+    CartItem = apps.get_model('shop', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'item_id')
+        .annotate(lines=Count('id'), first=Min('id'), quantity=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for duplicate in duplicates:
+        lines = CartItem.objects.filter(cart_id=duplicate['cart_id'], item_id=duplicate['item_id'])
+        lines.filter(pk=duplicate['first']).update(quantity=duplicate['quantity'])
+        lines.exclude(pk=duplicate['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0025_cart_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'item'), name='shop_cartitem_unique_cart_item'),
+        ),
+    ]
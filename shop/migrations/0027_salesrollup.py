@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:20
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    # start from the existing order history, the app keeps the rows current from here on
+    Order = apps.get_model('shop', 'Order')
+    SalesRollup = apps.get_model('shop', 'SalesRollup')
+    rows = (
+        Order.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'order_currency', 'payment_status')
+        .annotate(order_count=Count('id'), revenue=Sum('total'), discount=Sum('discount_amount'), tax=Sum('tax_amount'))
+        .order_by()
+    )
+    SalesRollup.objects.bulk_create([
+        SalesRollup(
+            day=row['day'], currency=row['order_currency'], payment_status=row['payment_status'],
+            order_count=row['order_count'], revenue=row['revenue'], discount=row['discount'], tax=row['tax'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0026_cartitem_unique_cart_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('currency', models.CharField(max_length=3)),
+                ('payment_status', models.CharField(choices=[('P', 'Pending'), ('C', 'Complete'), ('F', 'Failed'), ('X', 'Cancelled')], max_length=1)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'currency', 'payment_status'), name='shop_salesrollup_unique_key')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:24
+
+from django.db import migrations, models
+
+# Adding a UNIQUE column makes SQLite rebuild shop_item, which drops the full-text triggers of 0019 with the old table.
+# Same triggers as 0019, the index itself (shop_item_fts) is untouched, rowids are kept by the rebuild.
+TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_item_fts_ai AFTER INSERT ON shop_item BEGIN
+        INSERT INTO shop_item_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_item_fts_ad AFTER DELETE ON shop_item BEGIN
+        INSERT INTO shop_item_fts(shop_item_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_item_fts_au AFTER UPDATE OF name, description ON shop_item BEGIN
+        INSERT INTO shop_item_fts(shop_item_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO shop_item_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+
+def recreate_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in TRIGGERS_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0027_salesrollup'),
+    ]
+
+    operations = [
+        # reversed last, after removing the column has rebuilt the table once more
+        migrations.RunPython(migrations.RunPython.noop, recreate_search_triggers),
+        migrations.AddField(
+            model_name='item',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(recreate_search_triggers, migrations.RunPython.noop),
+    ]
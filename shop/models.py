@@ -1,7 +1,9 @@
 import uuid
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 #Item Model
 
@@ -10,9 +12,62 @@ class Item(models.Model):
     description = models.TextField(null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2) 
     currency = models.CharField(max_length=3, choices=[(settings.BASE_CURRENCY, settings.BASE_CURRENCY), (settings.EUR_CURRENCY, settings.EUR_CURRENCY)], default=settings.BASE_CURRENCY)
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True) #supplier SKU, the key `manage.py import_items` upserts on (NULL for items made in the admin)
+
+    class Meta:
+        # keyset pagination walks these indexes for ?ordering=price and ?ordering=name
+        indexes = [
+            models.Index(fields=['price', 'id'], name='shop_item_price_id_idx'),
+            models.Index(fields=['name', 'id'], name='shop_item_name_id_idx'),
+        ]
 
     def __str__(self):
         return self.name  # This ensures items show by name
+#ItemPrice Model
+class ItemPrice(models.Model):
+    """
+    Price book: the price of every item in every currency that has an ExchangeRate.
+    Relationship:
+    Item 1 -> * ItemPrice : One To Many
+    -> rebuilt with one set-based statement by shop.pricebook.rebuild_price_book(),
+        the catalog and checkout read prices from here instead of converting per row.
+    """
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='prices') #Deleting Item will delete its prices
+    currency = models.CharField(max_length=3)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'currency'], name='shop_itemprice_item_currency'),
+        ]
+
+#CatalogVersion Model
+class CatalogVersion(models.Model):
+    """
+    Single row (pk=1) that is bumped every time an Item is saved or deleted.
+    -> /api/items/ uses it to build ETag and Last-Modified headers without touching the Item table.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+#ExchangeRate Model
+class ExchangeRate(models.Model):
+    """
+    How many units of `currency` one unit of settings.BASE_CURRENCY buys (USD -> 1, EUR -> 0.86).
+    -> loaded from a local rates file with `manage.py load_exchange_rates`, read through shop.rates.
+    """
+    currency = models.CharField(max_length=3, unique=True)
+    rate = models.DecimalField(max_digits=18, decimal_places=8, validators=[MinValueValidator(Decimal('0.00000001'))]) #shop.rates divides by it
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(rate__gt=0), name='shop_exchangerate_rate_positive'),
+        ]
+
+    def __str__(self):
+        return f'{self.currency} {self.rate}'
+
 #Order Model
 class Order(models.Model):
     """
@@ -46,6 +101,42 @@ class Order(models.Model):
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0) #tax amount for the order based on Tax Model
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0) #total sum after discount and tex
 
+    class Meta:
+        indexes = [
+            # webhooks and reconciliation find orders by their PaymentIntent
+            models.Index(fields=['stripe_payment_intent_id'], name='shop_order_intent_idx'),
+            # newest orders first (dashboard, admin date filter), the admin status / currency filters in that order,
+            # and pending orders by age for reconcile_payments (status index)
+            models.Index(fields=['created_at'], name='shop_order_created_idx'),
+            models.Index(fields=['payment_status', 'created_at'], name='shop_order_status_idx'),
+            models.Index(fields=['order_currency', 'created_at'], name='shop_order_currency_idx'),
+        ]
+
+#SalesRollup Model
+class SalesRollup(models.Model):
+    """
+    Order totals per day (of order creation) x currency x payment status, what the admin dashboard reads.
+    -> kept up to date by shop.rollups on every order creation and payment status change,
+        an order moving from pending to complete is -1 on its pending row and +1 on its complete row.
+    -> `manage.py rebuild_sales_rollups` recomputes the table from the orders.
+    """
+    day = models.DateField()
+    currency = models.CharField(max_length=3)
+    payment_status = models.CharField(max_length=1, choices=Order.PAYMENT_STATUS)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0) #sum of Order.total
+    discount = models.DecimalField(max_digits=14, decimal_places=2, default=0) #sum of Order.discount_amount
+    tax = models.DecimalField(max_digits=14, decimal_places=2, default=0) #sum of Order.tax_amount
+
+    class Meta:
+        constraints = [
+            # the conflict target of the upsert in shop.rollups.record_transitions
+            models.UniqueConstraint(fields=['day', 'currency', 'payment_status'], name='shop_salesrollup_unique_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} {self.currency} {self.get_payment_status_display()}: {self.order_count}'
+
 #OrderItem Model
 class OrderItem(models.Model):
     """
@@ -69,12 +160,24 @@ class Discount(models.Model):
     name = models.CharField(max_length=100)
     percentage = models.DecimalField(max_digits=5, decimal_places=2)
     is_active = models.BooleanField(default=False)  # Only one active discount
-  
-    # Only one discount should be enabled at a time.
+
+    class Meta:
+        # Only one discount can be enabled at a time, enforced by the database.
+        # Two admins activating different discounts concurrently: one of them gets an IntegrityError.
+        constraints = [
+            models.UniqueConstraint(fields=['is_active'], condition=models.Q(is_active=True), name='shop_discount_single_active'),
+        ]
+
+    # Activating a discount switches the previous one off in the same transaction.
     def save(self, *args, **kwargs):
-        if self.is_active:
-            Discount.objects.filter(is_active=True).update(is_active=False) #disable other discounts
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self.is_active:
+                Discount.objects.filter(is_active=True).exclude(pk=self.pk).update(is_active=False) #disable other discounts
+            super().save(*args, **kwargs)
+
+    # save() hands over the active flag itself, so forms must not reject activating a second discount.
+    def validate_constraints(self, exclude=None):
+        super().validate_constraints(exclude={*(exclude or ()), 'is_active'})
 
 #Tax Model
 class Tax(models.Model):
@@ -84,12 +187,23 @@ class Tax(models.Model):
     name = models.CharField(max_length=100)
     percentage = models.DecimalField(max_digits=5, decimal_places=2)
     is_active = models.BooleanField(default=False)  # Only one active tax
-  
-    # Only one Tax should be enabled at a time.
+
+    class Meta:
+        # Only one Tax can be enabled at a time, enforced by the database.
+        constraints = [
+            models.UniqueConstraint(fields=['is_active'], condition=models.Q(is_active=True), name='shop_tax_single_active'),
+        ]
+
+    # Activating a tax switches the previous one off in the same transaction.
     def save(self, *args, **kwargs):
-        if self.is_active:
-            Tax.objects.filter(is_active=True).update(is_active=False) #disable other Taxes
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self.is_active:
+                Tax.objects.filter(is_active=True).exclude(pk=self.pk).update(is_active=False) #disable other Taxes
+            super().save(*args, **kwargs)
+
+    # save() hands over the active flag itself, so forms must not reject activating a second tax.
+    def validate_constraints(self, exclude=None):
+        super().validate_constraints(exclude={*(exclude or ()), 'is_active'})
 
 
 """
@@ -104,7 +218,7 @@ class Cart(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False) #UUID to prevent cart id from being guessed by any other.
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) #touched by every cart item change, `manage.py purge_carts` deletes idle carts by it
     @property
     def total_price(self):
         return sum(item.quantity * item.item.price for item in self.items.all()) #total price of all items in the cart
@@ -122,3 +236,71 @@ class CartItem(models.Model):
     def total_price(self):
         return self.quantity * self.item.price #total price of the quantity of items.
 
+    class Meta:
+        constraints = [
+            # one line per item in a cart, adding an item again increments its line (shop.carts.add_cart_items relies on it)
+            models.UniqueConstraint(fields=['cart', 'item'], name='shop_cartitem_unique_cart_item'),
+        ]
+
+
+#StripeEvent Model
+class StripeEvent(models.Model):
+    """
+    Append-only inbox of verified Stripe webhook events.
+    -> POST /api/payment/webhook/ stores the event and acknowledges it, nothing else happens in the request.
+    -> event_id is unique, Stripe retries and duplicate deliveries are dropped on insert.
+    -> `manage.py process_stripe_events` applies them to Order.payment_status in batches and sets processed_at.
+    """
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker only ever scans the unprocessed tail of the inbox.
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='shop_stripeevent_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event_id} {self.type}'
+
+#Job Model
+class Job(models.Model):
+    """
+    Background job stored in the application database, run by `manage.py run_jobs` (see shop.jobs).
+    -> name is a handler registered with @shop.jobs.job, payload its keyword arguments.
+    -> a worker claims a job by setting locked_by/locked_until, a job whose lease ran out is claimed again.
+    -> a failed job is retried at run_at with exponential backoff, after max_attempts it moves to DeadLetterJob.
+    """
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at', 'id'], name='shop_job_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+#DeadLetterJob Model
+class DeadLetterJob(models.Model):
+    """A Job that failed max_attempts times, kept with its last error until someone requeues or deletes it."""
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} (failed {self.failed_at:%Y-%m-%d %H:%M})'
@@ -0,0 +1,135 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+#KeysetPagination
+class KeysetPagination(BasePagination):
+    """
+        Opaque cursor pagination keyed on (sort key, id).
+        -> GET /api/items/?limit=50&ordering=-price&cursor={cursor}
+        -> the cursor stores the sort key and id of the last (or first) row of the page,
+            the next page is fetched with WHERE (key, id) > (value, id) instead of OFFSET,
+            so page 1000 costs the same as page 1.
+        -> ordering is taken from view.ordering_fields / view.ordering, id is always the tie breaker.
+        -> the cursor also carries the ordering, so a cursor can't be replayed against another sort order.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, view)
+
+        cursor = self.decode_cursor(request)
+        field, descending = self._split_ordering(self.ordering)
+        reverse = cursor is not None and cursor['r']
+
+        # Fetching a previous page walks the index backwards and flips the rows afterwards.
+        walk_descending = descending != reverse
+        if cursor is not None:
+            queryset = queryset.filter(self._after(field, cursor['v'], cursor['id'], walk_descending))
+        queryset = queryset.order_by(*self._order_by(field, walk_descending))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.field = field
+        self.has_next = has_more if not reverse else True
+        self.has_previous = cursor is not None and (has_more if reverse else True)
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_ordering(self, request, view):
+        """
+            -> returns the requested ordering if the view exposes it, otherwise view.ordering (default: id)
+        """
+        allowed = getattr(view, 'ordering_fields', None) or ['id']
+        default = getattr(view, 'ordering', None) or 'id'
+        ordering = request.query_params.get(self.ordering_query_param, default)
+        if ordering.lstrip('-') not in allowed:
+            return default
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if cursor['o'] != self.ordering:
+                raise ValueError('cursor ordering mismatch')
+            return {'v': cursor['v'], 'id': int(cursor['id']), 'r': bool(cursor.get('r'))}
+        except (TypeError, KeyError, ValueError, UnicodeError, BinasciiError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.field)
+        cursor = {
+            'o': self.ordering,
+            'v': value if isinstance(value, (int, float)) or value is None else str(value),
+            'id': obj.pk,
+        }
+        if reverse:
+            cursor['r'] = 1
+        return b64encode(json.dumps(cursor, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+    def _link(self, obj, reverse):
+        # limit and ordering are already part of base_url, only the cursor changes.
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(obj, reverse))
+
+    @staticmethod
+    def _split_ordering(ordering):
+        return ordering.lstrip('-'), ordering.startswith('-')
+
+    @staticmethod
+    def _order_by(field, descending):
+        prefix = '-' if descending else ''
+        if field == 'id':
+            return [prefix + 'id']
+        return [prefix + field, prefix + 'id']
+
+    @staticmethod
+    def _after(field, value, pk, descending):
+        op = 'lt' if descending else 'gt'
+        if field == 'id':
+            return Q(**{f'id__{op}': pk})
+        return Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk})
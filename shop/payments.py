@@ -0,0 +1,239 @@
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+import httpx
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from .models import Order
+from .utils import OrderValidationError
+from .webhooks import webhooks_enabled
+
+
+def stripe_secret_key(currency):
+    """EUR orders are paid into the EUR account, every other currency into the default (USD) one"""
+    if currency == settings.EUR_CURRENCY:
+        return settings.STRIPE_SECRET_KEY_EUR
+    return settings.STRIPE_SECRET_KEY
+
+
+#StripeClientRegistry
+class StripeClientRegistry:
+    """
+    One long-lived stripe.StripeClient per Stripe account, created on first use.
+    -> each client has its own HTTP client, timeouts and retry policy, and keeps its TLS connections alive
+        (requests keeps one pooled session per thread per client).
+    -> nothing touches the process global stripe.api_key, so threaded (gthread) and async workers are safe.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+
+    def get(self, currency):
+        api_key = stripe_secret_key(currency)
+        client = self._clients.get(api_key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(api_key)
+                if client is None:
+                    client = self._clients[api_key] = self._build(api_key)
+        return client
+
+    def clear(self):
+        with self._lock:
+            self._clients = {}
+
+    def _build(self, api_key):
+        # sync views go through requests, the async views (*_async methods) through one pooled httpx.AsyncClient.
+        async_client = stripe.HTTPXClient(
+            timeout=httpx.Timeout(settings.STRIPE_READ_TIMEOUT, connect=settings.STRIPE_CONNECT_TIMEOUT),
+        )
+        http_client = stripe.RequestsClient(
+            timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+            async_fallback_client=async_client,
+        )
+        return stripe.StripeClient(
+            api_key,
+            http_client=http_client,
+            max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+        )
+
+
+stripe_clients = StripeClientRegistry()
+
+
+#Payment rules shared by the sync (StripePaymentView) and async (async_views) payment endpoints
+def validate_order_for_payment(order):
+    """Validate order can process payment, raise exception if not"""
+    if order.payment_status == Order.PAYMENT_CANCELLED:
+        raise OrderValidationError('Order is cancelled')
+    if order.payment_status == Order.PAYMENT_COMPLETE:
+        raise OrderValidationError('Order already completed')
+
+
+def validate_order_for_cancellation(order):
+    """Validate order can be cancelled, raise exception if not"""
+    if order.payment_status not in [Order.PAYMENT_PENDING, Order.PAYMENT_FAILED]:
+        raise OrderValidationError('Cannot cancel processed order')
+
+
+#Currencies Stripe counts in whole units (no cents) and in thousandths, every other one is in hundredths
+#https://docs.stripe.com/currencies#zero-decimal
+ZERO_DECIMAL_CURRENCIES = {'BIF', 'CLP', 'DJF', 'GNF', 'JPY', 'KMF', 'KRW', 'MGA', 'PYG', 'RWF', 'UGX', 'VND', 'VUV', 'XAF', 'XOF', 'XPF'}
+THREE_DECIMAL_CURRENCIES = {'BHD', 'JOD', 'KWD', 'OMR', 'TND'}
+
+
+def stripe_amount(total, currency):
+    """
+    `total` in the smallest unit Stripe expects for `currency`, rounded half up (1000 JPY -> 1000, 10.00 USD -> 1000).
+    -> three-decimal amounts must end in 0 for Stripe, so they are rounded to the hundredth first.
+    """
+    currency = currency.upper()
+    if currency in ZERO_DECIMAL_CURRENCIES:
+        return int(Decimal(total).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    if currency in THREE_DECIMAL_CURRENCIES:
+        return int(Decimal(total).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 1000)
+    return int(Decimal(total).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+
+
+def payment_intent_params(order):
+    return {
+        'amount': stripe_amount(order.total, order.order_currency),
+        'currency': order.order_currency.lower(),
+        'metadata': {'order_id': str(order.id)},
+        'automatic_payment_methods': {'enabled': True},
+    }
+
+
+def session_result(order, intent):
+    return {
+        'client_secret': intent['client_secret'],
+        'payment_intent_id': intent['id'],
+        'amount': order.total,
+        'currency': order.order_currency
+    }
+
+
+#PaymentIntent statuses that can still be paid, anything else (processing, succeeded, canceled) needs a new intent
+REUSABLE_INTENT_STATUSES = ('requires_payment_method', 'requires_confirmation', 'requires_action')
+
+
+def _session_cache_key(order, params):
+    return f'shop:payment-session:{order.pk}:{order.stripe_payment_intent_id}:{params["amount"]}:{params["currency"]}'
+
+
+def _idempotency_key(order, params):
+    # a double click sends the same create twice, Stripe answers both with the same intent.
+    return f'payment-session-{order.pk}-{order.stripe_payment_intent_id or "first"}-{params["amount"]}-{params["currency"]}'
+
+
+def _reusable(intent, params):
+    return intent['status'] in REUSABLE_INTENT_STATUSES and intent['currency'] == params['currency']
+
+
+def _intent_call(order, params, intent):
+    """
+    What a session does with the order's current intent (None when it has none or Stripe doesn't know it):
+    -> None: it can still be paid for this amount, reuse it as it is.
+    -> (method, args, kwargs) of the payment_intents call that gives the intent to use, an amount update or a new intent.
+    """
+    if intent is not None and _reusable(intent, params):
+        if intent['amount'] == params['amount']:
+            return None
+        return 'update', (intent['id'],), {'params': {'amount': params['amount']}}
+    return 'create', (), {'params': params, 'options': {'idempotency_key': _idempotency_key(order, params)}}
+
+
+def _use_intent(order, intent):
+    order.stripe_payment_intent_id = intent['id']
+    return session_result(order, intent)
+
+
+def payment_session(client, order):
+    """
+    Session data (client_secret, ...) for the order, reusing its PaymentIntent while it can still be paid.
+    -> the result is cached for PAYMENT_SESSION_CACHE_TTL seconds, a refresh/retry costs no Stripe call.
+    -> otherwise the existing intent is retrieved and reused, updated only if the order amount changed.
+    -> a new intent is created (with an idempotency key) only when there is none or it can't be paid anymore.
+    -> sets order.stripe_payment_intent_id, the caller saves the order if it changed.
+    """
+    params = payment_intent_params(order)
+    result = cache.get(_session_cache_key(order, params))
+    if result is not None:
+        return result
+
+    intent = None
+    if order.stripe_payment_intent_id:
+        try:
+            intent = client.v1.payment_intents.retrieve(order.stripe_payment_intent_id)
+        except stripe.InvalidRequestError:
+            pass
+    call = _intent_call(order, params, intent)
+    if call is not None:
+        method, args, kwargs = call
+        intent = getattr(client.v1.payment_intents, method)(*args, **kwargs)
+
+    # keyed by the intent the order has now, the one the next request reads it with
+    result = _use_intent(order, intent)
+    cache.set(_session_cache_key(order, params), result, settings.PAYMENT_SESSION_CACHE_TTL)
+    return result
+
+
+async def apayment_session(client, order):
+    """async twin of payment_session, for async_views, only the Stripe and cache calls differ"""
+    params = payment_intent_params(order)
+    result = await cache.aget(_session_cache_key(order, params))
+    if result is not None:
+        return result
+
+    intent = None
+    if order.stripe_payment_intent_id:
+        try:
+            intent = await client.v1.payment_intents.retrieve_async(order.stripe_payment_intent_id)
+        except stripe.InvalidRequestError:
+            pass
+    call = _intent_call(order, params, intent)
+    if call is not None:
+        method, args, kwargs = call
+        intent = await getattr(client.v1.payment_intents, f'{method}_async')(*args, **kwargs)
+
+    result = _use_intent(order, intent)
+    await cache.aset(_session_cache_key(order, params), result, settings.PAYMENT_SESSION_CACHE_TTL)
+    return result
+
+
+def confirmation_from_order(order):
+    """
+    -> what confirm can answer without calling Stripe, as (result, status_code), or None.
+    -> a completed order (usually set by the payment_intent.succeeded webhook) is reported as success.
+    -> with webhooks configured, a pending/failed order just isn't settled yet: 202, the client asks again later.
+    -> without webhooks (local setup) it returns None and confirm falls back to retrieving the intent.
+    """
+    if order.payment_status == Order.PAYMENT_COMPLETE:
+        return {
+            'status': 'success',
+            'message': 'Payment confirmed successfully',
+            'order_id': str(order.id)
+        }, 200
+    validate_order_for_payment(order)
+    if webhooks_enabled():
+        return {
+            'status': 'pending',
+            'message': 'Waiting for Stripe to confirm the payment',
+            'order_id': str(order.id)
+        }, 202
+    return None
+
+
+def apply_confirmation(order, intent):
+    """
+    -> sets the order payment status from the intent status.
+    -> returns (result, succeeded).
+    """
+    succeeded = intent.status == 'succeeded'
+    order.payment_status = Order.PAYMENT_COMPLETE if succeeded else Order.PAYMENT_FAILED
+    result = {
+        'status': 'success' if succeeded else 'failed',
+        'message': 'Payment confirmed successfully' if succeeded else f'Payment failed: {intent.status}',
+        'order_id': str(order.id)
+    }
+    return result, succeeded
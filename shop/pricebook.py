@@ -0,0 +1,52 @@
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from .models import ExchangeRate, Item, ItemPrice
+
+# Every item x every currency in one INSERT ... SELECT, rows whose price didn't change are not rewritten.
+# Prices are converted from the item currency through the base currency and rounded to cents.
+_REBUILD_SQL = f"""
+    INSERT INTO {ItemPrice._meta.db_table} (item_id, currency, price)
+    SELECT item.id, target.currency, ROUND(item.price * target.rate / source.rate, 2)
+    FROM {Item._meta.db_table} item
+    JOIN {ExchangeRate._meta.db_table} source ON source.currency = item.currency
+    CROSS JOIN {ExchangeRate._meta.db_table} target
+    WHERE {{where}}
+    ON CONFLICT (item_id, currency) DO UPDATE SET price = excluded.price
+    WHERE {ItemPrice._meta.db_table}.price <> excluded.price
+"""
+
+_DELETE_STALE_SQL = f"""
+    DELETE FROM {ItemPrice._meta.db_table}
+    WHERE currency NOT IN (SELECT currency FROM {ExchangeRate._meta.db_table})
+"""
+
+
+def rebuild_price_book(item_ids=None):
+    """
+    Recompute ItemPrice rows with one set-based statement.
+    -> item_ids=None rebuilds the whole book (rates changed), otherwise only those items (prices changed).
+    -> returns the number of rows inserted or updated.
+    """
+    params = []
+    where = '1 = 1'  # SQLite needs a WHERE before ON CONFLICT in INSERT ... SELECT
+    if item_ids is not None:
+        item_ids = list(item_ids)
+        if not item_ids:
+            return 0
+        where = f"item.id IN ({', '.join(['%s'] * len(item_ids))})"
+        params = item_ids
+
+    with connection.cursor() as cursor:
+        if item_ids is None:
+            cursor.execute(_DELETE_STALE_SQL)
+        cursor.execute(_REBUILD_SQL.format(where=where), params)
+        return cursor.rowcount
+
+
+def book_price(currency, item_ref='pk'):
+    """
+    Subquery expression: price of the item referenced by `item_ref` in `currency`, from the price book.
+    -> Item.objects.annotate(book_price=book_price('EUR'))
+    -> CartItem.objects.annotate(book_price=book_price('EUR', 'item_id'))
+    """
+    return Subquery(ItemPrice.objects.filter(item_id=OuterRef(item_ref), currency=currency).values('price')[:1])
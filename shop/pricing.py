@@ -0,0 +1,82 @@
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+from .models import Discount, Tax
+from .rates import convert
+from .utils import ProcessCache
+
+#Active discount and tax, None when there is no active one.
+PricingRules = namedtuple('PricingRules', ['discount', 'tax'])
+
+
+def _load_pricing_rules():
+    return PricingRules(
+        discount=Discount.objects.filter(is_active=True).first(),
+        tax=Tax.objects.filter(is_active=True).first(),
+    )
+
+# dropped whenever a Discount/Tax is saved or deleted (see signals.py),
+# other worker processes pick up admin changes after PRICING_RULES_CACHE_TTL seconds.
+_pricing_rules = ProcessCache(_load_pricing_rules, 'PRICING_RULES_CACHE_TTL')
+
+
+def get_active_pricing_rules():
+    """Returns the active Discount and Tax, cached in this process."""
+    return _pricing_rules.get()
+
+
+def invalidate_pricing_rules():
+    """Drop the cached rules now and again after the current transaction commits."""
+    _pricing_rules.invalidate()
+
+
+def clear_pricing_rules_cache():
+    _pricing_rules.clear()
+
+
+"""
+Pricing engine.
+Orders, single item purchases and /api/quotes/ all price through build_quote(),
+so the catalog, the quote and the order always agree to the cent.
+"""
+CENT = Decimal('0.01')
+
+QuoteLine = namedtuple('QuoteLine', ['item', 'quantity', 'unit_price', 'line_total'])
+Quote = namedtuple('Quote', ['currency', 'lines', 'subtotal', 'discount_amount', 'tax_amount', 'total'])
+
+
+def to_cents(amount):
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def unit_price(item, currency):
+    """Item price converted from the item currency to the order currency"""
+    return to_cents(convert(item.price, item.currency, currency))
+
+
+def build_quote(lines, currency, rules=None):
+    """
+    Price already loaded lines in memory, no queries (apart from a cold pricing rules cache).
+    -> lines: iterable of (item, quantity) or (item, quantity, book_price)
+        book_price is the price book entry for `currency` (see shop.pricebook.book_price),
+        lines without one are converted with the current exchange rate.
+    -> discount is applied to the subtotal, tax to the subtotal after discount, both rounded to cents.
+    """
+    rules = rules or get_active_pricing_rules()
+    quote_lines = []
+    for item, quantity, *book_price in lines:
+        price = book_price[0] if book_price and book_price[0] is not None else unit_price(item, currency)
+        quote_lines.append(QuoteLine(item, quantity, price, price * quantity))
+
+    subtotal = sum((line.line_total for line in quote_lines), Decimal(0))
+    discount_amount = to_cents(subtotal * rules.discount.percentage / 100) if rules.discount else Decimal(0)
+    subtotal_after_discount = subtotal - discount_amount
+    tax_amount = to_cents(subtotal_after_discount * rules.tax.percentage / 100) if rules.tax else Decimal(0)
+
+    return Quote(
+        currency=currency,
+        lines=quote_lines,
+        subtotal=subtotal,
+        discount_amount=discount_amount,
+        tax_amount=tax_amount,
+        total=subtotal_after_discount + tax_amount,
+    )
@@ -0,0 +1,127 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db import transaction
+from .catalog import bump_catalog_version
+from .models import ExchangeRate
+from .pricebook import rebuild_price_book
+from .utils import ProcessCache
+
+
+#UnsupportedCurrency
+class UnsupportedCurrency(ValueError):
+    """Raised when a currency has no exchange rate"""
+    pass
+
+
+def _load_rates():
+    rates = dict(ExchangeRate.objects.values_list('currency', 'rate'))
+    rates[settings.BASE_CURRENCY] = Decimal(1)
+    return rates
+
+# dropped by load_rates() and ExchangeRate signals, other processes reload after EXCHANGE_RATES_CACHE_TTL seconds.
+_rates = ProcessCache(_load_rates, 'EXCHANGE_RATES_CACHE_TTL')
+
+
+def get_rates(base=None):
+    """
+    {currency: units of currency per 1 unit of base}, base defaults to settings.BASE_CURRENCY.
+    -> served from the process cache, no query once warm.
+    """
+    rates = _rates.get()
+    base = base or settings.BASE_CURRENCY
+    if base == settings.BASE_CURRENCY:
+        return dict(rates)
+    base_rate = get_rate(settings.BASE_CURRENCY, base)
+    return {currency: rate / base_rate for currency, rate in rates.items()}
+
+
+def supported_currencies():
+    return sorted(_rates.get())
+
+
+def is_supported(currency):
+    return currency in _rates.get()
+
+
+def get_rate(from_currency, to_currency):
+    """units of to_currency for 1 unit of from_currency, any pair goes through the base currency"""
+    rates = _rates.get()
+    try:
+        return rates[to_currency] / rates[from_currency]
+    except KeyError as e:
+        raise UnsupportedCurrency(f'Unsupported currency: {e.args[0]}')
+
+
+def convert(amount, from_currency, to_currency):
+    """converted amount, not rounded"""
+    if from_currency == to_currency:
+        return amount
+    return amount * get_rate(from_currency, to_currency)
+
+
+def invalidate_rates():
+    _rates.invalidate()
+
+
+def clear_rates_cache():
+    _rates.clear()
+
+
+def read_rates_file(path):
+    """
+    Read a local rates file, returns (base, {currency: rate}).
+    -> JSON: {"base": "USD", "rates": {"EUR": 0.86, ...}} (the exchangerate-api /latest format)
+    -> CSV: currency,rate rows, rates relative to settings.BASE_CURRENCY
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if str(path).endswith('.csv'):
+            rows = [row for row in csv.reader(f) if row and not row[0].startswith('#')]
+            if rows and rows[0][0].strip().lower() == 'currency':
+                rows = rows[1:]
+            return settings.BASE_CURRENCY, {row[0]: row[1] for row in rows}
+        data = json.load(f)
+    return data.get('base', settings.BASE_CURRENCY), data['rates']
+
+
+def load_rates(rates, base=None):
+    """
+    Store rates, re-based on settings.BASE_CURRENCY, in one bulk upsert, then rebuild the price book.
+    -> currencies missing from `rates` are kept as they are.
+    -> returns the number of currencies written.
+    """
+    base = (base or settings.BASE_CURRENCY).upper()
+    parsed = {}
+    for currency, rate in rates.items():
+        currency = str(currency).strip().upper()
+        try:
+            rate = Decimal(str(rate).strip())
+        except InvalidOperation:
+            raise ValueError(f'Invalid rate for {currency}: {rate!r}')
+        if len(currency) != 3 or not currency.isalpha() or rate <= 0:
+            raise ValueError(f'Invalid rate for {currency}: {rate}')
+        parsed[currency] = rate
+
+    parsed.setdefault(base, Decimal(1))
+    if settings.BASE_CURRENCY not in parsed:
+        raise ValueError(f'Rates file has no rate for {settings.BASE_CURRENCY}, cannot re-base it.')
+    base_rate = parsed[settings.BASE_CURRENCY]
+
+    rebased = {currency: (rate / base_rate).quantize(Decimal('0.00000001')) for currency, rate in parsed.items()}
+    for currency, rate in rebased.items():
+        if not rate:
+            raise ValueError(f'Rate for {currency} rounds to 0 against {settings.BASE_CURRENCY}')
+
+    with transaction.atomic():
+        ExchangeRate.objects.bulk_create(
+            [ExchangeRate(currency=currency, rate=rate) for currency, rate in rebased.items()],
+            update_conflicts=True,
+            unique_fields=['currency'],
+            update_fields=['rate', 'updated_at'],
+        )
+        invalidate_rates()
+        # new rates re-price the catalog in every currency
+        rebuild_price_book()
+        bump_catalog_version()
+    return len(parsed)
@@ -0,0 +1,105 @@
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.utils import timezone
+from stripe import StripeError
+from .models import Order
+from .payments import stripe_clients, stripe_secret_key
+from .rollups import bulk_set_payment_status
+
+
+def settled_status(intent):
+    """
+    Order.payment_status a PaymentIntent has settled on, None while it can still go either way.
+    -> mirrors the webhook events: succeeded, canceled, and a failed attempt (payment_failed).
+    """
+    if intent['status'] == 'succeeded':
+        return Order.PAYMENT_COMPLETE
+    if intent['status'] == 'canceled':
+        return Order.PAYMENT_CANCELLED
+    if intent['status'] == 'requires_payment_method' and intent.get('last_payment_error'):
+        return Order.PAYMENT_FAILED
+    return None
+
+
+def pending_orders(older_than=None, batch_size=500):
+    """
+    Pending orders that have a PaymentIntent, yielded as lists of `batch_size` read by keyset (pk > last pk seen),
+    so tens of thousands of rows are never loaded at once.
+    -> each batch is its own short query, no cursor stays open while the reconciler updates the rows it read
+        (SQLite leaves it undefined what an open cursor returns once its table changes: skipped or repeated rows).
+    -> orders settled in a batch drop out of the filter, the keyset still moves past them.
+    """
+    orders = Order.objects.filter(payment_status=Order.PAYMENT_PENDING).exclude(stripe_payment_intent_id='')
+    if older_than is not None:
+        orders = orders.filter(created_at__lt=timezone.now() - older_than)
+    orders = orders.only('id', 'payment_status', 'stripe_payment_intent_id', 'order_currency').order_by('pk')
+    last_pk = None
+    while True:
+        batch = list((orders if last_pk is None else orders.filter(pk__gt=last_pk))[:batch_size])
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        last_pk = batch[-1].pk
+
+
+def _retrieve(order):
+    try:
+        return order, stripe_clients.get(order.order_currency).v1.payment_intents.retrieve(order.stripe_payment_intent_id), None
+    except StripeError as e:
+        return order, None, e
+
+
+#PaymentReconciler
+class PaymentReconciler:
+    """
+    Checks the PaymentIntent of every pending order against Stripe and settles the orders Stripe has settled.
+    -> orders are read in keyset batches of `batch_size` (pending_orders), each batch is fanned out to one bounded thread pool
+        per Stripe account (USD / EUR), so one account's rate limit doesn't hold the other back.
+    -> each batch is written with one UPDATE per new status, limited to the orders still pending
+        (shop.rollups.bulk_set_payment_status), so an order the webhook or the browser settled meanwhile is never overwritten.
+    -> stats: checked, errors, changed (Counter of new statuses), elapsed seconds.
+    """
+    def __init__(self, workers=8, batch_size=500, older_than=timedelta(minutes=30), dry_run=False, on_batch=None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.older_than = older_than
+        self.dry_run = dry_run
+        self.on_batch = on_batch
+        self.stats = {'checked': 0, 'errors': 0, 'changed': Counter(), 'elapsed': 0.0}
+
+    def run(self):
+        started = time.monotonic()
+        pools = defaultdict(lambda: ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='reconcile'))
+        try:
+            for batch in pending_orders(self.older_than, self.batch_size):
+                futures = [pools[stripe_secret_key(order.order_currency)].submit(_retrieve, order) for order in batch]
+                self._apply([future.result() for future in futures])
+                self.stats['elapsed'] = time.monotonic() - started
+                if self.on_batch:
+                    self.on_batch(self.stats)
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+        self.stats['elapsed'] = time.monotonic() - started
+        return self.stats
+
+    def _apply(self, results):
+        settled = defaultdict(list)
+        for order, intent, error in results:
+            self.stats['checked'] += 1
+            if error is not None:
+                self.stats['errors'] += 1
+                continue
+            new_status = settled_status(intent)
+            if new_status is not None:
+                settled[new_status].append(order.pk)
+
+        for new_status, order_ids in settled.items():
+            if self.dry_run:
+                count = len(order_ids)
+            else:
+                count = bulk_set_payment_status(Order.objects.filter(pk__in=order_ids, payment_status=Order.PAYMENT_PENDING), new_status)
+            self.stats['changed'][new_status] += count
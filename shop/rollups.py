@@ -0,0 +1,121 @@
+"""
+Incremental sales rollups (SalesRollup) for the admin dashboard.
+-> every order creation and payment status change goes through record_transitions, in the same transaction,
+    so the dashboard reads a handful of rollup rows instead of aggregating the whole Order table.
+-> set_payment_status / bulk_set_payment_status change the status and roll the change up in one go.
+-> `manage.py rebuild_sales_rollups` recomputes everything from the orders (after a bulk import, or to fix drift).
+"""
+from collections import defaultdict
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import Order, SalesRollup
+
+#the Order fields a transition needs, for querysets that only load part of the order
+ROLLUP_FIELDS = ['id', 'created_at', 'payment_status', 'order_currency', 'total', 'discount_amount', 'tax_amount']
+
+
+def _deltas(transitions):
+    deltas = defaultdict(lambda: [0, Decimal('0'), Decimal('0'), Decimal('0')])
+    for order, old_status, new_status in transitions:
+        if old_status == new_status:
+            continue
+        day = timezone.localdate(order.created_at)
+        amounts = (1, order.total, order.discount_amount, order.tax_amount)
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            if status is None:
+                continue
+            row = deltas[(day, order.order_currency, status)]
+            for i, amount in enumerate(amounts):
+                row[i] += sign * amount
+    return {key: row for key, row in deltas.items() if any(row)}
+
+
+def record_transitions(transitions):
+    """
+    Apply (order, old_status, new_status) changes to the rollups.
+    -> old_status None is a new order, new_status None a deleted one.
+    -> all the changes are summed per rollup row and written with a single
+        INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col (same syntax on SQLite and PostgreSQL),
+        the increment happens in the database so concurrent transitions never overwrite each other.
+    """
+    deltas = _deltas(transitions)
+    if not deltas:
+        return
+    ops, qn = connection.ops, connection.ops.quote_name
+    table = qn(SalesRollup._meta.db_table)
+    counters = ['order_count', 'revenue', 'discount', 'tax']
+    params = []
+    for (day, currency, status), (count, revenue, discount, tax) in deltas.items():
+        params += [ops.adapt_datefield_value(day), currency, status, count] + [
+            ops.adapt_decimalfield_value(amount, 14, 2) for amount in (revenue, discount, tax)
+        ]
+    columns = ', '.join(qn(name) for name in ['day', 'currency', 'payment_status'] + counters)
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(deltas))
+    increments = ', '.join(f'{qn(name)} = {table}.{qn(name)} + excluded.{qn(name)}' for name in counters)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) VALUES {values} '
+            f'ON CONFLICT ({qn("day")}, {qn("currency")}, {qn("payment_status")}) DO UPDATE SET {increments}',
+            params,
+        )
+
+
+def set_payment_status(order, new_status, from_status=None):
+    """
+    Move one order to new_status and roll the change up.
+    -> UPDATE ... WHERE payment_status = from_status (the status the order was read with by default),
+        if someone else changed the order meanwhile nothing is written or counted.
+    -> returns True when the order changed.
+    """
+    from_status = order.payment_status if from_status is None else from_status
+    order.payment_status = new_status
+    if from_status == new_status:
+        return False
+    with transaction.atomic():
+        changed = Order.objects.filter(pk=order.pk, payment_status=from_status).update(payment_status=new_status)
+        if changed:
+            record_transitions([(order, from_status, new_status)])
+    return bool(changed)
+
+
+aset_payment_status = sync_to_async(set_payment_status)
+
+
+def bulk_set_payment_status(orders, new_status):
+    """
+    The queryset version: locks the orders that aren't new_status yet, moves them with one UPDATE
+    and rolls them up with one upsert. Returns how many orders changed.
+    """
+    with transaction.atomic():
+        changing = list(orders.exclude(payment_status=new_status).select_for_update().only(*ROLLUP_FIELDS))
+        if changing:
+            Order.objects.filter(pk__in=[order.pk for order in changing]).update(payment_status=new_status)
+            record_transitions([(order, order.payment_status, new_status) for order in changing])
+    return len(changing)
+
+
+def rebuild_sales_rollups():
+    """recompute every rollup row from the orders with one GROUP BY, returns the number of rows written"""
+    rows = (
+        Order.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'order_currency', 'payment_status')
+        .annotate(order_count=Count('id'), revenue=Sum('total'), discount=Sum('discount_amount'), tax=Sum('tax_amount'))
+        .order_by()
+    )
+    with transaction.atomic():
+        SalesRollup.objects.all().delete()
+        rollups = SalesRollup.objects.bulk_create(
+            [
+                SalesRollup(
+                    day=row['day'], currency=row['order_currency'], payment_status=row['payment_status'],
+                    order_count=row['order_count'], revenue=row['revenue'], discount=row['discount'], tax=row['tax'],
+                )
+                for row in rows.iterator()
+            ],
+            batch_size=1000,
+        )
+    return len(rollups)
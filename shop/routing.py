@@ -0,0 +1,83 @@
+"""
+Read replicas (settings.READ_REPLICAS, see DATABASE_REPLICAS in ricart/settings.py).
+-> ReplicaRouter sends reads to a random replica only inside a request that ReplicaRoutingMiddleware marked as safe:
+    a GET/HEAD/OPTIONS request from a client that hasn't written anything in the last REPLICA_STICKY_SECONDS.
+-> everything else stays on the primary ('default'): writes, reads inside transaction.atomic, reads after the request
+    wrote something, and all code running outside a request (management commands, jobs, the webhook worker).
+-> read-your-writes: a request that writes sets a short-lived cookie, the client's next requests read from the primary
+    until the replicas have caught up (creating an order, changing a cart, logging in, ...).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """per request: may reads use a replica, did the request write"""
+    def __init__(self, primary):
+        self.primary = primary
+        self.wrote = False
+
+
+_state = ContextVar('shop_db_routing', default=None)
+
+
+@contextmanager
+def use_primary():
+    """read from the primary inside the block, for code that must see the latest writes"""
+    token = _state.set(RoutingState(primary=True))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+#ReplicaRouter
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = settings.READ_REPLICAS
+        if not replicas or state is None or state.primary or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # the rest of the request, and the client's next ones for a while, read what was just written
+            state.primary = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        return False if db in settings.READ_REPLICAS else None
+
+
+#ReplicaRoutingMiddleware
+class ReplicaRoutingMiddleware:
+    """decides, per request, whether reads may go to a replica (see the module docstring)"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState(primary=request.method not in SAFE_METHODS or PRIMARY_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and settings.READ_REPLICAS:
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,68 @@
+import re
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'shop_item_fts'  # FTS5 table created in migrations/0019_item_search_index.py
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_available(using='default'):
+    """the FTS5 index only exists on SQLite, other databases fall back to icontains"""
+    return connections[using].vendor == 'sqlite'
+
+
+def build_match_query(text):
+    """
+    Turn user input into a safe FTS5 MATCH expression.
+    -> every word becomes a quoted prefix term: 'red sho' -> '"red"* "sho"*'
+    -> all terms are required, FTS5 operators and quotes typed by the user are ignored.
+    """
+    terms = _TERM_RE.findall(text or '')
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_items(queryset, text):
+    """
+    Filter an Item queryset by full-text search and annotate it with `rank` (lower is better).
+    -> order by ('rank', 'id') for best matches first.
+    """
+    match = build_match_query(text)
+    if not match:
+        return queryset.none()
+    if not search_available(queryset.db):
+        return queryset.filter(_icontains(text)).annotate(rank=Value(0.0, output_field=FloatField()))
+    # the matching ids, and the rank of each one read back from the index by its rowid (FTS5 seeks it, no second scan)
+    return queryset.filter(id__in=_matching_ids(match)).annotate(rank=RawSQL(
+        f'SELECT rank FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND {SEARCH_TABLE}.rowid = shop_item.id',
+        (match,), output_field=FloatField(),
+    ))
+
+
+def filter_items(queryset, text):
+    """Filter an Item queryset by full-text search without ranking (used by the admin search box)."""
+    match = build_match_query(text)
+    if not match:
+        return queryset
+    if not search_available(queryset.db):
+        return queryset.filter(_icontains(text))
+    return queryset.filter(id__in=_matching_ids(match))
+
+
+def rebuild_search_index(using='default'):
+    """Re-tokenize every Item. Triggers keep the index in sync, this is for recovery and bulk loads."""
+    if not search_available(using):
+        return False
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES('rebuild')")
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES('optimize')")
+    return True
+
+
+def _matching_ids(match):
+    return RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', (match,))
+
+
+def _icontains(text):
+    return Q(name__icontains=text) | Q(description__icontains=text)
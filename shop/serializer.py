@@ -1,16 +1,58 @@
-from decimal import Decimal
+from datetime import datetime, time, timedelta
 from rest_framework import serializers
 from django.db import transaction
 from django.conf import settings
-from .models import Cart, CartItem, Item, OrderItem, Order,Discount,Tax
+from django.utils import timezone
+from .models import Cart, CartItem, Item, OrderItem, Order
+from .pricebook import book_price
+from .pricing import build_quote
+from .rates import is_supported, supported_currencies
+from .carts import cart_store, materialize, delete_carts, add_cart_items
+from .rollups import record_transitions
+from .exports import EXPORT_FORMATS
+
+
+#CurrencyField accepts any currency that has an exchange rate, case insensitive.
+class CurrencyField(serializers.CharField):
+    default_error_messages = {
+        'unsupported': 'Unsupported currency "{input}". Supported: {supported}.',
+    }
+
+    def __init__(self, **kwargs):
+        if not kwargs.get('required'):
+            kwargs.setdefault('default', settings.BASE_CURRENCY)
+        kwargs.setdefault('max_length', 3)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        currency = super().to_internal_value(data).upper()
+        if not is_supported(currency):
+            self.fail('unsupported', input=currency, supported=', '.join(supported_currencies()))
+        return currency
 
 
 #Item Serializer
 class ItemSerializer(serializers.ModelSerializer):
+    """
+        -> price/currency are the item's own price.
+        -> display_price/display_currency are the price book price when the queryset was annotated
+            with display_price (GET /api/items/?currency=EUR), otherwise the item's own price.
+    """
+    display_price = serializers.SerializerMethodField()
+    display_currency = serializers.SerializerMethodField()
+
+    def get_display_price(self, item: Item):
+        price = getattr(item, 'display_price', None)
+        return item.price if price is None else price
+
+    def get_display_currency(self, item: Item):
+        if getattr(item, 'display_price', None) is None:
+            return item.currency
+        return item.display_currency
 
     class Meta:
         model = Item
-        fields = ['id', 'name', 'description', 'price', 'currency']
+        fields = ['id', 'name', 'description', 'price', 'currency', 'display_price', 'display_currency']
 
 #OrderItem Serializer
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -28,7 +70,12 @@ class OrderSerializer(serializers.ModelSerializer):
     """
         this serilizer display Order details.
     """
-    items = OrderItemSerializer(many=True, read_only=True)
+    items = serializers.SerializerMethodField()
+
+    def get_items(self, order: Order):
+        # a new order's lines are handed over in context['order_items'] (see create_order_from_quote), others are prefetched by the views
+        order_items = self.context.get('order_items')
+        return OrderItemSerializer(order.items.all() if order_items is None else order_items, many=True, context=self.context).data
 
     class Meta:
         model = Order
@@ -38,79 +85,93 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'payment_status', 'subtotal', 'discount_amount', 'tax_amount', 'total']
 
+#create_order_from_quote is shared by CreateOrderSerializer and BuyItemSerializer
+def create_order_from_quote(quote):
+    """
+    Insert the Order with its totals already computed, then all its OrderItems in one bulk insert.
+    -> returns (order, order_items), OrderSerializer takes the rows in context['order_items'] instead of reading them back.
+    """
+    order = Order.objects.create(
+        order_currency=quote.currency,
+        subtotal=quote.subtotal,
+        discount_amount=quote.discount_amount,
+        tax_amount=quote.tax_amount,
+        total=quote.total,
+    )
+    order_items = OrderItem.objects.bulk_create([
+        OrderItem(order=order, item=line.item, unit_price=line.unit_price, quantity=line.quantity)
+        for line in quote.lines
+    ])
+    record_transitions([(order, None, order.payment_status)])
+    return order, order_items
+
+
 #CreateOrderSerializer 
 class CreateOrderSerializer(serializers.Serializer):
     """
     When order is created.
         -> Order request must have cart_id
         -> This serializer , will use cart_id , to get list of orderitems in the cart
-        -> total, subtotal, discount_amount and tax_amount is calculated here.
+        -> total, subtotal, discount_amount and tax_amount is calculated by shop.pricing.build_quote.
         -> because multiple database update happen here, i use transaction.Atomic, 
             -> To ensure changes is rolled back if there is an error in one of the database operation
     """
     cart_id = serializers.UUIDField()
-    currency = serializers.ChoiceField(choices=[(settings.BASE_CURRENCY, settings.BASE_CURRENCY), (settings.EUR_CURRENCY, settings.EUR_CURRENCY)], default=settings.BASE_CURRENCY)
+    currency = CurrencyField()
+
+    def validate(self, attrs):
+        store = cart_store(self.context['request']) if 'request' in self.context else None
+        if store is not None:
+            return self._validate_client_cart(store, attrs)
 
-    def validate_cart_id(self, cart_id):
-        if not Cart.objects.filter(pk=cart_id).exists():
-            raise serializers.ValidationError('No cart with the given ID was found.')
-        if CartItem.objects.filter(cart_id=cart_id).count() == 0:
-            raise serializers.ValidationError('Cart is empty.')
-        return cart_id
+        # The cart lines with their item and price book price, in one query.
+        # Whether the cart exists is only asked when it has no lines, so a valid checkout never pays for it.
+        cart_items = list(CartItem.objects.select_related('item').filter(cart_id=attrs['cart_id']).annotate(
+            book_price=book_price(attrs['currency'], 'item_id'),
+        ))
+        if not cart_items:
+            if not Cart.objects.filter(pk=attrs['cart_id']).exists():
+                raise serializers.ValidationError({'cart_id': ['No cart with the given ID was found.']})
+            raise serializers.ValidationError({'cart_id': ['Cart is empty.']})
+        attrs['cart_items'] = cart_items
+        return attrs
+
+    def _validate_client_cart(self, store, attrs):
+        """CART_STORAGE=session|signed: the lines come from the client-side cart, the items in one query"""
+        cart = store.get(attrs['cart_id'])
+        if cart is None:
+            raise serializers.ValidationError({'cart_id': ['No cart with the given ID was found.']})
+        _, cart_items = materialize(cart, annotate={'book_price': book_price(attrs['currency'])})
+        if not cart_items:
+            raise serializers.ValidationError({'cart_id': ['Cart is empty.']})
+        attrs['store'], attrs['cart_items'] = store, cart_items
+        return attrs
 
     def save(self, **kwargs):
+        """
+            -> a fixed number of queries whatever the cart size:
+               (the cart lines were fetched by validate) order insert, order items bulk insert, cart delete.
+            -> the cart delete decides between two concurrent checkouts of one cart, the one that finds it gone gets a 400.
+            -> a session or signed cookie cart (shop.carts) is only turned into database rows here.
+        """
         with transaction.atomic():
             cart_id = self.validated_data['cart_id']
             target_currency = self.validated_data['currency']
-            
-            # Create order with selected currency
-            order = Order.objects.create(order_currency=target_currency)
-            
-            cart_items = CartItem.objects.select_related('item').filter(cart_id=cart_id)
-            
-            order_items = []
-            for cart_item in cart_items:
-                item = cart_item.item
-                unit_price = item.price
-                
-                # Convert price if currency is different
-                if target_currency == settings.EUR_CURRENCY:
-                    unit_price = item.price * Decimal.from_float(settings.CURRENCY_RATE)
-                
-                order_items.append(OrderItem(
-                    order=order,
-                    item=item,
-                    unit_price=unit_price,
-                    quantity=cart_item.quantity,
-                ))
-            
-            OrderItem.objects.bulk_create(order_items)
-            
-            # Calculate and save subtotal totals
-            subtotal = sum(item.quantity * item.unit_price for item in order.items.all())
-            
-            # Calculate discount
-            active_discount = Discount.objects.filter(is_active=True).first()
-            discount_amount = subtotal * (active_discount.percentage / Decimal(100)) if active_discount else Decimal(0)
-        
-            
-            # Calculate  Tax
-            subtotal_after_discount = subtotal - discount_amount
-            active_tax = Tax.objects.filter(is_active=True).first()
-            tax_amount = subtotal_after_discount * (active_tax.percentage / Decimal(100)) if active_tax else Decimal(0)
-            
-            #calculate total after tax and discount applied
-            total = subtotal_after_discount + tax_amount
-            
-            # Save to ordermodel
-            order.subtotal = subtotal
-            order.discount_amount = discount_amount
-            order.tax_amount = tax_amount
-            order.total = total
-            order.save()
-            
+            cart_items = self.validated_data['cart_items']
+
+            # price every line in memory, totals are known before the order is inserted
+            quote = build_quote([(cart_item.item, cart_item.quantity, cart_item.book_price) for cart_item in cart_items], target_currency)
+            order, self.order_items = create_order_from_quote(quote)
+
             # Clear the cart
-            Cart.objects.filter(pk=cart_id).delete()
+            if 'store' in self.validated_data:
+                self.validated_data['store'].delete(cart_id)
+            else:
+                # the lines were read by validate(), outside this transaction: if the cart is gone by now another
+                # checkout of it got here first, raising rolls back the order just inserted.
+                deleted_carts, _ = delete_carts([cart_id])
+                if not deleted_carts:
+                    raise serializers.ValidationError({'cart_id': ['This cart has already been checked out.']})
             
             return order
 
@@ -122,18 +183,44 @@ class OrderIdSerializer(serializers.Serializer):
         error_messages={'error': 'Order not found'}
     )
 
+#OrderExportSerializer validates the filters of GET /api/orders/export/ and `manage.py export_orders`
+class OrderExportSerializer(serializers.Serializer):
+    """
+    -> since / until are dates, both included (created_at from since 00:00 up to the end of until).
+    -> validated_data holds the keyword arguments of shop.exports.export_rows, plus output.
+    """
+    output = serializers.ChoiceField(choices=EXPORT_FORMATS, default='csv')
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    status = serializers.ChoiceField(choices=Order.PAYMENT_STATUS, required=False)
+    currency = serializers.CharField(max_length=3, required=False)
+
+    def validate_currency(self, value):
+        return value.upper()
+
+    def validate(self, attrs):
+        since, until = attrs.get('since'), attrs.get('until')
+        if since and until and since > until:
+            raise serializers.ValidationError({'until': ['Must not be before since.']})
+        tz = timezone.get_current_timezone()
+        if since:
+            attrs['since'] = datetime.combine(since, time.min, tzinfo=tz)
+        if until:
+            attrs['until'] = datetime.combine(until + timedelta(days=1), time.min, tzinfo=tz)
+        return attrs
+
 #BuyItemSerializer
 class BuyItemSerializer(serializers.Serializer):
     """
     This Serializer is for direct item purchases with currency conversion
-    -> GET /api/buy/{item_id}?cur={USD|EUR}
+    -> GET /api/buy/{item_id}?cur={USD|EUR|...}
     -> It must have item id
-    -> currency field if not available will be default to USD.
+    -> currency field if not available will be default to USD, any currency with an exchange rate is accepted.
     -> it process payment of a single item only.
     -> because multiple database operation happen, i use transaction.Atomic to ensure operation is rolled back.
     -> it works like this:
         -> it will use item_id to get the info about the item
-        -> if cur is EUR , it convert item price to EUR
+        -> it converts the item price to cur using shop.rates
         -> it then create an Order for this single item
         -> Then use the OrderId to initiated a payment using stripe.
         Note: This Serializer supposed to be with CreateOrderSerializer, but because the task requires implementing single payment by itemid, that's why i separated it from CreatOrderSerialzier for demonstration.
@@ -146,15 +233,18 @@ class BuyItemSerializer(serializers.Serializer):
         if not item_id:
             raise serializers.ValidationError('Item ID is required')
         
+        # Get currency from request query parameters
+        request = self.context.get('request')
+        target_currency = request.GET.get('cur', settings.BASE_CURRENCY).upper() #if no, default to USD
+        if not is_supported(target_currency):
+            raise serializers.ValidationError(f'Unsupported currency "{target_currency}".')
+        attrs['target_currency'] = target_currency
+
         try:
-            item = Item.objects.get(id=item_id)
+            # item with its price book price in the selected currency
+            item = Item.objects.annotate(book_price=book_price(target_currency)).get(id=item_id)
             attrs['item'] = item
             
-            # Get currency from request query parameters
-            request = self.context.get('request')
-            target_currency = request.GET.get('cur', 'USD').upper() #if no, default to USD
-            attrs['target_currency'] = target_currency
-            
         except Item.DoesNotExist:
             raise serializers.ValidationError('Item not found')
         
@@ -165,45 +255,102 @@ class BuyItemSerializer(serializers.Serializer):
         target_currency = validated_data['target_currency']
         
         with transaction.atomic():
-            # Create order with selected currency
-            order = Order.objects.create(order_currency=target_currency)
-            
-            # Calculate unit price with currency conversion
-            unit_price = item.price
-          
-            if target_currency == settings.EUR_CURRENCY:
-                print("Yes: UE")
-                unit_price = item.price * Decimal.from_float(settings.CURRENCY_RATE)
-            
-            # Create single order item with converted price
-            order_item = OrderItem(
-                order=order,
-                item=item,
-                unit_price=unit_price,
-                quantity=1
-            )
-            order_item.save()
-            
-            # CALCULATE AND SAVE TOTALS (same as CreateOrderSerializer)
-            subtotal = sum(item.quantity * item.unit_price for item in order.items.all())
-            
-            active_discount = Discount.objects.filter(is_active=True).first()
-            discount_amount = subtotal * (active_discount.percentage / Decimal(100)) if active_discount else Decimal(0)
-            
-            subtotal_after_discount = subtotal - discount_amount
-            active_tax = Tax.objects.filter(is_active=True).first()
-            tax_amount = subtotal_after_discount * (active_tax.percentage / Decimal(100)) if active_tax else Decimal(0)
-            
-            total = subtotal_after_discount + tax_amount
-            
-            # Save calculated totals to model
-            order.subtotal = subtotal
-            order.discount_amount = discount_amount
-            order.tax_amount = tax_amount
-            order.total = total
-            order.save()
-            
-            return order
+            # single order item with the price converted to the selected currency
+            order, self.order_items = create_order_from_quote(build_quote([(item, 1, item.book_price)], target_currency))
+        return order
+
+
+
+#CurrencySwitchSerializer validates POST /api/currency/switch/
+class CurrencySwitchSerializer(serializers.Serializer):
+    currency = CurrencyField(required=True)
+
+#Quote Serializers
+class QuoteLineInputSerializer(serializers.Serializer):
+    item_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=32767) #same bounds as OrderItem.quantity
+
+class QuoteInputSerializer(serializers.Serializer):
+    """one cart to price: either an existing cart_id or a list of items"""
+    cart_id = serializers.UUIDField(required=False)
+    items = QuoteLineInputSerializer(many=True, required=False, allow_empty=False)
+
+    def validate(self, attrs):
+        if ('cart_id' in attrs) == ('items' in attrs):
+            raise serializers.ValidationError('Provide either cart_id or items.')
+        return attrs
+
+class QuoteRequestSerializer(serializers.Serializer):
+    """
+    POST /api/quotes/ {currency: {USD|EUR|...}, quotes: [{cart_id: {cart_id}}, {items: [{item_id, quantity}]}, ...]}
+    -> prices many carts / item lists without creating orders.
+    -> query count doesn't depend on the number of quotes or lines:
+        one query for all carts, one query for all items, pricing rules come from the process cache.
+    """
+    MAX_QUOTES = 100
+
+    currency = CurrencyField()
+    quotes = QuoteInputSerializer(many=True, allow_empty=False, max_length=MAX_QUOTES)
+
+    def validate(self, attrs):
+        quotes = attrs['quotes']
+        currency = attrs['currency']
+        cart_ids = {quote['cart_id'] for quote in quotes if 'cart_id' in quote}
+        item_ids = {line['item_id'] for quote in quotes for line in quote.get('items', [])}
+
+        cart_lines = {}
+        store = cart_store(self.context['request']) if 'request' in self.context else None
+        if cart_ids and store is not None:
+            # CART_STORAGE=session|signed: the request carries (at most) one cart of its own
+            for cart_id in cart_ids:
+                cart = store.get(cart_id)
+                if cart is not None:
+                    _, cart_items = materialize(cart, annotate={'book_price': book_price(currency)})
+                    cart_lines[cart_id] = [(cart_item.item, cart_item.quantity, cart_item.book_price) for cart_item in cart_items]
+        elif cart_ids:
+            cart_items = CartItem.objects.select_related('item').filter(cart_id__in=cart_ids).annotate(
+                book_price=book_price(currency, 'item_id'),
+            ).order_by('id')
+            for cart_item in cart_items:
+                cart_lines.setdefault(cart_item.cart_id, []).append((cart_item.item, cart_item.quantity, cart_item.book_price))
+        items = Item.objects.annotate(book_price=book_price(currency)).in_bulk(item_ids) if item_ids else {}
+
+        lines, errors = [], []
+        for quote in quotes:
+            if 'cart_id' in quote:
+                found = cart_lines.get(quote['cart_id'])
+                lines.append(found)
+                errors.append({} if found else {'cart_id': ['No cart with the given ID was found or cart is empty.']})
+            else:
+                missing = sorted({line['item_id'] for line in quote['items']} - items.keys())
+                lines.append([
+                    (items[line['item_id']], line['quantity'], items[line['item_id']].book_price)
+                    for line in quote['items'] if line['item_id'] in items
+                ])
+                errors.append({'items': [f'No item with the given ID was found: {missing}']} if missing else {})
+        if any(errors):
+            raise serializers.ValidationError({'quotes': errors})
+
+        attrs['lines'] = lines
+        return attrs
+
+    def save(self, **kwargs):
+        currency = self.validated_data['currency']
+        return [build_quote(lines, currency) for lines in self.validated_data['lines']]
+
+class QuoteLineSerializer(serializers.Serializer):
+    item_id = serializers.IntegerField(source='item.id')
+    quantity = serializers.IntegerField()
+    unit_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    line_total = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class QuoteSerializer(serializers.Serializer):
+    currency = serializers.CharField()
+    lines = QuoteLineSerializer(many=True)
+    subtotal = serializers.DecimalField(max_digits=14, decimal_places=2)
+    discount_amount = serializers.DecimalField(max_digits=14, decimal_places=2)
+    tax_amount = serializers.DecimalField(max_digits=14, decimal_places=2)
+    total = serializers.DecimalField(max_digits=14, decimal_places=2)
 
 
 
@@ -219,18 +366,27 @@ class CartItemSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
 
     def get_total_price(self, cart_item: CartItem):
-        return cart_item.quantity * cart_item.item.price
+        # line_total is annotated by CartItemViewSet / CartViewSet, a bare instance falls back to the model property
+        line_total = getattr(cart_item, 'line_total', None)
+        return line_total if line_total is not None else cart_item.total_price
 
     class Meta:
         model = CartItem
         fields = ['id', 'item', 'quantity', 'total_price']
 
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+    items = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
 
+    def get_items(self, cart: Cart):
+        # a client-side cart hands its lines over in context['cart_items'] (shop.carts.materialize), CartViewSet prefetches the others
+        cart_items = self.context.get('cart_items')
+        return CartItemSerializer(cart.items.all() if cart_items is None else cart_items, many=True, context=self.context).data
+
     def get_total_price(self, cart: Cart):
-        return sum([item.quantity * item.item.price for item in cart.items.all()])
+        # cart_total is annotated by CartViewSet (SUM in the database), a bare instance falls back to the model property
+        cart_total = getattr(cart, 'cart_total', None)
+        return cart_total if cart_total is not None else cart.total_price
 
     class Meta:
         model = Cart
@@ -247,23 +403,43 @@ class AddCartItemSerializer(serializers.ModelSerializer):
     def save(self, **kwargs):
         cart_id = self.context['cart_id']
         item_id = self.validated_data['item_id']
-        quantity = self.validated_data['quantity']
+        quantity = self.validated_data.get('quantity', 1)
 
-        try:
-            cart_item = CartItem.objects.get(cart_id=cart_id, item_id=item_id)
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(cart_id=cart_id, **self.validated_data)
+        # same upsert as the bulk endpoint: F() increment, no lost update when the item is added twice at once
+        add_cart_items(cart_id, {item_id: quantity})
+        self.instance = CartItem.objects.get(cart_id=cart_id, item_id=item_id)
 
         return self.instance
 
     class Meta:
         model = CartItem
         fields = ['id', 'item_id', 'quantity']
+        extra_kwargs = {'quantity': {'max_value': settings.CART_MAX_QUANTITY}}
+
+class BulkCartLinesSerializer(serializers.ListSerializer):
+    """
+    -> every item id is checked with one query.
+    -> validated_data is {item_id: quantity}, an item listed twice is added up.
+    """
+    def validate(self, lines):
+        quantities = {}
+        for line in lines:
+            quantities[line['item_id']] = quantities.get(line['item_id'], 0) + line['quantity']
+        unknown = set(quantities) - set(Item.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+        if unknown:
+            raise serializers.ValidationError(f'No item with the given ID was found: {", ".join(map(str, sorted(unknown)))}.')
+        return quantities
+
+class CartLineSerializer(serializers.Serializer):
+    """one {item_id, quantity} of POST /api/carts/{id}/items/bulk/"""
+    item_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=settings.CART_MAX_QUANTITY, default=1)
+
+    class Meta:
+        list_serializer_class = BulkCartLinesSerializer
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['quantity']
+        extra_kwargs = {'quantity': {'max_value': settings.CART_MAX_QUANTITY}}
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .catalog import bump_catalog_version
+from .models import Item, Discount, Tax, ExchangeRate
+from .pricebook import rebuild_price_book
+from .pricing import invalidate_pricing_rules
+from .rates import invalidate_rates
+
+
+#Every Item change gives the catalog a new version, so clients holding an old ETag get a fresh 200.
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def item_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+#Checkout reads the active Discount/Tax from a process cache, drop it when they change.
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+@receiver(post_save, sender=Tax)
+@receiver(post_delete, sender=Tax)
+def pricing_rule_changed(sender, **kwargs):
+    invalidate_pricing_rules()
+
+
+#Keep the price book in step with the item price.
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, **kwargs):
+    rebuild_price_book([instance.pk])
+
+
+#A rate edited in the admin re-prices every item in every currency.
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def exchange_rate_changed(sender, **kwargs):
+    invalidate_rates()
+    rebuild_price_book()
+    bump_catalog_version()
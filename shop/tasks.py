@@ -0,0 +1,52 @@
+"""
+Handlers of the background jobs (shop.jobs), imported by ShopConfig.ready() so every process knows them.
+"""
+import stripe
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from .carts import purge_abandoned_carts
+from .jobs import enqueue, job
+from .models import Order
+from .payments import stripe_clients
+from .rollups import set_payment_status
+from .utils import OrderValidationError
+
+CANCEL_PAYMENT_INTENT = 'stripe.cancel_payment_intent'
+PURGE_ABANDONED_CARTS = 'carts.purge_abandoned'
+
+
+@job(CANCEL_PAYMENT_INTENT)
+def cancel_payment_intent(intent_id, currency):
+    """cancel the PaymentIntent of a cancelled order, off the request path"""
+    try:
+        stripe_clients.get(currency).v1.payment_intents.cancel(intent_id)
+    except stripe.InvalidRequestError as e:
+        # already canceled or succeeded, a retry would get the same answer.
+        # (a payment that succeeded meanwhile completes the order through the webhook)
+        if e.code == 'payment_intent_unexpected_state':
+            return
+        raise
+
+
+def cancel_order(order):
+    """
+    The cancel endpoints: move the order to PAYMENT_CANCELLED and queue the cancellation of its payment intent.
+    -> both in one transaction, and only if the guarded status change went through.
+        an order settled meanwhile (by the webhook, say) raises OrderValidationError and nothing is queued.
+    """
+    from_status, intent_id = order.payment_status, order.stripe_payment_intent_id
+    with transaction.atomic():
+        if not set_payment_status(order, Order.PAYMENT_CANCELLED, from_status=from_status):
+            order.payment_status = from_status
+            raise OrderValidationError('Cannot cancel processed order')
+        if intent_id and from_status == Order.PAYMENT_PENDING:
+            enqueue(CANCEL_PAYMENT_INTENT, intent_id=intent_id, currency=order.order_currency)
+
+
+acancel_order = sync_to_async(cancel_order)
+
+
+@job(PURGE_ABANDONED_CARTS)
+def purge_abandoned_carts_job(max_batches=10):
+    """the opportunistic sweep queued by shop.carts.maybe_sweep_carts, bounded so one job never runs for long"""
+    purge_abandoned_carts(max_batches=max_batches)
@@ -1,6 +1,7 @@
 from rest_framework_nested import routers
 from django.urls import path, include
-from .views import  ItemViewSet, BuyItemViewSet, OrderViewSet, StripePaymentView, CartViewSet, CartItemViewSet
+from . import async_views, webhooks
+from .views import  ItemViewSet, BuyItemViewSet, OrderViewSet, QuoteViewSet, CurrencyViewSet, StripePaymentView, CartViewSet, CartItemViewSet
 
 app_name = "shop"
 
@@ -9,6 +10,8 @@ router = routers.DefaultRouter()
 router.register('items', ItemViewSet, basename='items') #/api/items/
 router.register('buy', BuyItemViewSet, basename='buy') #/api/buy/{id}
 router.register('orders', OrderViewSet, basename='orders') #/api/orders, /api/orders/{id}
+router.register('quotes', QuoteViewSet, basename='quotes') #/api/quotes/
+router.register('currency', CurrencyViewSet, basename='currency') #/api/currency/, /api/currency/switch/
 router.register('payment', StripePaymentView, basename='payment') #/api/payment/sessions/,/api/payment/cancel/,/api/payment/confirm/
 
 #This carts api is not in the task, but i implement it to facilitaet Order operation, you may ignore them.
@@ -17,4 +20,14 @@ carts_router = routers.NestedDefaultRouter(router, 'carts', lookup='cart')
 carts_router.register('items', CartItemViewSet, basename='cart-items')
 
 
-urlpatterns = router.urls + carts_router.urls
+#async payment endpoints, only worth it when served through ricart/asgi.py (SERVER_MODE=asgi)
+async_urlpatterns = [
+    path('async/payment/sessions/', async_views.payment_sessions, name='async-payment-sessions'),
+    path('async/payment/cancel/', async_views.payment_cancel, name='async-payment-cancel'),
+    path('async/payment/confirm/', async_views.payment_confirm, name='async-payment-confirm'),
+    path('async/orders/<uuid:pk>/', async_views.order_detail, name='async-order-detail'),
+]
+
+urlpatterns = [
+    path('payment/webhook/', webhooks.stripe_webhook, name='payment-webhook'), #Stripe -> signed events into the StripeEvent inbox
+] + router.urls + carts_router.urls + async_urlpatterns
@@ -1,7 +1,13 @@
+import threading
+import time
 from functools import wraps
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
 from stripe import StripeError
 from rest_framework import status
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
 
 
@@ -25,3 +31,60 @@ def handle_payment_exceptions(view_func):
             return Response({'error': f'Server error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     return wrapper
 
+
+def json_response(data, status=status.HTTP_200_OK):
+    """JsonResponse encoded the way DRF encodes Response data, so the async endpoints render the same JSON"""
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+#same as handle_payment_exceptions, for the plain async views in async_views.py
+def handle_async_payment_exceptions(view_func):
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view_func(request, *args, **kwargs)
+        except OrderValidationError as e:
+            return json_response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except StripeError as e:
+            return json_response({'error': f'Stripe error: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return json_response({'error': f'Server error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return wrapper
+
+
+#ProcessCache
+class ProcessCache:
+    """
+    A value loaded from the database and kept in this process.
+    -> get() reloads it after `ttl_setting` seconds, so other worker processes catch up with changes.
+    -> invalidate() drops it now and again when the current transaction commits.
+    -> a generation counter keeps a reader that raced an invalidation from storing what it read.
+    """
+    def __init__(self, loader, ttl_setting):
+        self.loader = loader
+        self.ttl_setting = ttl_setting
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def get(self):
+        value, loaded_at = self._value, self._loaded_at
+        if value is not None and time.monotonic() - loaded_at < getattr(settings, self.ttl_setting):
+            return value
+
+        generation = self._generation
+        value = self.loader()
+        with self._lock:
+            if self._generation == generation:
+                self._value, self._loaded_at = value, time.monotonic()
+        return value
+
+    def invalidate(self):
+        self.clear()
+        transaction.on_commit(self.clear)
+
+    def clear(self):
+        with self._lock:
+            self._value, self._loaded_at = None, 0.0
+            self._generation += 1
+
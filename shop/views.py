@@ -1,27 +1,79 @@
-import stripe
 from stripe import StripeError
 from functools import wraps
 from rest_framework import status,viewsets
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from django.conf import settings
+from django.http import StreamingHttpResponse
+from decimal import Decimal
+from django.db.models import CharField, DecimalField, ExpressionWrapper, F, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.utils.decorators import method_decorator
 from .models import Item, Cart, CartItem, Order
-from .serializer import ItemSerializer, BuyItemSerializer,CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer, CreateOrderSerializer,  OrderSerializer, OrderIdSerializer
-from .utils import handle_payment_exceptions, OrderValidationError
+from .serializer import ItemSerializer, BuyItemSerializer,CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer, CartLineSerializer, CreateOrderSerializer,  OrderSerializer, OrderExportSerializer, OrderIdSerializer, QuoteRequestSerializer, QuoteSerializer, CurrencySwitchSerializer
+from .utils import handle_payment_exceptions
+from .pagination import KeysetPagination
+from .carts import cart_store, materialize, touch_cart, maybe_sweep_carts, add_cart_items
+from .catalog import catalog_etag, catalog_last_modified
+from .search import search_items
+from .rates import get_rates, is_supported
+from .pricebook import book_price
+from .rollups import set_payment_status
+from .exports import export_rows, export_stream
+from .tasks import cancel_order
+from .payments import stripe_clients, validate_order_for_payment, validate_order_for_cancellation, payment_session, confirmation_from_order, apply_confirmation
 
 #ItemView
+@method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name='list')
+@method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name='retrieve')
 class ItemViewSet(ReadOnlyModelViewSet):
     """
         -> GET /api/items
         -> Only Read(GET) operation is allowed
-        -> it returns list of items.
+        -> it returns list of items, paginated by cursor: ?limit={n}&ordering={id|price|name|-price|...}
+        -> GET /api/items/?q={text} : full-text search (prefix match on every word), best matches first.
+        -> GET /api/items/?currency={EUR|...} : display_price/display_currency from the price book.
+        -> responses carry ETag/Last-Modified from the catalog version,
+            If-None-Match with the current ETag returns 304 without querying or serializing items.
     """
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
+    pagination_class = KeysetPagination
+    search_param = 'q'
+
+    def get_search_query(self):
+        if self.action != 'list':
+            return ''
+        return self.request.query_params.get(self.search_param, '').strip()
+
+    # read by KeysetPagination, search results are paged by relevance
+    @property
+    def ordering_fields(self):
+        return ['rank', 'id'] if self.get_search_query() else ['id', 'price', 'name']
+
+    @property
+    def ordering(self):
+        return 'rank' if self.get_search_query() else 'id'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        currency = self.request.query_params.get('currency', '').upper()
+        if currency:
+            if not is_supported(currency):
+                raise ValidationError({'currency': f'Unsupported currency "{currency}".'})
+            # prices in the shopper's currency straight from the price book, no per-row conversion
+            queryset = queryset.annotate(display_price=book_price(currency), display_currency=Value(currency, output_field=CharField()))
+        query = self.get_search_query()
+        if query:
+            return search_items(queryset, query)
+        return queryset
 
 #BuyItemView
 class BuyItemViewSet(RetrieveModelMixin, GenericViewSet):
@@ -39,13 +91,15 @@ class BuyItemViewSet(RetrieveModelMixin, GenericViewSet):
         serializer = self.get_serializer(data={})
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
-        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        return Response(OrderSerializer(order, context={'order_items': serializer.order_items}).data, status=status.HTTP_201_CREATED)
+
 
 #OrderView
 class OrderViewSet(CreateModelMixin, RetrieveModelMixin, GenericViewSet):
     """
         -> GET /api/orders/{id} : get detail about specific order by it id.
         -> POST /api/orders/ : this will take cart_id and create order.
+        -> GET /api/orders/export/ : staff only, streaming CSV / NDJSON export.
     """
     queryset = Order.objects.prefetch_related('items__item').all()
     
@@ -63,7 +117,64 @@ class OrderViewSet(CreateModelMixin, RetrieveModelMixin, GenericViewSet):
         )
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
-        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        response = Response(OrderSerializer(order, context={'order_items': serializer.order_items}).data, status=status.HTTP_201_CREATED)
+        store = cart_store(request)
+        return store.apply(response) if store is not None else response
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+            -> GET /api/orders/export/?output=csv|ndjson&since=YYYY-MM-DD&until=YYYY-MM-DD&status=P|C|F|X&currency=USD (staff only)
+            -> streams the orders with their lines as they are read from the database (see shop.exports).
+        """
+        serializer = OrderExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = dict(serializer.validated_data)
+        output = filters.pop('output')
+        response = StreamingHttpResponse(
+            export_stream(output, export_rows(**filters)),
+            content_type='text/csv' if output == 'csv' else 'application/x-ndjson',
+        )
+        response['Content-Disposition'] = f'attachment; filename="orders.{output}"'
+        return response
+
+
+#QuoteView
+class QuoteViewSet(viewsets.ViewSet):
+    """
+        -> POST /api/quotes/ {currency: {USD|EUR}, quotes: [{cart_id: {cart_id}} | {items: [{item_id, quantity}]}]}
+        -> prices many carts or item lists in one request, nothing is written to the database.
+        -> each quote has lines, subtotal, discount_amount, tax_amount and total, priced exactly like an order.
+    """
+    def create(self, request):
+        serializer = QuoteRequestSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        quotes = serializer.save()
+        return Response({'quotes': QuoteSerializer(quotes, many=True).data}, status=status.HTTP_200_OK)
+
+
+#CurrencyView
+class CurrencyViewSet(viewsets.ViewSet):
+    """
+        -> GET /api/currency/?base={USD|EUR|...} : exchange rates from our own rates table (no third party call from the browser)
+        -> POST /api/currency/switch/ {currency: {currency}} : remember the shopper's display currency in the session
+    """
+    def list(self, request):
+        base = request.query_params.get('base', settings.BASE_CURRENCY).upper()
+        if not is_supported(base):
+            return Response({'error': f'Unsupported currency "{base}"'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'base': base,
+            'rates': get_rates(base),
+            'selected': request.session.get('currency', settings.BASE_CURRENCY),
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def switch(self, request):
+        serializer = CurrencySwitchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        request.session['currency'] = serializer.validated_data['currency']
+        return Response({'currency': request.session['currency']}, status=status.HTTP_200_OK)
 
 
 #StripePaymentViewSet
@@ -86,24 +197,9 @@ class StripePaymentView(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
         return serializer.validated_data['order_id']
 
-    def _set_stripe_currency(self, currency):
-        """Set Stripe API key based on currency"""
-        if currency == 'EUR':
-            stripe.api_key = settings.STRIPE_SECRET_KEY_EUR
-        else:
-            stripe.api_key = settings.STRIPE_SECRET_KEY
-
-    def _validate_order_for_payment(self, order):
-        """Validate order can process payment, raise exception if not"""
-        if order.payment_status == Order.PAYMENT_CANCELLED:
-            raise OrderValidationError('Order is cancelled')
-        if order.payment_status == Order.PAYMENT_COMPLETE:
-            raise OrderValidationError('Order already completed')
-
-    def _validate_order_for_cancellation(self, order):
-        """Validate order can be cancelled, raise exception if not"""
-        if order.payment_status not in [Order.PAYMENT_PENDING, Order.PAYMENT_FAILED]:
-            raise OrderValidationError('Cannot cancel processed order')
+    def _stripe(self, order):
+        """long-lived Stripe client for the account of the order currency"""
+        return stripe_clients.get(order.order_currency)
 
     @action(detail=False, methods=['post'])
     @handle_payment_exceptions
@@ -112,32 +208,23 @@ class StripePaymentView(viewsets.ViewSet):
             POST /api/payment/sessions/ - 
             -> Create payment intent for order
             -> it get amount and currency from order, 
-            -> then generates payment_intent_id for the order
+            -> then reuses the order's payment intent if it can still be paid (see shop.payments.payment_session),
+               or generates a new payment_intent_id for the order
             -> then saves payment_intent_id to the order, and return response.
               
         """
         order = self._get_order(request)
-        self._set_stripe_currency(order.order_currency)
         
         # Validate and raise exception if invalid
-        self._validate_order_for_payment(order)
+        validate_order_for_payment(order)
 
-        intent = stripe.PaymentIntent.create(
-            amount=int(order.total * 100),
-            currency=order.order_currency.lower(),
-            metadata={'order_id': str(order.id)},
-            automatic_payment_methods={'enabled': True},
-        )
+        previous_intent_id = order.stripe_payment_intent_id
+        result = payment_session(self._stripe(order), order)
         
-        order.stripe_payment_intent_id = intent['id']
-        order.save()
+        if order.stripe_payment_intent_id != previous_intent_id:
+            order.save(update_fields=['stripe_payment_intent_id'])
         
-        return Response({
-            'client_secret': intent['client_secret'],
-            'payment_intent_id': intent['id'],
-            'amount': order.total,
-            'currency': order.order_currency
-        },status=status.HTTP_200_OK)
+        return Response(result, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'])
     @handle_payment_exceptions
@@ -147,20 +234,17 @@ class StripePaymentView(viewsets.ViewSet):
             -> Cancel payment for specific order by order_id.
             -> it uses order_id to get payment_intent_id from the order.
             -> then check requirements and then cancel the order.
-            -> then update the payment status for the order to PAYMENT_CANCELLED.
+            -> then update the payment status for the order to PAYMENT_CANCELLED (400 if it was settled meanwhile),
+               and queue the cancellation of its payment intent (run by `manage.py run_jobs`).
               
         """
         order = self._get_order(request)
-        self._set_stripe_currency(order.order_currency)
         
         # Validate and raise exception if invalid
-        self._validate_order_for_cancellation(order)
-        
-        if order.stripe_payment_intent_id and order.payment_status == Order.PAYMENT_PENDING:
-            stripe.PaymentIntent.cancel(order.stripe_payment_intent_id)
+        validate_order_for_cancellation(order)
         
-        order.payment_status = Order.PAYMENT_CANCELLED
-        order.save()
+        # the Stripe side is cancelled by a background job (shop.tasks), the response doesn't wait for it
+        cancel_order(order)
         
         return Response({'message': 'Payment cancelled successfully'},status=status.HTTP_200_OK)
 
@@ -173,27 +257,24 @@ class StripePaymentView(viewsets.ViewSet):
             -> it uses order_id to get payment_intent_id from the order.
             -> then check requirements and then confirm the order.
             -> then update the payment status for the order to either PAYMENT_COMPLETE or PAYMENT_Failed.
-            TODO: Best practice is to use webhook to handle payment.
+            -> once STRIPE_WEBHOOK_SECRET is set the webhook settles the order (shop.webhooks) and confirm only reads it.
         
         """
         order = self._get_order(request)
-        self._set_stripe_currency(order.order_currency)
         
-        # Validate and raise exception if invalid
-        self._validate_order_for_payment(order)
+        # Settled by the webhook (or waiting for it), no Stripe round trip. Raises if the order is cancelled.
+        known = confirmation_from_order(order)
+        if known is not None:
+            result, status_code = known
+            return Response(result, status=status_code)
 
-        intent = stripe.PaymentIntent.retrieve(order.stripe_payment_intent_id)
+        intent = self._stripe(order).v1.payment_intents.retrieve(order.stripe_payment_intent_id)
         
-        order.payment_status = Order.PAYMENT_COMPLETE if intent.status == 'succeeded' else Order.PAYMENT_FAILED
-        order.save()
+        from_status = order.payment_status
+        result, succeeded = apply_confirmation(order, intent)
+        set_payment_status(order, order.payment_status, from_status=from_status)
         
-        result = {
-            'status': 'success' if intent.status == 'succeeded' else 'failed',
-            'message': 'Payment confirmed successfully' if intent.status == 'succeeded' else f'Payment failed: {intent.status}',
-            'order_id': str(order.id)
-        }
-        
-        return Response(result, status=status.HTTP_200_OK if result['status'] == 'success' else status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK if succeeded else status.HTTP_400_BAD_REQUEST)
 
 """
 This View Are Out Of Scope Of This Task.
@@ -201,16 +282,55 @@ but because the task needs to combine multiple order of items and make a single
 thats why i created a Cart View to facilitate this.
 You may ignore this section
 """
+#Cart totals are computed by the database (quantity * item.price per line, SUM per cart), the serializers only read them
+line_total = ExpressionWrapper(F('quantity') * F('item__price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+cart_total = Coalesce(
+    Sum(F('items__quantity') * F('items__item__price'), output_field=DecimalField(max_digits=16, decimal_places=2)),
+    Value(Decimal('0.00')),
+    output_field=DecimalField(max_digits=16, decimal_places=2),
+)
+
 class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
-    queryset = Cart.objects.prefetch_related('items__item').all()
+    """
+        -> with CART_STORAGE=session|signed the cart never reaches the database, see shop.carts.
+    """
+    queryset = Cart.objects.annotate(cart_total=cart_total).prefetch_related(
+        Prefetch('items', queryset=CartItem.objects.select_related('item').annotate(line_total=line_total)),
+    )
     serializer_class = CartSerializer
 
     def create(self, request, *args, **kwargs):
+        store = cart_store(request)
+        if store is not None:
+            cart, cart_items = materialize(store.create())
+            return store.apply(Response(self.get_serializer(cart, context=self._client_cart_context(cart_items)).data, status=status.HTTP_201_CREATED))
         cart = Cart.objects.create()
+        maybe_sweep_carts()
         serializer = self.get_serializer(cart)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def retrieve(self, request, *args, **kwargs):
+        store = cart_store(request)
+        if store is None:
+            return super().retrieve(request, *args, **kwargs)
+        cart, cart_items = materialize(store.get_or_404(kwargs['pk']))
+        return Response(self.get_serializer(cart, context=self._client_cart_context(cart_items)).data)
+
+    def _client_cart_context(self, cart_items):
+        # CartSerializer reads the lines of a client-side cart from here, they are not in the database
+        return {**self.get_serializer_context(), 'cart_items': cart_items}
+
+    def destroy(self, request, *args, **kwargs):
+        store = cart_store(request)
+        if store is None:
+            return super().destroy(request, *args, **kwargs)
+        store.delete(store.get_or_404(kwargs['pk'])['id'])
+        return store.apply(Response(status=status.HTTP_204_NO_CONTENT))
+
 class CartItemViewSet(ModelViewSet):
+    """
+        -> with CART_STORAGE=session|signed the lines live in the client-side cart, a line id is its item id.
+    """
     http_method_names = ['get', 'post', 'patch', 'delete']
 
     def get_serializer_class(self):
@@ -224,4 +344,81 @@ class CartItemViewSet(ModelViewSet):
         return {'cart_id': self.kwargs['cart_pk']}
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('item')
+        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('item').annotate(line_total=line_total)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.store = cart_store(request)
+        self.client_cart = self.store.get_or_404(kwargs['cart_pk']) if self.store is not None else None
+
+    def _client_line(self, pk):
+        _, cart_items = materialize(self.client_cart)
+        for cart_item in cart_items:
+            if str(cart_item.pk) == str(pk):
+                return cart_item
+        raise NotFound()
+
+    # CartItem writes don't save the Cart, keep its updated_at (what purge_carts goes by) current.
+    # (adding lines goes through shop.carts.add_cart_items, which touches the cart itself)
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        touch_cart(self.kwargs['cart_pk'])
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        touch_cart(self.kwargs['cart_pk'])
+
+    def list(self, request, *args, **kwargs):
+        if self.store is None:
+            return super().list(request, *args, **kwargs)
+        _, cart_items = materialize(self.client_cart)
+        return Response(CartItemSerializer(cart_items, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.store is None:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(CartItemSerializer(self._client_line(kwargs['pk'])).data)
+
+    def create(self, request, *args, **kwargs):
+        if self.store is None:
+            return super().create(request, *args, **kwargs)
+        serializer = AddCartItemSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        item_id, quantity = serializer.validated_data['item_id'], serializer.validated_data.get('quantity', 1)
+        self.store.add(self.client_cart, item_id, quantity)
+        data = {'id': item_id, 'item_id': item_id, 'quantity': self.client_cart['lines'][str(item_id)]}
+        return self.store.apply(Response(data, status=status.HTTP_201_CREATED))
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        """
+            -> POST /api/carts/{id}/items/bulk/ [{"item_id": 1, "quantity": 2}, ...]
+            -> adds every line in one request and one transaction, returns the resulting lines of those items.
+        """
+        serializer = CartLineSerializer(data=request.data, many=True, allow_empty=False, max_length=settings.CART_BULK_MAX_LINES)
+        serializer.is_valid(raise_exception=True)
+        quantities = serializer.validated_data
+        if self.store is not None:
+            self.store.add_lines(self.client_cart, quantities)
+            _, cart_items = materialize(self.client_cart)
+            lines = [cart_item for cart_item in cart_items if cart_item.item_id in quantities]
+            return self.store.apply(Response(CartItemSerializer(lines, many=True).data, status=status.HTTP_201_CREATED))
+        add_cart_items(self.kwargs['cart_pk'], quantities)
+        lines = self.get_queryset().filter(item_id__in=quantities).order_by('id')
+        return Response(CartItemSerializer(lines, many=True).data, status=status.HTTP_201_CREATED)
+
+    def partial_update(self, request, *args, **kwargs):
+        if self.store is None:
+            return super().partial_update(request, *args, **kwargs)
+        cart_item = self._client_line(kwargs['pk'])
+        serializer = UpdateCartItemSerializer(cart_item, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data.get('quantity', cart_item.quantity)
+        self.store.set_quantity(self.client_cart, cart_item.item_id, quantity)
+        return self.store.apply(Response({'quantity': quantity}))
+
+    def destroy(self, request, *args, **kwargs):
+        if self.store is None:
+            return super().destroy(request, *args, **kwargs)
+        self.store.remove(self.client_cart, self._client_line(kwargs['pk']).item_id)
+        return self.store.apply(Response(status=status.HTTP_204_NO_CONTENT))
@@ -0,0 +1,153 @@
+import json
+import uuid
+import stripe
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .models import Order, StripeEvent
+from .rollups import record_transitions
+
+#Order.payment_status each handled event type moves the order to
+EVENT_STATUS = {
+    'payment_intent.succeeded': Order.PAYMENT_COMPLETE,
+    'payment_intent.payment_failed': Order.PAYMENT_FAILED,
+    'payment_intent.canceled': Order.PAYMENT_CANCELLED,
+}
+
+
+def webhook_secrets():
+    """signing secrets of every configured Stripe account (USD and EUR)"""
+    return [secret for secret in (settings.STRIPE_WEBHOOK_SECRET, settings.STRIPE_WEBHOOK_SECRET_EUR) if secret]
+
+
+def webhooks_enabled():
+    return bool(webhook_secrets())
+
+
+def verify_event(payload, sig_header):
+    """
+    -> checks the Stripe-Signature header against the secret of each account.
+    -> returns the event dict, raises stripe.SignatureVerificationError (or ValueError for a body that isn't JSON).
+    """
+    secrets = webhook_secrets()
+    if not secrets:
+        raise stripe.SignatureVerificationError('No webhook secret configured', sig_header)
+    for secret in secrets:
+        try:
+            stripe.WebhookSignature.verify_header(payload.decode('utf-8'), sig_header, secret, stripe.Webhook.DEFAULT_TOLERANCE)
+        except stripe.SignatureVerificationError as e:
+            error = e
+            continue
+        event = json.loads(payload)
+        if not isinstance(event, dict) or 'id' not in event or 'type' not in event:
+            raise ValueError('Not a Stripe event')
+        return event
+    raise error
+
+
+def record_event(event):
+    """append the event to the inbox, a redelivered event id is ignored"""
+    StripeEvent.objects.bulk_create(
+        [StripeEvent(event_id=event['id'], type=event['type'], payload=event)],
+        ignore_conflicts=True,
+    )
+
+
+#StripeWebhookView
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """
+        -> POST /api/payment/webhook/ (endpoint configured in the Stripe dashboard of each account)
+        -> verifies the signature, stores the event in the StripeEvent inbox and returns 200 right away.
+        -> the order is updated later by `manage.py process_stripe_events`, so Stripe never waits on our database work.
+    """
+    try:
+        event = verify_event(request.body, request.headers.get('Stripe-Signature', ''))
+    except (ValueError, stripe.SignatureVerificationError):
+        return HttpResponse(status=400)
+    record_event(event)
+    return HttpResponse(status=200)
+
+
+def _intent(event):
+    return event.payload.get('data', {}).get('object', {})
+
+
+def _order_id(intent):
+    """order id from the intent metadata (set by payment_intent_params), None if missing or not a UUID"""
+    try:
+        return str(uuid.UUID(str(intent.get('metadata', {}).get('order_id'))))
+    except ValueError:
+        return None
+
+
+def _apply(order, event):
+    """
+    -> succeeded always wins and a completed order is never reopened (events can arrive out of order).
+    -> failed/canceled only count for the intent currently attached to the order,
+        a late event about an abandoned intent must not undo a newer one.
+    """
+    new_status = EVENT_STATUS[event.type]
+    if order.payment_status == Order.PAYMENT_COMPLETE:
+        return False
+    if new_status != Order.PAYMENT_COMPLETE and _intent(event).get('id') != order.stripe_payment_intent_id:
+        return False
+    if order.payment_status == new_status:
+        return False
+    order.payment_status = new_status
+    return True
+
+
+def process_stripe_events(batch_size=None):
+    """
+    Apply one batch of unprocessed inbox events to their orders.
+    -> one query for the events, one for their orders (locked), one bulk_update, one rollup upsert
+        and one update marking the batch processed.
+    -> events of other types are just marked processed.
+    -> returns the number of events processed, 0 when the inbox is drained.
+    """
+    batch_size = batch_size or settings.STRIPE_EVENTS_BATCH_SIZE
+    with transaction.atomic():
+        pending = StripeEvent.objects.filter(processed_at__isnull=True).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # several workers can drain the inbox side by side, each one takes the rows nobody else holds.
+            pending = pending.select_for_update(skip_locked=True)
+        events = list(pending[:batch_size])
+        if not events:
+            return 0
+
+        handled = [event for event in events if event.type in EVENT_STATUS]
+        order_ids, intent_ids = set(), set()
+        for event in handled:
+            intent = _intent(event)
+            order_id = _order_id(intent)
+            if order_id:
+                order_ids.add(order_id)
+            if intent.get('id'):
+                intent_ids.add(intent['id'])
+
+        # locked until the batch commits, so a cancel or confirm can't land between this read and the bulk_update
+        # (and be overwritten with a status computed from the old one). On SQLite the IMMEDIATE transaction
+        # (settings) already holds the write lock from BEGIN.
+        orders = Order.objects.filter(Q(pk__in=order_ids) | Q(stripe_payment_intent_id__in=intent_ids)).select_for_update() if handled else []
+        by_id = {str(order.pk): order for order in orders}
+        by_intent = {order.stripe_payment_intent_id: order for order in by_id.values() if order.stripe_payment_intent_id}
+
+        changed, read_status = {}, {order.pk: order.payment_status for order in by_id.values()}
+        # Stripe doesn't guarantee delivery order, replay the batch in the order the events happened.
+        for event in sorted(handled, key=lambda e: (e.payload.get('created', 0), e.pk)):
+            intent = _intent(event)
+            order = by_id.get(_order_id(intent)) or by_intent.get(intent.get('id'))
+            if order is not None and _apply(order, event):
+                changed[order.pk] = order
+
+        if changed:
+            Order.objects.bulk_update(changed.values(), ['payment_status'])
+            record_transitions([(order, read_status[order.pk], order.payment_status) for order in changed.values()])
+        StripeEvent.objects.filter(pk__in=[event.pk for event in events]).update(processed_at=timezone.now())
+    return len(events)